@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Alert
+from .models import Alert, AlertRule, Notification
 
 @admin.register(Alert)
 class AlertAdmin(admin.ModelAdmin):
@@ -12,3 +12,17 @@ class AlertAdmin(admin.ModelAdmin):
             alert.resolve()
         self.message_user(request, "Selected alerts resolved.")
     resolve_selected.short_description = "Resolve selected alerts"
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ['recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['recipient', 'subject']
+    readonly_fields = ['created_at', 'sent_at', 'claimed_at']
+
+
+@admin.register(AlertRule)
+class AlertRuleAdmin(admin.ModelAdmin):
+    list_display = ['rule_type', 'location', 'threshold', 'window_seconds', 'is_active']
+    list_filter = ['rule_type', 'is_active']
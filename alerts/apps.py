@@ -2,3 +2,11 @@ from django.apps import AppConfig
 class AlertsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'alerts'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from .models import AlertRule
+        from .rules import engine
+
+        post_save.connect(engine.invalidate, sender=AlertRule, dispatch_uid='alert_rules_saved')
+        post_delete.connect(engine.invalidate, sender=AlertRule, dispatch_uid='alert_rules_deleted')
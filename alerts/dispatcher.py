@@ -0,0 +1,213 @@
+"""
+Background delivery of alert notifications.
+
+`enqueue(alert)` writes one `Notification` outbox row per recipient and
+returns immediately; a dispatcher drains the outbox off the request /
+detection path:
+
+  * due rows are claimed atomically, so several dispatchers can run safely
+  * pending rows for the same recipient are merged into a single digest
+  * one SMTP connection is reused for the whole batch
+  * failures are retried with exponential backoff up to a maximum
+
+The dispatcher runs either as a daemon thread inside the process that raises
+alerts (ALERT_DISPATCHER_IN_PROCESS, default) or standalone via
+`python manage.py dispatch_notifications`.
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_wakeup = threading.Event()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ---------------------------------------------------------------------------
+# Producer side
+# ---------------------------------------------------------------------------
+
+def enqueue(alert):
+    """Queue an alert for every configured recipient. Never touches SMTP."""
+    from .models import Notification
+
+    recipients = list(_setting('ALERT_EMAIL_TO', []))
+    if not recipients:
+        return []
+
+    now = timezone.now()
+    window = timedelta(seconds=_setting('ALERT_DIGEST_WINDOW', 60))
+
+    # Recipients mailed within the digest window wait until it closes, so a
+    # burst of alerts collapses into one digest instead of a mail storm.
+    last_sent = dict(
+        Notification.objects
+        .filter(recipient__in=recipients, sent_at__gte=now - window)
+        .values('recipient')
+        .annotate(last=Max('sent_at'))
+        .values_list('recipient', 'last')
+    )
+
+    subject = f"[CrowdMonitor] {alert.alert_type} — {alert.location.name}"
+    rows = Notification.objects.bulk_create([
+        Notification(
+            alert=alert,
+            recipient=r,
+            subject=subject,
+            body=alert.message,
+            next_attempt_at=last_sent[r] + window if r in last_sent else now,
+        )
+        for r in recipients
+    ])
+
+    if _setting('ALERT_DISPATCHER_IN_PROCESS', True):
+        ensure_started()
+    transaction.on_commit(_wakeup.set)
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Consumer side
+# ---------------------------------------------------------------------------
+
+def dispatch_pending(limit=500):
+    """Claim due notifications, send them as per-recipient digests. Returns #emails sent."""
+    from .models import Notification
+
+    now = timezone.now()
+
+    # Rows stuck in SENDING belong to a dispatcher that died mid-batch. The
+    # timeout must outlast the slowest batch; should a live sender still be
+    # past it, its final updates below no longer match the re-claimed rows.
+    Notification.objects.filter(
+        status=Notification.STATUS_SENDING,
+        claimed_at__lt=now - timedelta(seconds=_setting('ALERT_CLAIM_TIMEOUT', 900)),
+    ).update(status=Notification.STATUS_PENDING)
+
+    due_ids = list(
+        Notification.objects
+        .filter(status=Notification.STATUS_PENDING, next_attempt_at__lte=now)
+        .values_list('id', flat=True)[:limit]
+    )
+    if not due_ids:
+        return 0
+
+    Notification.objects.filter(
+        id__in=due_ids, status=Notification.STATUS_PENDING,
+    ).update(status=Notification.STATUS_SENDING, claimed_at=now)
+    claimed = Notification.objects.filter(
+        id__in=due_ids, status=Notification.STATUS_SENDING, claimed_at=now,
+    )
+
+    by_recipient = defaultdict(list)
+    for n in claimed:
+        by_recipient[n.recipient].append(n)
+
+    from django.core.mail import EmailMessage, get_connection
+
+    sent = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Cannot open mail connection: {e}")
+        for batch in by_recipient.values():
+            _mark_failed(batch, e, now)
+        return 0
+
+    try:
+        for recipient, batch in by_recipient.items():
+            subject, body = _compose(batch)
+            message = EmailMessage(
+                subject=subject,
+                body=body,
+                from_email=_setting('ALERT_EMAIL_FROM', None),
+                to=[recipient],
+                connection=connection,
+            )
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                logger.error(f"Failed to send alert email to {recipient}: {e}")
+                _mark_failed(batch, e, now)
+                continue
+            Notification.objects.filter(
+                id__in=[n.id for n in batch], status=Notification.STATUS_SENDING, claimed_at=now,
+            ).update(
+                status=Notification.STATUS_SENT, sent_at=timezone.now(),
+                attempts=batch[0].attempts + 1, last_error='',
+            )
+            sent += 1
+            logger.info(f"NOTIFICATION SENT: {recipient} | {subject}")
+    finally:
+        connection.close()
+    return sent
+
+
+def _compose(batch):
+    if len(batch) == 1:
+        return batch[0].subject, batch[0].body
+    subject = f"[CrowdMonitor] {len(batch)} alerts — digest"
+    body = "\n\n".join(f"{n.subject}\n{n.body}" for n in batch)
+    return subject, body
+
+
+def _mark_failed(batch, error, claimed_at):
+    """Schedule a retry (or give up) for rows still held by the claim made at `claimed_at`."""
+    from .models import Notification
+
+    max_attempts = _setting('ALERT_MAX_ATTEMPTS', 5)
+    backoff = _setting('ALERT_RETRY_BACKOFF', 30)
+    now = timezone.now()
+    by_attempts = defaultdict(list)
+    for n in batch:
+        by_attempts[n.attempts + 1].append(n.id)
+    for attempts, ids in by_attempts.items():
+        fields = {'attempts': attempts, 'last_error': str(error)}
+        if attempts >= max_attempts:
+            fields['status'] = Notification.STATUS_FAILED
+        else:
+            fields['status'] = Notification.STATUS_PENDING
+            fields['next_attempt_at'] = now + timedelta(seconds=min(backoff * 2 ** (attempts - 1), 3600))
+        Notification.objects.filter(
+            id__in=ids, status=Notification.STATUS_SENDING, claimed_at=claimed_at,
+        ).update(**fields)
+
+
+def run_forever(interval=None):
+    """Dispatcher loop; wakes early when new notifications are enqueued."""
+    interval = interval or _setting('ALERT_DISPATCH_INTERVAL', 5)
+    while True:
+        _wakeup.wait(interval)
+        _wakeup.clear()
+        close_old_connections()
+        try:
+            dispatch_pending()
+        except Exception as e:
+            logger.error(f"Notification dispatcher error: {e}")
+
+
+def ensure_started():
+    """Start the in-process dispatcher thread once."""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(
+                target=run_forever, name='alert-dispatcher', daemon=True,
+            )
+            _thread.start()
@@ -0,0 +1,37 @@
+"""
+Django management command to deliver queued alert notifications.
+
+Run this when ALERT_DISPATCHER_IN_PROCESS is False, so web and detection
+processes only write to the outbox.
+
+Usage:
+    python manage.py dispatch_notifications
+    python manage.py dispatch_notifications --once
+"""
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued alert notifications from the outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Seconds between outbox polls (default: ALERT_DISPATCH_INTERVAL)'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Drain due notifications once and exit'
+        )
+
+    def handle(self, *args, **options):
+        from alerts.dispatcher import dispatch_pending, run_forever
+
+        if options['once']:
+            sent = dispatch_pending()
+            self.stdout.write(self.style.SUCCESS(f"Sent {sent} email(s)."))
+            return
+
+        self.stdout.write(self.style.SUCCESS("Starting alert notification dispatcher"))
+        run_forever(options['interval'])
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0001_initial'),
+        ('alerts', '0002_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rule_type', models.CharField(choices=[('SUSTAINED', 'Occupancy above threshold for window'), ('RISE', 'Rise above window minimum'), ('RATE', 'Rate of change (people/min)')], max_length=10)),
+                ('threshold', models.FloatField(help_text='SUSTAINED: occupancy fraction (0.8). RISE: fractional rise (0.3). RATE: people per minute.')),
+                ('window_seconds', models.PositiveIntegerField(default=0, help_text='0 for RISE means "since the previous reading".')),
+                ('is_active', models.BooleanField(default=True)),
+                ('location', models.ForeignKey(blank=True, help_text='Leave empty for a global rule.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alert_rules', to='locations.location')),
+            ],
+            options={
+                'ordering': ['location_id', 'rule_type'],
+            },
+        ),
+    ]
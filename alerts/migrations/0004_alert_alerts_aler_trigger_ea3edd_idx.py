@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0003_alertrule'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['-triggered_at'], name='alerts_aler_trigger_ea3edd_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0004_alert_alerts_aler_trigger_ea3edd_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alert',
+            name='alert_type',
+            field=models.CharField(choices=[('OVERCROWD', 'Overcrowding'), ('SPIKE', 'Sudden Spike'), ('PROLONGED', 'Prolonged High Density'), ('PREDICTED', 'Predicted Overcrowding')], max_length=20),
+        ),
+    ]
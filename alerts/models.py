@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 
 
 class Alert(models.Model):
@@ -8,12 +8,14 @@ class Alert(models.Model):
     TYPE_OVERCROWD = 'OVERCROWD'
     TYPE_SPIKE = 'SPIKE'
     TYPE_PROLONGED = 'PROLONGED'
+    TYPE_PREDICTED = 'PREDICTED'
 
     STATUS_CHOICES = [(STATUS_ACTIVE, 'Active'), (STATUS_RESOLVED, 'Resolved')]
     TYPE_CHOICES = [
         (TYPE_OVERCROWD, 'Overcrowding'),
         (TYPE_SPIKE, 'Sudden Spike'),
         (TYPE_PROLONGED, 'Prolonged High Density'),
+        (TYPE_PREDICTED, 'Predicted Overcrowding'),
     ]
 
     location = models.ForeignKey(
@@ -29,12 +31,97 @@ class Alert(models.Model):
 
     class Meta:
         ordering = ['-triggered_at']
+        indexes = [
+            models.Index(fields=['-triggered_at']),
+        ]
 
     def __str__(self):
         return f"[{self.alert_type}] {self.location.name} @ {self.triggered_at:%Y-%m-%d %H:%M}"
 
+    def save(self, *args, **kwargs):
+        # Atomic so post_save listeners (dashboard counters) commit with the row.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def resolve(self):
         from django.utils import timezone
         self.status = self.STATUS_RESOLVED
         self.resolved_at = timezone.now()
         self.save(update_fields=['status', 'resolved_at'])
+
+
+class Notification(models.Model):
+    """Outbox row: one pending email per alert and recipient."""
+
+    STATUS_PENDING = 'PENDING'
+    STATUS_SENDING = 'SENDING'
+    STATUS_SENT = 'SENT'
+    STATUS_FAILED = 'FAILED'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    alert = models.ForeignKey(Alert, on_delete=models.CASCADE, related_name='notifications')
+    recipient = models.CharField(max_length=254)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField()
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['recipient', '-sent_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient} — {self.subject} ({self.status})"
+
+
+class AlertRule(models.Model):
+    """
+    Sliding-window alert rule, evaluated in memory by alerts.rules.engine.
+    Rules without a location are global; a location's own rules replace the
+    global rules of the same type for that location.
+    """
+
+    TYPE_SUSTAINED = 'SUSTAINED'
+    TYPE_RISE = 'RISE'
+    TYPE_RATE = 'RATE'
+
+    TYPE_CHOICES = [
+        (TYPE_SUSTAINED, 'Occupancy above threshold for window'),
+        (TYPE_RISE, 'Rise above window minimum'),
+        (TYPE_RATE, 'Rate of change (people/min)'),
+    ]
+
+    location = models.ForeignKey(
+        'locations.Location', on_delete=models.CASCADE, null=True, blank=True,
+        related_name='alert_rules', help_text='Leave empty for a global rule.',
+    )
+    rule_type = models.CharField(max_length=10, choices=TYPE_CHOICES)
+    threshold = models.FloatField(
+        help_text='SUSTAINED: occupancy fraction (0.8). RISE: fractional rise (0.3). '
+                  'RATE: people per minute.'
+    )
+    window_seconds = models.PositiveIntegerField(
+        default=0, help_text='0 for RISE means "since the previous reading".'
+    )
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['location_id', 'rule_type']
+
+    def __str__(self):
+        scope = self.location.name if self.location_id else 'global'
+        return f"{self.rule_type} {self.threshold} / {self.window_seconds}s ({scope})"
@@ -0,0 +1,202 @@
+"""
+In-memory sliding-window alert rule engine.
+
+Each (location, rule) pair keeps a small incremental state — a ring buffer of
+recent readings, a monotonic deque for the window minimum and running sums for
+a least-squares slope — so evaluating a reading is amortised O(1) and never
+queries CrowdLog.
+
+Rule types (see AlertRule):
+    SUSTAINED  occupancy >= threshold for window_seconds     -> PROLONGED alert
+    RISE       (latest - window min) / window min > threshold -> SPIKE alert
+    RATE       |slope| > threshold people/min over the window -> SPIKE alert
+
+Global rules come from AlertRule rows without a location, falling back to
+settings.CROWD_ALERT_RULES; per-location rows replace global rules of the
+same type.
+"""
+
+import threading
+import time
+from collections import deque, namedtuple
+
+from django.conf import settings
+
+Rule = namedtuple('Rule', ['key', 'location_id', 'rule_type', 'threshold', 'window_seconds'])
+
+DEFAULT_RULES = [
+    {'rule_type': 'RISE', 'threshold': 0.30, 'window_seconds': 0},
+    {'rule_type': 'SUSTAINED', 'threshold': 0.80, 'window_seconds': 600},
+]
+
+RULE_RELOAD_SECONDS = 60
+
+
+class WindowState:
+    """Incremental per-(location, rule) state over a time window."""
+
+    __slots__ = (
+        'window', 'samples', 'mins', 'n', 'st', 'sc', 'stc', 'stt',
+        't0', 'above_since', 'firing',
+    )
+
+    def __init__(self, window):
+        self.window = window
+        self.samples = deque()   # (t, count)
+        self.mins = deque()      # monotonic increasing samples -> window min at [0]
+        self.n = 0
+        self.st = self.sc = self.stc = self.stt = 0.0
+        self.t0 = None
+        self.above_since = None
+        self.firing = False
+
+    def push(self, t, count):
+        if self.t0 is None:
+            self.t0 = t
+        x = t - self.t0
+        sample = (t, count)
+        self.samples.append(sample)
+        while self.mins and self.mins[-1][1] >= count:
+            self.mins.pop()
+        self.mins.append(sample)
+        self.n += 1
+        self.st += x
+        self.sc += count
+        self.stc += x * count
+        self.stt += x * x
+        self._expire(t)
+
+    def _expire(self, now):
+        if self.window == 0:
+            # "Since the previous reading": keep exactly two samples.
+            while len(self.samples) > 2:
+                self._pop()
+        else:
+            while self.samples and self.samples[0][0] < now - self.window:
+                self._pop()
+
+    def _pop(self):
+        sample = self.samples.popleft()
+        t, count = sample
+        x = t - self.t0
+        self.n -= 1
+        self.st -= x
+        self.sc -= count
+        self.stc -= x * count
+        self.stt -= x * x
+        if self.mins and self.mins[0] is sample:
+            self.mins.popleft()
+
+    def window_min(self):
+        return self.mins[0][1] if self.mins else None
+
+    def slope_per_minute(self):
+        if self.n < 2:
+            return 0.0
+        denom = self.n * self.stt - self.st * self.st
+        if denom <= 0:
+            return 0.0
+        return (self.n * self.stc - self.st * self.sc) / denom * 60
+
+
+class RuleEngine:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rules = None
+        self._loaded_at = 0.0
+        self._states = {}   # (location_id, rule.key) -> WindowState
+
+    # ── Rule configuration ────────────────────────────────────────────────
+    def invalidate(self, **kwargs):
+        self._loaded_at = 0.0
+
+    def _load_rules(self):
+        from .models import AlertRule
+
+        rows = list(AlertRule.objects.filter(is_active=True))
+        global_rules = [
+            Rule(r.pk, None, r.rule_type, r.threshold, r.window_seconds)
+            for r in rows if r.location_id is None
+        ]
+        if not global_rules:
+            configured = getattr(settings, 'CROWD_ALERT_RULES', DEFAULT_RULES)
+            global_rules = [
+                Rule(f'default-{i}', None, r['rule_type'], r['threshold'], r.get('window_seconds', 0))
+                for i, r in enumerate(configured)
+            ]
+        per_location = {}
+        for r in rows:
+            if r.location_id is not None:
+                per_location.setdefault(r.location_id, []).append(
+                    Rule(r.pk, r.location_id, r.rule_type, r.threshold, r.window_seconds)
+                )
+        return global_rules, per_location
+
+    def rules_for(self, location_id):
+        if self._rules is None or time.monotonic() - self._loaded_at > RULE_RELOAD_SECONDS:
+            self._rules = self._load_rules()
+            self._loaded_at = time.monotonic()
+        global_rules, per_location = self._rules
+        own = per_location.get(location_id, [])
+        overridden = {r.rule_type for r in own}
+        return [r for r in global_rules if r.rule_type not in overridden] + own
+
+    # ── Evaluation ────────────────────────────────────────────────────────
+    def observe(self, location_id, count, capacity, now=None):
+        """
+        Feed one reading. Returns a list of (rule, event, detail) transitions
+        where event is 'fire' or 'clear'; steady states produce nothing.
+        """
+        now = time.time() if now is None else now
+        pct = count / capacity if capacity else 0
+        events = []
+
+        with self._lock:
+            for rule in self.rules_for(location_id):
+                key = (location_id, rule.key)
+                state = self._states.get(key)
+                if state is None or state.window != rule.window_seconds:
+                    state = self._states[key] = WindowState(rule.window_seconds)
+                state.push(now, count)
+
+                active, detail = self._condition(rule, state, now, count, pct)
+                if active and not state.firing:
+                    state.firing = True
+                    events.append((rule, 'fire', detail))
+                elif not active and state.firing:
+                    state.firing = False
+                    events.append((rule, 'clear', detail))
+        return events
+
+    @staticmethod
+    def _condition(rule, state, now, count, pct):
+        if rule.rule_type == 'SUSTAINED':
+            if pct < rule.threshold:
+                state.above_since = None
+                return False, {}
+            if state.above_since is None:
+                state.above_since = now
+            return now - state.above_since >= rule.window_seconds, {
+                'minutes': (now - state.above_since) / 60,
+            }
+
+        if rule.rule_type == 'RISE':
+            base = state.window_min()
+            if not base:
+                return False, {}
+            ratio = (count - base) / base
+            return ratio > rule.threshold, {'base': base, 'ratio': ratio}
+
+        if rule.rule_type == 'RATE':
+            slope = state.slope_per_minute()
+            return abs(slope) > rule.threshold, {'slope': slope}
+
+        return False, {}
+
+    def forget(self, location_id):
+        with self._lock:
+            for key in [k for k in self._states if k[0] == location_id]:
+                del self._states[key]
+
+
+engine = RuleEngine()
@@ -0,0 +1,164 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Alert, Notification
+from .rules import RuleEngine, WindowState
+
+
+# ── Sliding-window rules (rules.py) ───────────────────────────────────────
+
+class WindowStateTests(TestCase):
+    def test_window_min_slides(self):
+        state = WindowState(60)
+        for t, count in ((0, 10), (20, 5), (40, 8), (70, 9)):
+            state.push(t, count)
+        # t=0 has expired; 5 is still inside [10, 70].
+        self.assertEqual(state.window_min(), 5)
+        state.push(85, 12)
+        self.assertEqual(state.window_min(), 8)
+        self.assertEqual(state.n, 3)
+
+    def test_zero_window_keeps_the_previous_reading(self):
+        state = WindowState(0)
+        for t, count in ((0, 3), (5, 10), (10, 7)):
+            state.push(t, count)
+        self.assertEqual([c for _, c in state.samples], [10, 7])
+        self.assertEqual(state.window_min(), 7)
+
+    def test_slope_survives_expiry(self):
+        state = WindowState(120)
+        for i in range(20):
+            state.push(30 * i, 2 * i)           # 2 people every 30 s
+        self.assertEqual(state.n, 5)
+        self.assertAlmostEqual(state.slope_per_minute(), 4.0)
+        state.push(630, 0)
+        self.assertLess(state.slope_per_minute(), 0)
+
+    def test_flat_or_single_sample_slope_is_zero(self):
+        state = WindowState(60)
+        state.push(0, 10)
+        self.assertEqual(state.slope_per_minute(), 0.0)
+        state.push(0, 12)
+        self.assertEqual(state.slope_per_minute(), 0.0)
+
+
+@override_settings(CROWD_ALERT_RULES=[
+    {'rule_type': 'SUSTAINED', 'threshold': 0.8, 'window_seconds': 600},
+    {'rule_type': 'RISE', 'threshold': 0.3, 'window_seconds': 0},
+])
+class RuleEngineTests(TestCase):
+    def setUp(self):
+        self.engine = RuleEngine()
+
+    def _events(self, count, now, rule_type):
+        return [
+            event for rule, event, _ in self.engine.observe(1, count, 100, now=now)
+            if rule.rule_type == rule_type
+        ]
+
+    def test_sustained_fires_after_the_window_and_clears(self):
+        self.assertEqual(self._events(85, 0, 'SUSTAINED'), [])
+        self.assertEqual(self._events(90, 300, 'SUSTAINED'), [])
+        self.assertEqual(self._events(88, 600, 'SUSTAINED'), ['fire'])
+        self.assertEqual(self._events(89, 660, 'SUSTAINED'), [])
+        self.assertEqual(self._events(50, 720, 'SUSTAINED'), ['clear'])
+        # Dropping below the threshold restarts the window.
+        self.assertEqual(self._events(85, 780, 'SUSTAINED'), [])
+        self.assertEqual(self._events(85, 1300, 'SUSTAINED'), [])
+        self.assertEqual(self._events(85, 1380, 'SUSTAINED'), ['fire'])
+
+    def test_rise_compares_with_the_previous_reading(self):
+        self.assertEqual(self._events(10, 0, 'RISE'), [])
+        self.assertEqual(self._events(13, 5, 'RISE'), [])
+        self.assertEqual(self._events(17, 10, 'RISE'), ['fire'])
+        self.assertEqual(self._events(18, 15, 'RISE'), ['clear'])
+
+    def test_location_rules_replace_global_rules_of_the_same_type(self):
+        from .models import AlertRule
+        from locations.models import Location
+
+        location = Location.objects.create(name='Hall', capacity_limit=100)
+        AlertRule.objects.create(location=location, rule_type='RISE', threshold=1.0, window_seconds=0)
+        types = sorted((r.rule_type, r.threshold) for r in self.engine.rules_for(location.id))
+        self.assertEqual(types, [('RISE', 1.0), ('SUSTAINED', 0.8)])
+
+
+# ── Notification dispatcher (dispatcher.py) ───────────────────────────────
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    ALERT_CLAIM_TIMEOUT=900, ALERT_MAX_ATTEMPTS=2, ALERT_RETRY_BACKOFF=30,
+)
+class DispatcherTests(TestCase):
+    def setUp(self):
+        from locations.models import Location
+
+        location = Location.objects.create(name='Hall', capacity_limit=100)
+        self.alert = Alert.objects.create(location=location, alert_type=Alert.TYPE_OVERCROWD, message='Full')
+        self.now = timezone.now()
+
+    def _notification(self, recipient='ops@example.com', **fields):
+        fields.setdefault('next_attempt_at', self.now)
+        return Notification.objects.create(
+            alert=self.alert, recipient=recipient, subject=f'Alert for {recipient}', body='Full', **fields,
+        )
+
+    def _dispatch(self):
+        from .dispatcher import dispatch_pending
+        return dispatch_pending()
+
+    def test_due_rows_are_sent_as_one_digest_per_recipient(self):
+        self._notification()
+        self._notification()
+        self._notification('security@example.com')
+        later = self._notification(next_attempt_at=self.now + timedelta(minutes=5))
+
+        self.assertEqual(self._dispatch(), 2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['ops@example.com', 'security@example.com'])
+        self.assertEqual(Notification.objects.filter(status=Notification.STATUS_SENT).count(), 3)
+        later.refresh_from_db()
+        self.assertEqual(later.status, Notification.STATUS_PENDING)
+
+    def test_only_claims_older_than_the_timeout_are_taken_over(self):
+        stale = self._notification(
+            status=Notification.STATUS_SENDING, claimed_at=self.now - timedelta(seconds=901),
+        )
+        busy = self._notification(
+            status=Notification.STATUS_SENDING, claimed_at=self.now - timedelta(seconds=600),
+        )
+        self.assertEqual(self._dispatch(), 1)
+        stale.refresh_from_db()
+        busy.refresh_from_db()
+        self.assertEqual((stale.status, busy.status), (Notification.STATUS_SENT, Notification.STATUS_SENDING))
+
+    def test_a_superseded_claim_cannot_overwrite_the_row(self):
+        from .dispatcher import _mark_failed
+
+        old_claim = self.now - timedelta(hours=1)
+        n = self._notification(status=Notification.STATUS_SENDING, claimed_at=self.now)
+        _mark_failed([n], 'timed out', old_claim)
+        n.refresh_from_db()
+        self.assertEqual((n.status, n.attempts), (Notification.STATUS_SENDING, 0))
+
+        _mark_failed([n], 'timed out', self.now)
+        n.refresh_from_db()
+        self.assertEqual((n.status, n.attempts, n.last_error), (Notification.STATUS_PENDING, 1, 'timed out'))
+
+    def test_failures_back_off_then_give_up(self):
+        n = self._notification()
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('refused'),
+        ), self.assertLogs('alerts.dispatcher', 'ERROR'):
+            self.assertEqual(self._dispatch(), 0)
+            n.refresh_from_db()
+            self.assertEqual((n.status, n.attempts), (Notification.STATUS_PENDING, 1))
+            self.assertGreaterEqual(n.next_attempt_at, self.now + timedelta(seconds=30))
+
+            Notification.objects.filter(pk=n.pk).update(next_attempt_at=self.now)
+            self._dispatch()
+            n.refresh_from_db()
+            self.assertEqual((n.status, n.attempts), (Notification.STATUS_FAILED, 2))
@@ -1,6 +1,5 @@
 import logging
 from django.conf import settings
-from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
@@ -41,67 +40,130 @@ def check_and_trigger_alerts(location):
 
     else:
         # Resolve open overcrowd alerts when density drops
-        Alert.objects.filter(
-            location=location,
-            alert_type=Alert.TYPE_OVERCROWD,
-            status=Alert.STATUS_ACTIVE,
-        ).update(status=Alert.STATUS_RESOLVED, resolved_at=timezone.now())
+        _resolve_active(location, Alert.TYPE_OVERCROWD)
+
+    # ── 2. Sliding-window rules (spike, prolonged, rate of change) ─────────
+    _evaluate_rules(location)
 
-    # ── 2. Sudden spike alert ──────────────────────────────────────────────
-    _check_spike(location)
+    # ── 3. Predictive overcrowding alert ───────────────────────────────────
+    _check_forecast(location, pct >= alert_threshold)
 
 
-def _check_spike(location):
-    """Trigger alert if count jumps >30% in the last two readings."""
-    from locations.models import CrowdLog
+def _check_forecast(location, overcrowded):
+    """Alert when the short-term forecast crosses the threshold before the count does."""
+    from locations.forecasting import forecaster
     from .models import Alert
 
-    logs = CrowdLog.objects.filter(location=location).order_by('-timestamp')[:2]
-    if len(logs) < 2:
+    forecaster.load()
+    forecaster.observe(location.id, location.current_count)
+
+    minutes = getattr(settings, 'FORECAST_ALERT_MINUTES', 30)
+    if not minutes or not location.capacity_limit:
         return
+    predicted = forecaster.predict_at(location.id, minutes)
+    # Once the location is actually overcrowded the OVERCROWD alert takes over.
+    firing = not overcrowded and predicted / location.capacity_limit >= settings.CROWD_ALERT_THRESHOLD
 
-    latest, previous = logs[0].people_count, logs[1].people_count
-    if previous == 0:
+    if not firing:
+        _resolve_active(location, Alert.TYPE_PREDICTED)
+        return
+    if Alert.objects.filter(
+        location=location, alert_type=Alert.TYPE_PREDICTED, status=Alert.STATUS_ACTIVE,
+    ).exists():
         return
+    alert = Alert.objects.create(
+        location=location,
+        alert_type=Alert.TYPE_PREDICTED,
+        message=(
+            f"{location.name} is forecast to reach {predicted:.0f}/{location.capacity_limit} "
+            f"({predicted / location.capacity_limit * 100:.0f}%) within {minutes} min. "
+            f"Current: {location.current_count}"
+        ),
+        people_count_at_trigger=location.current_count,
+        occupancy_at_trigger=location.occupancy_percentage,
+    )
+    _send_notifications(alert)
+    logger.warning(f"ALERT: {alert}")
+
+
+def _evaluate_rules(location):
+    """Feed the reading to the in-memory rule engine and act on transitions."""
+    from .models import Alert, AlertRule
+    from .rules import engine
+
+    events = engine.observe(location.id, location.current_count, location.capacity_limit)
+    for rule, event, detail in events:
+        alert_type = (
+            Alert.TYPE_PROLONGED if rule.rule_type == AlertRule.TYPE_SUSTAINED
+            else Alert.TYPE_SPIKE
+        )
+
+        if event == 'clear':
+            # Prolonged alerts end with the condition; spikes stay until resolved.
+            if alert_type == Alert.TYPE_PROLONGED:
+                _resolve_active(location, alert_type)
+            continue
 
-    spike_ratio = (latest - previous) / previous
-    if spike_ratio > 0.30:
         existing = Alert.objects.filter(
             location=location,
-            alert_type=Alert.TYPE_SPIKE,
+            alert_type=alert_type,
             status=Alert.STATUS_ACTIVE,
         ).first()
-        if not existing:
-            alert = Alert.objects.create(
-                location=location,
-                alert_type=Alert.TYPE_SPIKE,
-                message=(
-                    f"Sudden spike at {location.name}: "
-                    f"{previous} → {latest} people (+{spike_ratio*100:.0f}%)"
-                ),
-                people_count_at_trigger=latest,
-                occupancy_at_trigger=location.occupancy_percentage,
-            )
-            _send_notifications(alert)
+        if existing:
+            continue
 
+        alert = Alert.objects.create(
+            location=location,
+            alert_type=alert_type,
+            message=_rule_message(rule, location, detail),
+            people_count_at_trigger=location.current_count,
+            occupancy_at_trigger=location.occupancy_percentage,
+        )
+        _send_notifications(alert)
+        logger.warning(f"ALERT: {alert}")
 
-def _send_notifications(alert):
-    """Send email/console notification for an alert."""
-    from django.core.mail import send_mail
-    from django.conf import settings
 
-    subject = f"[CrowdMonitor] {alert.alert_type} — {alert.location.name}"
-    body = alert.message
+def _resolve_active(location, alert_type):
+    """Resolve open alerts one by one so save signals keep dashboard counters in sync."""
+    from .models import Alert
+
+    for alert in Alert.objects.filter(
+        location=location,
+        alert_type=alert_type,
+        status=Alert.STATUS_ACTIVE,
+    ):
+        alert.resolve()
 
-    try:
-        send_mail(
-            subject=subject,
-            message=body,
-            from_email=settings.ALERT_EMAIL_FROM,
-            recipient_list=settings.ALERT_EMAIL_TO,
-            fail_silently=True,
+
+def _rule_message(rule, location, detail):
+    from .models import AlertRule
+
+    if rule.rule_type == AlertRule.TYPE_SUSTAINED:
+        return (
+            f"{location.name} has been above {rule.threshold*100:.0f}% capacity "
+            f"for {detail['minutes']:.0f} min. "
+            f"Current: {location.current_count}/{location.capacity_limit} "
+            f"({location.occupancy_percentage}%)"
         )
+    if rule.rule_type == AlertRule.TYPE_RISE:
+        return (
+            f"Sudden spike at {location.name}: "
+            f"{detail['base']} → {location.current_count} people (+{detail['ratio']*100:.0f}%)"
+        )
+    return (
+        f"Rapid change at {location.name}: {detail['slope']:+.1f} people/min "
+        f"over {rule.window_seconds}s"
+    )
+
+
+def _send_notifications(alert):
+    """Queue email notifications for an alert; delivery happens in the background."""
+    from .dispatcher import enqueue
+
+    try:
+        enqueue(alert)
     except Exception as e:
-        logger.error(f"Failed to send alert email: {e}")
+        logger.error(f"Failed to queue alert notification: {e}")
+        return
 
-    logger.info(f"NOTIFICATION SENT: {subject} | {body}")
+    logger.info(f"NOTIFICATION QUEUED: {alert.alert_type} — {alert.location.name}")
@@ -95,6 +95,28 @@ else:
         }
     }
 
+# -----------------------------
+# Cache & live location state (locations/live.py)
+# -----------------------------
+# Redis shares current counts between web and detection processes; the
+# per-process LocMemCache stand-in only sees its own writes until they flush.
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 100000},
+        },
+    }
+LIVE_STATE_CACHE = "default"
+LIVE_STATE_FLUSH_SECONDS = 5      # batch interval for writing counts to the Location table; 0 writes through
+
 # -----------------------------
 # Database
 # -----------------------------
@@ -118,4 +140,91 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Other settings
 # -----------------------------
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True
+
+# -----------------------------
+# Alert notifications
+# -----------------------------
+# Emails are queued in the alerts.Notification outbox and delivered in the
+# background. Set ALERT_DISPATCHER_IN_PROCESS=False and run
+# `manage.py dispatch_notifications` to deliver from a dedicated process.
+ALERT_DISPATCHER_IN_PROCESS = os.environ.get("ALERT_DISPATCHER_IN_PROCESS", "True") == "True"
+ALERT_DISPATCH_INTERVAL = 5      # seconds between outbox polls
+ALERT_DIGEST_WINDOW = 60         # seconds; later alerts to a recipient are merged
+ALERT_MAX_ATTEMPTS = 5
+ALERT_RETRY_BACKOFF = 30         # seconds, doubled per failed attempt
+EMAIL_TIMEOUT = 10               # seconds per SMTP operation, so a batch cannot hang
+ALERT_CLAIM_TIMEOUT = 900        # seconds before a SENDING row is re-claimed; keep above the
+                                 # slowest batch, about len(ALERT_EMAIL_TO) x EMAIL_TIMEOUT
+
+# Global sliding-window alert rules used when no global AlertRule rows exist.
+# See alerts/rules.py for rule semantics.
+CROWD_ALERT_RULES = [
+    {'rule_type': 'RISE', 'threshold': 0.30, 'window_seconds': 0},         # >30% jump since previous reading
+    {'rule_type': 'SUSTAINED', 'threshold': 0.80, 'window_seconds': 600},  # >=80% for 10 minutes
+]
+
+# -----------------------------
+# Forecasting (locations/forecasting.py)
+# -----------------------------
+FORECAST_STEP_SECONDS = 300      # forecast resolution
+FORECAST_HISTORY_DAYS = 28       # history used for the hour-of-week baseline
+FORECAST_SMOOTHING_HOURS = 24    # history replayed into the exponential smoother
+FORECAST_REFIT_SECONDS = 3600    # full refit interval (run_detection or refit_forecasts)
+FORECAST_RELOAD_SECONDS = 60     # other processes check for a newer fit this often
+FORECAST_ALERT_MINUTES = 30      # raise PREDICTED alerts this far ahead; 0 disables
+
+# -----------------------------
+# Occupancy heatmaps (locations/heatmaps.py)
+# -----------------------------
+HEATMAP_SLOT_MINUTES = 60        # time-of-week bin size; must divide 1440. Run rebuild_heatmaps after changing
+HEATMAP_FLUSH_SECONDS = 10       # fold new readings into profiles this often; 0 writes each through
+HEATMAP_SETTLE_SECONDS = 300     # keep ids of readings this recent so late-committing lower ids still get folded
+
+# -----------------------------
+# Spatial index (locations/spatial.py)
+# -----------------------------
+SPATIAL_INDEX_CELL_DEG = 0.05    # grid cell size in degrees (~5 km)
+SPATIAL_INDEX_TTL = 60           # seconds before picking up other processes' edits
+
+# ONNX model for `--mode onnx` (create with `manage.py export_onnx`)
+ONNX_MODEL_PATH = os.environ.get("ONNX_MODEL_PATH", str(BASE_DIR / "yolov8n.onnx"))
+
+# Most images accepted by one POST /api/detection/detect/ batch
+DETECTION_MAX_BATCH = 32
+
+# -----------------------------
+# Detection scheduling (detection/scheduler.py)
+# -----------------------------
+DETECTION_INTERVAL = 5           # average seconds between polls of one camera
+DETECTION_MIN_INTERVAL = 1       # per-camera bounds; Location.poll_min/max_seconds override
+DETECTION_MAX_INTERVAL = 60
+DETECTION_REFRESH_SECONDS = 60   # how often the camera list is re-read
+
+# -----------------------------
+# Detection result cache (detection/cache.py)
+# -----------------------------
+DETECTION_CACHE_SIZE = 256       # frames kept; 0 disables the cache
+DETECTION_CACHE_TTL = 30         # seconds a cached result stays valid
+DETECTION_CACHE_MAX_DISTANCE = 0  # near-match Hamming distance between 64-bit frame hashes; 0 = exact only
+
+# Padding (fraction of the frame) around location ROIs when cropping before
+# inference (detection/zones.py), so people at an ROI edge keep their whole body
+DETECTION_ROI_MARGIN = 0.1
+
+# Seconds between pipeline timing summaries in the log (dashboard/metrics.py); 0 disables
+METRICS_LOG_INTERVAL = 60
+
+# Camera lease length for `run_detection --shard` (detection/leases.py); a dead
+# worker's cameras are taken over within about this many seconds
+DETECTION_LEASE_SECONDS = 30
+
+# -----------------------------
+# MJPEG live view (detection/streaming.py)
+# -----------------------------
+STREAM_MAX_FPS = 5               # frames encoded per second per location (and viewer cap)
+STREAM_MAX_WIDTH = 960           # annotated frames are downscaled to this width
+STREAM_JPEG_QUALITY = 75
+STREAM_IDLE_SECONDS = 30         # end a viewer's stream after this long without frames
+STREAM_MAX_SECONDS = 3600        # longest single viewer connection
+STREAM_WATCH_SECONDS = 10        # viewers keep a location marked watched this long; unwatched ones are not encoded or relayed
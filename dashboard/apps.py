@@ -2,3 +2,18 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+        from alerts.models import Alert
+        from locations.models import Location
+        from . import counters
+
+        pre_save.connect(counters.alert_saving, sender=Alert, dispatch_uid='counters_alert_saving')
+        post_save.connect(counters.alert_saved, sender=Alert, dispatch_uid='counters_alert_saved')
+        pre_delete.connect(counters.alert_deleting, sender=Alert, dispatch_uid='counters_alert_deleting')
+        post_delete.connect(counters.alert_deleted, sender=Alert, dispatch_uid='counters_alert_deleted')
+        pre_save.connect(counters.location_saving, sender=Location, dispatch_uid='counters_location_saving')
+        post_save.connect(counters.location_saved, sender=Location, dispatch_uid='counters_location_saved')
+        pre_delete.connect(counters.location_deleting, sender=Location, dispatch_uid='counters_location_deleting')
+        post_delete.connect(counters.location_deleted, sender=Location, dispatch_uid='counters_location_deleted')
@@ -0,0 +1,214 @@
+"""
+Materialized counters for the dashboard.
+
+Signal handlers keep per-key totals in sync with Alert and Location rows:
+
+    alerts.active            active alerts
+    alerts.type.<TYPE>       active alerts by type
+    alerts.location.<id>     active alerts by location
+    locations.active         active locations
+    density.<LEVEL>          active locations per density level
+
+pre_save / pre_delete read the row's stored status fields with SELECT ...
+FOR UPDATE, and post_save / post_delete apply just the delta between those
+and the saved values. Alert and Location saves (and deletes) run inside a
+transaction, so the lock holds until the counters are updated and they commit
+or roll back with the row: two copies of one Alert resolving it concurrently
+decrement once. `rebuild()` recomputes everything from scratch
+(after loaddata or raw SQL edits: `python manage.py rebuild_counters`).
+"""
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Counter
+
+INITIALIZED_KEY = 'counters.initialized'
+
+
+# ---------------------------------------------------------------------------
+# Read side
+# ---------------------------------------------------------------------------
+
+def get(key, default=0):
+    _ensure_initialized()
+    value = Counter.objects.filter(key=key).values_list('value', flat=True).first()
+    return default if value is None else value
+
+
+def summary():
+    """All counters grouped for the dashboard / summary API."""
+    _ensure_initialized()
+    values = dict(Counter.objects.exclude(key=INITIALIZED_KEY).values_list('key', 'value'))
+
+    def group(prefix, cast=str):
+        return {
+            cast(k[len(prefix):]): v for k, v in values.items()
+            if k.startswith(prefix) and v
+        }
+
+    return {
+        'active_alerts': values.get('alerts.active', 0),
+        'active_alerts_by_type': group('alerts.type.'),
+        'active_alerts_by_location': group('alerts.location.', int),
+        'active_locations': values.get('locations.active', 0),
+        'locations_by_density': group('density.'),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Write side
+# ---------------------------------------------------------------------------
+
+def incr(key, delta=1):
+    if not delta:
+        return
+    updated = Counter.objects.filter(key=key).update(value=F('value') + delta)
+    if not updated:
+        Counter.objects.get_or_create(key=key)
+        Counter.objects.filter(key=key).update(value=F('value') + delta)
+
+
+def _apply(old_keys, new_keys):
+    for key in old_keys:
+        if key not in new_keys:
+            incr(key, -1)
+    for key in new_keys:
+        if key not in old_keys:
+            incr(key, 1)
+
+
+ALERT_FIELDS = ('status', 'alert_type', 'location_id')
+LOCATION_FIELDS = ('is_active', 'density_level')
+
+
+def _alert_keys(status, alert_type, location_id):
+    from alerts.models import Alert
+
+    if status != Alert.STATUS_ACTIVE:
+        return ()
+    return ('alerts.active', f'alerts.type.{alert_type}', f'alerts.location.{location_id}')
+
+
+def _location_keys(is_active, density_level):
+    if not is_active:
+        return ()
+    return ('locations.active', f'density.{density_level}')
+
+
+def _stored_state(sender, instance, fields):
+    """The row's committed values, locked until the saving transaction ends; None if no row."""
+    if instance.pk is None:
+        return None
+    return sender.objects.select_for_update().filter(pk=instance.pk).values_list(*fields).first()
+
+
+def _written(field, update_fields):
+    return update_fields is None or field in update_fields or field.removesuffix('_id') in update_fields
+
+
+def _tracked(fields, update_fields):
+    return any(_written(f, update_fields) for f in fields)
+
+
+def _saved_state(instance, fields, old, update_fields):
+    """Values the row holds after the save: fields that were not written keep their stored value."""
+    d = instance.__dict__
+    return tuple(
+        d.get(field) if old is None or (field in d and _written(field, update_fields)) else old[i]
+        for i, field in enumerate(fields)
+    )
+
+
+def _lock_state(sender, instance, fields, update_fields=None):
+    # Re-read under a row lock rather than trusting the values the instance was
+    # loaded with: a stale copy saving the same transition then sees the
+    # already-applied state, and deferred fields are never mistaken for changes.
+    if _tracked(fields, update_fields):
+        instance._counted = _stored_state(sender, instance, fields)
+
+
+def _apply_save(instance, fields, keys, update_fields):
+    if not _tracked(fields, update_fields):
+        return
+    old = instance.__dict__.pop('_counted', None)
+    new = _saved_state(instance, fields, old, update_fields)
+    _apply(keys(*old) if old else (), keys(*new))
+
+
+def _apply_delete(instance, keys):
+    old = instance.__dict__.pop('_counted', None)
+    if old:
+        _apply(keys(*old), ())
+
+
+def alert_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        _lock_state(sender, instance, ALERT_FIELDS, update_fields)
+
+
+def alert_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        _apply_save(instance, ALERT_FIELDS, _alert_keys, update_fields)
+
+
+def alert_deleting(sender, instance, **kwargs):
+    _lock_state(sender, instance, ALERT_FIELDS)
+
+
+def alert_deleted(sender, instance, **kwargs):
+    _apply_delete(instance, _alert_keys)
+
+
+def location_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        _lock_state(sender, instance, LOCATION_FIELDS, update_fields)
+
+
+def location_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        _apply_save(instance, LOCATION_FIELDS, _location_keys, update_fields)
+
+
+def location_deleting(sender, instance, **kwargs):
+    _lock_state(sender, instance, LOCATION_FIELDS)
+
+
+def location_deleted(sender, instance, **kwargs):
+    _apply_delete(instance, _location_keys)
+
+
+# ---------------------------------------------------------------------------
+# Bootstrap / repair
+# ---------------------------------------------------------------------------
+
+def _ensure_initialized():
+    if not Counter.objects.filter(key=INITIALIZED_KEY).exists():
+        rebuild()
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute every counter from the Alert and Location tables."""
+    from alerts.models import Alert
+    from locations.models import Location
+
+    values = {}
+    active = Alert.objects.filter(status=Alert.STATUS_ACTIVE)
+    values['alerts.active'] = active.count()
+    for row in active.values('alert_type').annotate(n=Count('id')):
+        values[f"alerts.type.{row['alert_type']}"] = row['n']
+    for row in active.values('location_id').annotate(n=Count('id')):
+        values[f"alerts.location.{row['location_id']}"] = row['n']
+
+    locations = Location.objects.filter(is_active=True)
+    values['locations.active'] = locations.count()
+    for row in locations.values('density_level').annotate(n=Count('id')):
+        values[f"density.{row['density_level']}"] = row['n']
+
+    Counter.objects.select_for_update().all().delete()
+    Counter.objects.bulk_create(
+        [Counter(key=k, value=v) for k, v in values.items()]
+        + [Counter(key=INITIALIZED_KEY, value=1)]
+    )
+    return values
@@ -0,0 +1,22 @@
+"""
+Django management command to recompute materialized dashboard counters.
+
+Run after loaddata or any bulk/raw edits that bypass model signals.
+
+Usage:
+    python manage.py rebuild_counters
+"""
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Recompute dashboard counters from the Alert and Location tables.'
+
+    def handle(self, *args, **options):
+        from dashboard.counters import rebuild
+
+        values = rebuild()
+        for key, value in sorted(values.items()):
+            self.stdout.write(f"  {key} = {value}")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(values)} counter(s)."))
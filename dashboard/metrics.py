@@ -0,0 +1,256 @@
+"""
+Low-overhead in-process pipeline metrics with Prometheus text exposition.
+
+Wrap one unit of work (a camera poll, an update request) in
+`metrics.pipeline(name)`; inside it, `metrics.stage(name)` times each step.
+The pipeline context also counts the SQL queries it issued. Stage timers
+used outside any pipeline (e.g. inside the detector) are labelled with
+pipeline="none".
+
+    with metrics.pipeline('run_detection'):
+        with metrics.stage('db_write'):
+            ...
+
+Each process keeps its own registry: the web process serves it at /metrics,
+and run_detection can serve its own with --metrics-port. A one-line-per-stage
+summary (count, mean, max since the previous summary) is logged every
+METRICS_LOG_INTERVAL seconds.
+"""
+
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+HELP = {
+    'crowd_stage_seconds': ('histogram', 'Time spent per pipeline stage'),
+    'crowd_pipeline_seconds': ('histogram', 'End-to-end time per pipeline run'),
+    'crowd_pipeline_queries': ('histogram', 'SQL queries issued per pipeline run'),
+    'crowd_pipeline_runs_total': ('counter', 'Completed pipeline runs'),
+    'crowd_pipeline_errors_total': ('counter', 'Pipeline runs that raised'),
+}
+
+_pipeline = contextvars.ContextVar('metrics_pipeline', default=None)
+
+
+class _Histogram:
+    __slots__ = ('bounds', 'counts', 'sum', 'count', 'w_count', 'w_sum', 'w_max')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.w_count = 0
+        self.w_sum = 0.0
+        self.w_max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.w_count += 1
+        self.w_sum += value
+        if value > self.w_max:
+            self.w_max = value
+
+
+def _labels(items):
+    if not items:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in items
+    )
+    return '{' + body + '}'
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}      # (name, ((label, value), ...)) -> _Histogram
+        self.counters = {}        # (name, ((label, value), ...)) -> float
+        self._summary_at = time.monotonic()
+
+    # ── Recording ─────────────────────────────────────────────────────────
+    def observe(self, name, value, buckets=TIME_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = _Histogram(buckets)
+            hist.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(
+                'crowd_stage_seconds', time.perf_counter() - start,
+                pipeline=_pipeline.get() or 'none', stage=name,
+            )
+
+    @contextmanager
+    def pipeline(self, name):
+        """Time one run end-to-end, count its queries and label nested stages."""
+        from django.db import connection
+
+        queries = [0]
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        token = _pipeline.set(name)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count):
+                yield
+        except Exception:
+            self.inc('crowd_pipeline_errors_total', pipeline=name)
+            raise
+        finally:
+            _pipeline.reset(token)
+            self.observe('crowd_pipeline_seconds', time.perf_counter() - start, pipeline=name)
+            self.observe('crowd_pipeline_queries', queries[0], QUERY_BUCKETS, pipeline=name)
+            self.inc('crowd_pipeline_runs_total', pipeline=name)
+            self.maybe_log_summary()
+
+    # ── Output ────────────────────────────────────────────────────────────
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            hists = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        lines = []
+        described = set()
+
+        def describe(name, fallback):
+            if name not in described:
+                kind, text = HELP.get(name, (fallback, name))
+                lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} {kind}')
+                described.add(name)
+
+        for (name, labels), hist in hists:
+            describe(name, 'histogram')
+            cumulative = 0
+            for bound, n in zip(hist.bounds, hist.counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{_labels(labels + (("le", repr(float(bound))),))} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {hist.count}')
+            lines.append(f'{name}_sum{_labels(labels)} {hist.sum}')
+            lines.append(f'{name}_count{_labels(labels)} {hist.count}')
+        for (name, labels), value in counters:
+            describe(name, 'counter')
+            lines.append(f'{name}{_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, reset=True) -> str:
+        """Per-stage count / mean / max since the previous summary."""
+        parts = []
+        with self._lock:
+            for (name, labels), hist in sorted(self.histograms.items()):
+                if name not in ('crowd_stage_seconds', 'crowd_pipeline_seconds') or not hist.w_count:
+                    continue
+                label = dict(labels)
+                stage = label.get('stage', 'total')
+                parts.append(
+                    f"{label.get('pipeline')}.{stage} n={hist.w_count} "
+                    f"mean={hist.w_sum / hist.w_count * 1000:.1f}ms max={hist.w_max * 1000:.1f}ms"
+                )
+                if reset:
+                    hist.w_count, hist.w_sum, hist.w_max = 0, 0.0, 0.0
+        return ' | '.join(parts)
+
+    def maybe_log_summary(self):
+        interval = getattr(settings, 'METRICS_LOG_INTERVAL', 60)
+        now = time.monotonic()
+        if not interval or now - self._summary_at < interval:
+            return
+        self._summary_at = now
+        text = self.summary()
+        if text:
+            logger.info(f"Pipeline timings: {text}")
+
+    def serve(self, port, host='0.0.0.0'):
+        """Serve /metrics from a daemon thread (for worker processes without a web server)."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True, name='metrics-http').start()
+        return server
+
+
+class ProfileCapture:
+    """
+    On-demand cProfile snapshots: `request(n)` profiles the next n units of
+    work wrapped in `capture()` and dumps them to one .prof file in `directory`.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.remaining = 0
+        self._profile = None
+
+    def request(self, n):
+        self.remaining = n
+
+    @contextmanager
+    def capture(self):
+        if not self.remaining:
+            yield
+            return
+        import cProfile
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+        self._profile.enable()
+        try:
+            yield
+        finally:
+            self._profile.disable()
+            self.remaining -= 1
+            if not self.remaining:
+                self._dump()
+
+    def _dump(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, time.strftime('detection-%Y%m%d-%H%M%S.prof'))
+        self._profile.dump_stats(path)
+        self._profile = None
+        logger.info(f"Wrote profile snapshot: {path}")
+
+
+metrics = Registry()
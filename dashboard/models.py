@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class Counter(models.Model):
+    """
+    Materialized dashboard counter, maintained by dashboard.counters.
+    Keys look like 'alerts.active', 'alerts.type.SPIKE', 'alerts.location.3',
+    'locations.active', 'density.HIGH'.
+    """
+
+    key = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['key']
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
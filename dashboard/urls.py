@@ -5,4 +5,6 @@ urlpatterns = [
     path('', views.index, name='dashboard'),
     path('location/<int:pk>/', views.location_detail, name='location-detail'),
     path('alerts/', views.alerts_view, name='alerts'),
+    path('api/dashboard/summary/', views.summary, name='dashboard-summary'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
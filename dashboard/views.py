@@ -1,20 +1,30 @@
+from django.http import HttpResponse
 from django.shortcuts import render, get_object_or_404
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
 from locations.models import Location
 from alerts.models import Alert
+from . import counters
 
 
 def index(request):
-    locations = Location.objects.filter(is_active=True)
-    active_alerts = Alert.objects.filter(status=Alert.STATUS_ACTIVE).count()
+    from locations.live import live_state
+
+    locations = live_state.apply(Location.objects.filter(is_active=True).only(
+        'id', 'name', 'latitude', 'longitude', 'capacity_limit',
+        'current_count', 'density_level', 'last_updated',
+    ))
     context = {
         'locations': locations,
-        'active_alerts': active_alerts,
+        'active_alerts': counters.get('alerts.active'),
     }
     return render(request, 'dashboard/index.html', context)
 
 
 def location_detail(request, pk):
-    location = get_object_or_404(Location, pk=pk, is_active=True)
+    from locations.live import live_state
+
+    location = live_state.apply([get_object_or_404(Location, pk=pk, is_active=True)])[0]
     logs = location.logs.all()[:100]
     return render(request, 'dashboard/location_detail.html', {
         'location': location,
@@ -23,5 +33,29 @@ def location_detail(request, pk):
 
 
 def alerts_view(request):
+    # Served by the -triggered_at index: a top-50 scan, not a full sort.
     alerts = Alert.objects.select_related('location').order_by('-triggered_at')[:50]
-    return render(request, 'dashboard/alerts.html', {'alerts': alerts})
+    return render(request, 'dashboard/alerts.html', {
+        'alerts': alerts,
+        'summary': counters.summary(),
+    })
+
+
+@api_view(['GET'])
+def summary(request):
+    """GET /api/dashboard/summary/ — materialized alert and density counters."""
+    return Response(counters.summary())
+
+
+def metrics_view(request):
+    """Prometheus text exposition of this process's pipeline metrics."""
+    from detection.cache import frame_cache
+    from .metrics import metrics
+
+    lines = [metrics.render()]
+    cache = frame_cache.stats()
+    for key in ('hits', 'near_hits', 'misses', 'evictions'):
+        lines.append(f'# TYPE crowd_detection_cache_{key}_total counter\n'
+                     f'crowd_detection_cache_{key}_total {cache[key]}\n')
+    lines.append(f'# TYPE crowd_detection_cache_entries gauge\ncrowd_detection_cache_entries {cache["entries"]}\n')
+    return HttpResponse(''.join(lines), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,14 @@
+from django.contrib import admin
+from .models import DetectionWorker, LocationLease
+
+
+@admin.register(DetectionWorker)
+class DetectionWorkerAdmin(admin.ModelAdmin):
+    list_display = ['worker_id', 'hostname', 'started_at', 'heartbeat_at']
+    readonly_fields = ['started_at', 'heartbeat_at']
+
+
+@admin.register(LocationLease)
+class LocationLeaseAdmin(admin.ModelAdmin):
+    list_display = ['location', 'worker_id', 'acquired_at', 'expires_at']
+    list_filter = ['worker_id']
@@ -0,0 +1,167 @@
+"""
+LRU cache of detection results keyed by a perceptual hash of the frame.
+
+Frames are reduced to a 64-bit difference hash (dHash: 9x8 grayscale,
+one bit per horizontal gradient sign), which is stable under re-encoding,
+small noise and brightness changes. A lookup first tries an exact hash
+match, then — only if DETECTION_CACHE_MAX_DISTANCE > 0 (default 0: exact
+matches only) — the nearest stored hash within that Hamming distance,
+scanned vectorised over all slots. Near matches trade accuracy for hits:
+a frame a few bits away can differ by a person or two.
+
+Entries are grouped by (mode, confidence, frame size) so results are never
+shared between detectors or resolutions; a group's id is dropped with its
+last slot, so the map stays bounded by the cache size. Use the module-level
+`frame_cache`; size, TTL and distance come from settings.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+_BIT_WEIGHTS = (1 << np.arange(64, dtype=np.uint64))
+
+
+def dhash(frame: np.ndarray) -> int:
+    """64-bit difference hash of a BGR or grayscale frame."""
+    import cv2
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.sum(_BIT_WEIGHTS[bits]))
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """Set bits per element of a uint64 array."""
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class FrameCache:
+    def __init__(self, size=256, ttl=30.0, max_distance=0):
+        self.size = size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+
+        # Slot storage so near-match scans are a single vectorised pass.
+        self.hashes = np.zeros(size, dtype=np.uint64)
+        self.groups = np.full(size, -1, dtype=np.int64)     # -1 = free slot
+        self.expires = np.zeros(size)
+        self.values = [None] * size
+        self._lru = OrderedDict()                             # (group, hash) -> slot
+        self._group_ids = {}                                  # key -> group id, while it holds slots
+        self._group_keys = {}                                 # group id -> key
+        self._group_slots = {}                                # group id -> slots in use
+        self._next_group = 0
+        self._free = list(range(size - 1, -1, -1))
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def _group(self, key):
+        group = self._group_ids.get(key)
+        if group is None:
+            group = self._group_ids[key] = self._next_group
+            self._group_keys[group] = key
+            self._group_slots[group] = 0
+            self._next_group += 1
+        return group
+
+    def _release(self, slot):
+        group = int(self.groups[slot])
+        self._lru.pop((group, int(self.hashes[slot])), None)
+        self._group_slots[group] -= 1
+        if not self._group_slots[group]:
+            del self._group_slots[group]
+            del self._group_ids[self._group_keys.pop(group)]
+        self.groups[slot] = -1
+        self.values[slot] = None
+        self._free.append(slot)
+
+    # ── Lookup / insert ───────────────────────────────────────────────────
+    def get(self, key, h):
+        """Cached value for `key` (hashable group) and frame hash `h`, or None."""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            group = self._group_ids.get(key)
+            if group is None:
+                self.misses += 1
+                return None
+            slot = self._lru.get((group, h))
+            near = False
+            if slot is None and self.max_distance:
+                live = np.nonzero((self.groups == group) & (self.expires > now))[0]
+                if len(live):
+                    dist = _popcount(self.hashes[live] ^ np.uint64(h))
+                    best = int(np.argmin(dist))
+                    if dist[best] <= self.max_distance:
+                        slot, near = int(live[best]), True
+
+            if slot is None or self.expires[slot] <= now:
+                if slot is not None:
+                    self._release(slot)
+                self.misses += 1
+                return None
+
+            self._lru.move_to_end((group, int(self.hashes[slot])))
+            if near:
+                self.near_hits += 1
+            else:
+                self.hits += 1
+            return self.values[slot]
+
+    def put(self, key, h, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            group = self._group_ids.get(key)
+            slot = self._lru.get((group, h))
+            if slot is None:
+                if not self._free:
+                    self._release(next(iter(self._lru.values())))
+                    self.evictions += 1
+                group = self._group(key)
+                slot = self._free.pop()
+                self._lru[(group, h)] = slot
+                self._group_slots[group] += 1
+            else:
+                self._lru.move_to_end((group, h))
+            self.hashes[slot] = np.uint64(h)
+            self.groups[slot] = group
+            self.expires[slot] = time.monotonic() + self.ttl
+            self.values[slot] = value
+
+    def clear(self):
+        with self._lock:
+            for slot in list(self._lru.values()):
+                self._release(slot)
+
+    def stats(self):
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            'size': self.size,
+            'entries': len(self._lru),
+            'hits': self.hits,
+            'near_hits': self.near_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round((self.hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+frame_cache = FrameCache(
+    size=getattr(settings, 'DETECTION_CACHE_SIZE', 256),
+    ttl=getattr(settings, 'DETECTION_CACHE_TTL', 30),
+    max_distance=getattr(settings, 'DETECTION_CACHE_MAX_DISTANCE', 0),
+)
@@ -1,8 +1,9 @@
 """
 Crowd Detection Engine
-Supports two modes:
+Supports three modes:
   1. Haar Cascade  — fast, CPU-only
   2. YOLO          — more accurate
+  3. ONNX          — YOLO via ONNX Runtime on CPU, optionally INT8
 
 Usage:
     engine = YOLODetector()   # or HaarDetector()
@@ -10,10 +11,16 @@ Usage:
 """
 
 import logging
+from collections import namedtuple
+
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
+TrackingResult = namedtuple(
+    'TrackingResult', ['count', 'entries', 'exits', 'frames', 'detections'],
+)
+
 
 # ---------------------------------------------------------------------------
 # Base class
@@ -23,33 +30,185 @@ class BaseDetector:
     def detect_from_frame(self, frame: np.ndarray) -> int:
         raise NotImplementedError
 
-    def detect_from_camera(self, source=0, duration_seconds=5) -> int:
-        """Open a camera, grab frames, return average person count."""
+    def detect_boxes(self, frame: np.ndarray) -> np.ndarray:
+        """Person boxes as an (N, 5) array of [x1, y1, x2, y2, confidence]."""
+        raise NotImplementedError
+
+    def detect_boxes_batch(self, frames) -> list:
+        """detect_boxes for several frames; backends that can batch override this."""
+        return [self.detect_boxes(frame) for frame in frames]
+
+    def detect_boxes_in(self, frame: np.ndarray, zones) -> np.ndarray:
+        """detect_boxes on the zones' ROI crop, with boxes in full-frame coordinates."""
+        crop, (ox, oy) = zones.crop(frame)
+        boxes = self.detect_boxes(crop)
+        if len(boxes):
+            boxes = boxes.copy()
+            boxes[:, [0, 2]] += ox
+            boxes[:, [1, 3]] += oy
+        return boxes
+
+    def _camera_frames(self, source, duration_seconds):
+        """Yield frames from a camera for `duration_seconds`; nothing if it can't be opened."""
+        from dashboard.metrics import metrics
         try:
             import cv2
         except ImportError:
             logger.error("OpenCV not installed. Run: pip install opencv-python")
-            return 0
+            return
 
-        cap = cv2.VideoCapture(source)
+        with metrics.stage('open'):
+            cap = cv2.VideoCapture(source)
         if not cap.isOpened():
             logger.error(f"Cannot open camera source: {source}")
-            return 0
+            return
 
-        counts = []
         import time
         end_time = time.time() + duration_seconds
+        try:
+            while time.time() < end_time:
+                frame = _read_frame(cap, metrics)
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            cap.release()
+
+    def detect_from_camera(self, source=0, duration_seconds=5, on_frame=None) -> int:
+        """
+        Open a camera, grab frames, return average person count.
+        on_frame(frame, boxes), if given, is called for every processed frame.
+        """
+        from dashboard.metrics import metrics
 
-        while time.time() < end_time:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            count = self.detect_from_frame(frame)
+        counts = []
+        for frame in self._camera_frames(source, duration_seconds):
+            with metrics.stage('inference'):
+                if on_frame is None:
+                    count = self.detect_from_frame(frame)
+                else:
+                    boxes = self.detect_boxes(frame)
+                    count = len(boxes)
+            if on_frame is not None:
+                on_frame(frame, boxes)
             counts.append(count)
 
-        cap.release()
         return int(np.mean(counts)) if counts else 0
 
+    def detect_zones_from_camera(self, zones, source=0, duration_seconds=5, on_frame=None) -> np.ndarray:
+        """
+        Like detect_from_camera, but one inference per frame on the zones' ROI
+        crop gives an average count for every zone (detection/zones.py).
+        on_frame(frame, boxes, inside) also receives the (zones, boxes) membership.
+        """
+        from dashboard.metrics import metrics
+
+        totals = np.zeros(len(zones))
+        frames = 0
+        for frame in self._camera_frames(source, duration_seconds):
+            with metrics.stage('inference'):
+                boxes = self.detect_boxes_in(frame, zones)
+            inside = zones.assign(boxes, frame.shape)
+            totals += inside.sum(axis=1)
+            frames += 1
+            if on_frame is not None:
+                on_frame(frame, boxes, inside)
+
+        return (totals / max(frames, 1)).astype(int)
+
+    def track_from_camera(self, source=0, duration_seconds=5, detect_every=5, line=None,
+                          on_frame=None):
+        """
+        Like detect_from_camera, but runs the detector only every `detect_every`
+        frames and tracks people in between with sparse optical flow.
+
+        line: normalized (x1, y1, x2, y2) counting line, or None.
+        on_frame(frame, boxes) receives every frame with the current track boxes.
+        Returns a TrackingResult; `count` is the median confirmed-track count.
+        """
+        from detection.tracker import IoUTracker
+        from dashboard.metrics import metrics
+        try:
+            import cv2
+        except ImportError:
+            logger.error("OpenCV not installed. Run: pip install opencv-python")
+            return TrackingResult(0, 0, 0, 0, 0)
+
+        tracker = None
+        prev_gray = None
+        counts = []
+        frames = detections = 0
+
+        for frame in self._camera_frames(source, duration_seconds):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+            if tracker is None:
+                h, w = gray.shape
+                pixel_line = None if line is None else (
+                    line[0] * w, line[1] * h, line[2] * w, line[3] * h
+                )
+                tracker = IoUTracker(line=pixel_line)
+
+            if frames % max(detect_every, 1) == 0:
+                with metrics.stage('inference'):
+                    boxes = self.detect_boxes(frame)
+                tracker.update(boxes)
+                detections += 1
+            elif prev_gray is not None and len(tracker.boxes):
+                with metrics.stage('track'):
+                    tracker.propagate(_flow_displacements(prev_gray, gray, tracker.boxes))
+
+            if on_frame is not None:
+                on_frame(frame, tracker.boxes)
+            counts.append(tracker.count)
+            prev_gray = gray
+            frames += 1
+
+        if tracker is None:
+            return TrackingResult(0, 0, 0, 0, 0)
+        return TrackingResult(
+            count=int(np.median(counts)) if counts else 0,
+            entries=tracker.entries,
+            exits=tracker.exits,
+            frames=frames,
+            detections=detections,
+        )
+
+
+def _read_frame(cap, metrics):
+    """cap.read() split into its capture (grab) and decode (retrieve) halves for timing."""
+    with metrics.stage('capture'):
+        if not cap.grab():
+            return None
+    with metrics.stage('decode'):
+        ret, frame = cap.retrieve()
+    return frame if ret else None
+
+
+def _flow_displacements(prev_gray, gray, boxes: np.ndarray) -> np.ndarray:
+    """Median Lucas-Kanade displacement of a 3x3 point grid inside each box."""
+    import cv2
+
+    fx = np.array([0.3, 0.5, 0.7])
+    gx, gy = np.meshgrid(fx, fx)
+    gx, gy = gx.ravel(), gy.ravel()
+    w = (boxes[:, 2] - boxes[:, 0])[:, None]
+    h = (boxes[:, 3] - boxes[:, 1])[:, None]
+    px = boxes[:, 0:1] + w * gx
+    py = boxes[:, 1:2] + h * gy
+    pts = np.stack([px, py], axis=-1).reshape(-1, 1, 2).astype(np.float32)
+
+    new_pts, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, pts, None)
+    delta = (new_pts - pts).reshape(len(boxes), len(gx), 2)
+    ok = status.reshape(len(boxes), len(gx)).astype(bool)
+    delta[~ok] = np.nan
+    # Boxes whose points were all lost keep still (NaN -> 0).
+    import warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        med = np.nanmedian(delta, axis=1)
+    return np.nan_to_num(med)
+
 
 # ---------------------------------------------------------------------------
 # Option 1: Haar Cascade
@@ -72,17 +231,27 @@ class HaarDetector(BaseDetector):
             logger.warning("OpenCV not available; HaarDetector in stub mode.")
 
     def detect_from_frame(self, frame: np.ndarray) -> int:
+        return len(self.detect_boxes(frame))
+
+    def detect_boxes(self, frame: np.ndarray) -> np.ndarray:
         if self.hog is None:
-            return 0
+            return np.zeros((0, 5))
         import cv2
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        rects, _ = self.hog.detectMultiScale(
+        rects, weights = self.hog.detectMultiScale(
             gray,
             winStride=(8, 8),
             padding=(4, 4),
             scale=1.05,
         )
-        return len(rects)
+        if not len(rects):
+            return np.zeros((0, 5))
+        rects = np.asarray(rects, dtype=float)
+        return np.column_stack([
+            rects[:, 0], rects[:, 1],
+            rects[:, 0] + rects[:, 2], rects[:, 1] + rects[:, 3],
+            np.asarray(weights, dtype=float).ravel(),
+        ])
 
 
 # ---------------------------------------------------------------------------
@@ -98,12 +267,24 @@ class YOLODetector(BaseDetector):
 
     Model weights are downloaded automatically on first run.
     You can also use a custom-trained model by passing model_path.
+
+    With tiled=True, frames larger than the model input are first scanned
+    at reduced resolution; tiles that look dense are then re-run at native
+    resolution as one batch and merged with cross-tile NMS (see tiling.py).
     """
 
     PERSON_CLASS_ID = 0  # COCO class 0 = person
 
-    def __init__(self, model_path: str = 'yolov8n.pt', confidence: float = 0.4):
+    def __init__(self, model_path: str = 'yolov8n.pt', confidence: float = 0.4,
+                 tiled: bool = False, tile_size: int = 640, tile_overlap: float = 0.2,
+                 tile_min_people: int = 3, tile_small_box: int = 48, max_tiles: int = 8):
         self.confidence = confidence
+        self.tiled = tiled
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.tile_min_people = tile_min_people
+        self.tile_small_box = tile_small_box
+        self.max_tiles = max_tiles
         self.model = None
         try:
             from ultralytics import YOLO
@@ -118,18 +299,68 @@ class YOLODetector(BaseDetector):
             logger.error(f"Failed to load YOLO model: {e}")
 
     def detect_from_frame(self, frame: np.ndarray) -> int:
+        return len(self.detect_boxes(frame))
+
+    def detect_boxes(self, frame: np.ndarray) -> np.ndarray:
         if self.model is None:
-            return 0
-        results = self.model(frame, verbose=False)
-        count = 0
-        for result in results:
-            for box in result.boxes:
-                if (
-                    int(box.cls[0]) == self.PERSON_CLASS_ID
-                    and float(box.conf[0]) >= self.confidence
-                ):
-                    count += 1
-        return count
+            return np.zeros((0, 5))
+        boxes = self._predict([frame])[0]
+        h, w = frame.shape[:2]
+        if self.tiled and max(h, w) > self.tile_size * 1.5:
+            boxes = self._refine_tiled(frame, boxes)
+        return boxes
+
+    def detect_boxes_batch(self, frames) -> list:
+        if self.model is None:
+            return [np.zeros((0, 5)) for _ in frames]
+        if not len(frames):
+            return []
+        out = self._predict(list(frames))
+        if self.tiled:
+            out = [
+                self._refine_tiled(frame, boxes)
+                if max(frame.shape[:2]) > self.tile_size * 1.5 else boxes
+                for frame, boxes in zip(frames, out)
+            ]
+        return out
+
+    def _predict(self, images, imgsz=None):
+        """Run the model on a batch; one (N, 5) person-box array per image."""
+        kwargs = {'verbose': False}
+        if imgsz:
+            kwargs['imgsz'] = imgsz
+        out = []
+        for result in self.model(images, **kwargs):
+            boxes = result.boxes
+            if boxes is None or not len(boxes):
+                out.append(np.zeros((0, 5)))
+                continue
+            cls = boxes.cls.cpu().numpy().astype(int)
+            conf = boxes.conf.cpu().numpy()
+            keep = (cls == self.PERSON_CLASS_ID) & (conf >= self.confidence)
+            out.append(np.column_stack([boxes.xyxy.cpu().numpy()[keep], conf[keep]]))
+        return out
+
+    def _refine_tiled(self, frame: np.ndarray, coarse: np.ndarray) -> np.ndarray:
+        from detection.tiling import nms, select_dense_tiles, tile_grid
+
+        h, w = frame.shape[:2]
+        tiles = tile_grid(w, h, self.tile_size, self.tile_overlap)
+        chosen = tiles[select_dense_tiles(
+            tiles, coarse, self.tile_min_people, self.tile_small_box, self.max_tiles,
+        )]
+        if not len(chosen):
+            return coarse
+
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in chosen]
+        merged = [coarse]
+        for (x1, y1, _, _), boxes in zip(chosen, self._predict(crops, imgsz=self.tile_size)):
+            if len(boxes):
+                boxes = boxes.copy()
+                boxes[:, [0, 2]] += x1
+                boxes[:, [1, 3]] += y1
+                merged.append(boxes)
+        return nms(np.vstack(merged))
 
     def detect_with_visualization(self, frame: np.ndarray):
         """Returns (count, annotated_frame)."""
@@ -157,11 +388,137 @@ class YOLODetector(BaseDetector):
         return count, annotated
 
 
+# ---------------------------------------------------------------------------
+# Option 3: ONNX Runtime (CPU)
+# ---------------------------------------------------------------------------
+
+class ONNXDetector(BaseDetector):
+    """
+    YOLOv8 exported to ONNX, run with ONNX Runtime on CPU.
+
+    Requirements:
+        pip install onnxruntime opencv-python
+
+    No PyTorch/ultralytics at runtime: letterboxing, decoding and NMS are
+    done in NumPy. INT8 models produced by `manage.py export_onnx --int8`
+    load the same way. Create a model with `python manage.py export_onnx`.
+    """
+
+    PERSON_CLASS_ID = 0
+
+    def __init__(self, model_path: str = 'yolov8n.onnx', confidence: float = 0.4,
+                 iou_threshold: float = 0.45, threads: int = 0):
+        self.confidence = confidence
+        self.iou_threshold = iou_threshold
+        self.session = None
+        try:
+            import onnxruntime as ort
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if threads:
+                options.intra_op_num_threads = threads
+            self.session = ort.InferenceSession(
+                model_path, sess_options=options, providers=['CPUExecutionProvider'],
+            )
+            self.input_name = self.session.get_inputs()[0].name
+            shape = self.session.get_inputs()[0].shape
+            # Static exports declare [1, 3, H, W]; fall back to 640 for dynamic axes.
+            self.input_h = shape[2] if isinstance(shape[2], int) else 640
+            self.input_w = shape[3] if isinstance(shape[3], int) else 640
+            # Exports with a dynamic batch axis can take several frames per run.
+            self.dynamic_batch = not isinstance(shape[0], int)
+            logger.info(f"ONNXDetector initialized with model: {model_path}")
+        except ImportError:
+            logger.warning(
+                "onnxruntime not installed. "
+                "Run: pip install onnxruntime   — ONNX detection disabled."
+            )
+        except Exception as e:
+            logger.error(f"Failed to load ONNX model: {e}")
+
+    def detect_from_frame(self, frame: np.ndarray) -> int:
+        return len(self.detect_boxes(frame))
+
+    def _preprocess(self, frame: np.ndarray):
+        """Letterbox to the model input; returns (NCHW float32 tensor, scale, pad_x, pad_y)."""
+        import cv2
+        h, w = frame.shape[:2]
+        scale = min(self.input_w / w, self.input_h / h)
+        nw, nh = int(round(w * scale)), int(round(h * scale))
+        pad_x, pad_y = (self.input_w - nw) // 2, (self.input_h - nh) // 2
+
+        canvas = np.full((self.input_h, self.input_w, 3), 114, dtype=np.uint8)
+        canvas[pad_y:pad_y + nh, pad_x:pad_x + nw] = cv2.resize(
+            frame, (nw, nh), interpolation=cv2.INTER_LINEAR,
+        )
+        tensor = canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+        return np.ascontiguousarray(tensor), scale, pad_x, pad_y
+
+    def detect_boxes(self, frame: np.ndarray) -> np.ndarray:
+        return self.detect_boxes_batch([frame])[0]
+
+    def detect_boxes_batch(self, frames) -> list:
+        if self.session is None:
+            return [np.zeros((0, 5)) for _ in frames]
+        if not len(frames):
+            return []
+        prepared = [self._preprocess(frame) for frame in frames]
+        if self.dynamic_batch:
+            preds = self.session.run(
+                None, {self.input_name: np.concatenate([p[0] for p in prepared])},
+            )[0]
+        else:
+            preds = [self.session.run(None, {self.input_name: p[0]})[0][0] for p in prepared]
+        return [
+            self._decode(pred, frame.shape[:2], *p[1:])
+            for pred, frame, p in zip(preds, frames, prepared)
+        ]
+
+    def _decode(self, pred: np.ndarray, shape, scale, pad_x, pad_y) -> np.ndarray:
+        from detection.tiling import nms
+
+        # YOLOv8 output per image: (4 + num_classes, num_anchors), boxes as cx, cy, w, h.
+        conf = pred[4 + self.PERSON_CLASS_ID]
+        keep = conf >= self.confidence
+        if not keep.any():
+            return np.zeros((0, 5))
+        cx, cy, bw, bh = pred[:4, keep]
+        boxes = np.column_stack([
+            (cx - bw / 2 - pad_x) / scale,
+            (cy - bh / 2 - pad_y) / scale,
+            (cx + bw / 2 - pad_x) / scale,
+            (cy + bh / 2 - pad_y) / scale,
+            conf[keep],
+        ])
+        h, w = shape
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+        return nms(boxes, self.iou_threshold, containment=None)
+
+
 # ---------------------------------------------------------------------------
 # Factory
 # ---------------------------------------------------------------------------
 
-def get_detector(mode: str = 'yolo') -> BaseDetector:
+_ONNX_OPTIONS = ('model_path', 'confidence', 'iou_threshold', 'threads')
+
+
+def get_detector(mode: str = 'yolo', **kwargs) -> BaseDetector:
+    """
+    kwargs are passed to the detector: any YOLODetector option (e.g.
+    tiled=True), or model_path / confidence / iou_threshold / threads for
+    ONNX. HaarDetector takes none; options haar or onnx cannot use raise
+    ValueError.
+    """
     if mode == 'haar':
+        if kwargs:
+            raise ValueError(f"haar detector takes no options, got {', '.join(sorted(kwargs))}")
         return HaarDetector()
-    return YOLODetector()
+    if mode == 'onnx':
+        from django.conf import settings
+        unsupported = sorted(set(kwargs) - set(_ONNX_OPTIONS))
+        if unsupported:
+            raise ValueError(f"onnx detector does not support {', '.join(unsupported)}")
+        kwargs.setdefault('model_path', getattr(settings, 'ONNX_MODEL_PATH', 'yolov8n.onnx'))
+        return ONNXDetector(**kwargs)
+    return YOLODetector(**kwargs)
@@ -0,0 +1,133 @@
+"""
+Lease-based sharding of cameras across `run_detection --shard` workers.
+
+Every worker heartbeats its DetectionWorker row and, in the same step:
+
+  1. renews the LocationLease rows it holds (expires_at = now + lease);
+  2. computes its fair share, ceil(locations / live workers), where a worker
+     is live if it heartbeated within one lease period;
+  3. releases leases above that share (so a newly joined worker can take
+     them), or claims free / expired leases up to it.
+
+Claims are race-free without table locks: a missing lease row is created
+under the location's unique constraint, and an expired one is taken with a
+conditional UPDATE ... WHERE expires_at < now. Heartbeats run every third of
+a lease, so a dead worker's cameras are picked up at most about one lease
+period after its last renewal. Workers only poll locations they hold, and
+stop polling a location once their local copy of its lease has lapsed.
+
+Lease expiry is compared against each worker's clock, so hosts should be
+NTP-synchronised to well within the lease period.
+"""
+
+import logging
+import math
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseCoordinator:
+    def __init__(self, worker_id=None, lease_seconds=30):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = lease_seconds / 3
+        self.owned = set()
+        self.valid_until = 0.0          # monotonic; leases are trusted until then
+
+    def holds(self, location_id):
+        return location_id in self.owned and time.monotonic() < self.valid_until
+
+    def heartbeat(self, candidate_ids):
+        """Renew, rebalance and claim; returns the set of location ids this worker holds."""
+        from .models import DetectionWorker, LocationLease
+
+        started = time.monotonic()
+        now = timezone.now()
+        lease = timedelta(seconds=self.lease_seconds)
+        expires = now + lease
+        candidates = set(candidate_ids)
+
+        DetectionWorker.objects.update_or_create(
+            worker_id=self.worker_id,
+            defaults={'hostname': socket.gethostname(), 'heartbeat_at': now},
+        )
+        DetectionWorker.objects.filter(heartbeat_at__lt=now - 10 * lease).delete()
+
+        mine = LocationLease.objects.filter(worker_id=self.worker_id)
+        mine.update(expires_at=expires)
+        owned = set(mine.values_list('location_id', flat=True))
+
+        live = DetectionWorker.objects.filter(heartbeat_at__gte=now - lease).count()
+        share = math.ceil(len(candidates) / max(live, 1))
+
+        # Give up cameras that were removed, then anything above our share.
+        surplus = owned - candidates
+        keep = sorted(owned & candidates)
+        surplus |= set(keep[share:])
+        if surplus:
+            mine.filter(location_id__in=surplus).delete()
+            owned -= surplus
+
+        if len(owned) < share:
+            owned |= self._claim(candidates - owned, share - len(owned), now, expires)
+
+        self.owned = owned
+        self.valid_until = started + self.lease_seconds
+        return owned
+
+    def _claim(self, wanted, limit, now, expires):
+        from .models import LocationLease
+
+        held = set(
+            LocationLease.objects.filter(location_id__in=wanted, expires_at__gte=now)
+            .values_list('location_id', flat=True)
+        )
+        expired = set(
+            LocationLease.objects.filter(location_id__in=wanted, expires_at__lt=now)
+            .values_list('location_id', flat=True)
+        )
+        # Random order so workers starting together don't all race for the same rows.
+        free = list(wanted - held)
+        random.shuffle(free)
+
+        claimed = set()
+        for location_id in free:
+            if len(claimed) >= limit:
+                break
+            if location_id in expired:
+                taken = LocationLease.objects.filter(
+                    location_id=location_id, expires_at__lt=now,
+                ).update(worker_id=self.worker_id, acquired_at=now, expires_at=expires)
+            else:
+                try:
+                    with transaction.atomic():
+                        LocationLease.objects.create(
+                            location_id=location_id, worker_id=self.worker_id,
+                            acquired_at=now, expires_at=expires,
+                        )
+                    taken = 1
+                except IntegrityError:
+                    taken = 0
+            if taken:
+                claimed.add(location_id)
+        if claimed:
+            logger.info(f"Worker {self.worker_id} claimed {len(claimed)} location(s): {sorted(claimed)}")
+        return claimed
+
+    def release_all(self):
+        """Drop every lease and the worker row so other workers take over immediately."""
+        from .models import DetectionWorker, LocationLease
+
+        LocationLease.objects.filter(worker_id=self.worker_id).delete()
+        DetectionWorker.objects.filter(worker_id=self.worker_id).delete()
+        self.owned = set()
+        self.valid_until = 0.0
@@ -0,0 +1,224 @@
+"""
+Django management command to backfill CrowdLog history from recorded video.
+
+Videos are split into frame ranges that are decoded and run through the
+detector in parallel worker processes. Every `--stride`-th frame is
+inferred (the rest are only grabbed, not converted). Frame timestamps are
+mapped to wall-clock time, averaged into `--bucket`-second readings and
+bulk-inserted.
+
+By default a file is assumed to end at its modification time (typical for
+recorders); pass --start for a single file with a known start time.
+
+Usage:
+    python manage.py backfill_video --location 1 recording.mp4
+    python manage.py backfill_video --location 1 --stride 10 --workers 8 /footage/cam1/
+    python manage.py backfill_video --location 1 --start 2025-01-01T09:00:00 clip.mp4 --skip-alerts
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+logger = logging.getLogger(__name__)
+
+VIDEO_SUFFIXES = {'.mp4', '.avi', '.mkv', '.mov', '.m4v', '.ts', '.webm'}
+
+_worker_detector = None
+
+
+def _init_worker(mode):
+    global _worker_detector
+    import cv2
+    cv2.setNumThreads(1)   # one process per core; don't oversubscribe
+    from detection.detector import get_detector
+    _worker_detector = get_detector(mode)
+
+
+def _process_range(path, start, end, stride):
+    """Detect on every `stride`-th frame in [start, end). Returns [(frame_index, count)]."""
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    out = []
+    for index in range(start, end):
+        if (index - start) % stride:
+            if not cap.grab():
+                break
+            continue
+        ret, frame = cap.read()
+        if not ret:
+            break
+        out.append((index, _worker_detector.detect_from_frame(frame)))
+    cap.release()
+    return out
+
+
+class Command(BaseCommand):
+    help = 'Backfill CrowdLog rows for a location from recorded video files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Video files or directories')
+        parser.add_argument('--location', type=int, required=True, help='Location ID to backfill')
+        parser.add_argument(
+            '--mode', default='yolo', choices=['yolo', 'haar', 'onnx'],
+            help='Detection mode (default: yolo)'
+        )
+        parser.add_argument('--stride', type=int, default=5, help='Infer every Nth frame (default: 5)')
+        parser.add_argument(
+            '--bucket', type=float, default=5,
+            help='Seconds of video averaged into one CrowdLog row (default: 5)'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Parallel decode/inference processes (default: CPU count)'
+        )
+        parser.add_argument(
+            '--start', default=None,
+            help='Wall-clock start of a single video (ISO 8601); default: file mtime minus duration'
+        )
+        parser.add_argument(
+            '--skip-alerts', action='store_true',
+            help='Do not evaluate alerts for the final reading'
+        )
+        parser.add_argument(
+            '--skip-broadcast', action='store_true',
+            help='Do not broadcast the final reading over WebSocket'
+        )
+
+    def handle(self, *args, **options):
+        import cv2
+        from django.utils import timezone
+        from django.utils.dateparse import parse_datetime
+        from locations.models import Location
+
+        try:
+            location = Location.objects.get(pk=options['location'])
+        except Location.DoesNotExist:
+            raise CommandError(f"Location {options['location']} not found")
+
+        files = []
+        for item in map(Path, options['paths']):
+            if item.is_dir():
+                files.extend(p for p in sorted(item.iterdir()) if p.suffix.lower() in VIDEO_SUFFIXES)
+            elif item.exists():
+                files.append(item)
+            else:
+                raise CommandError(f"No such file: {item}")
+        if not files:
+            raise CommandError("No video files found.")
+
+        start = None
+        if options['start']:
+            if len(files) > 1:
+                raise CommandError("--start only applies to a single video.")
+            start = parse_datetime(options['start'])
+            if start is None:
+                raise CommandError(f"Invalid --start: {options['start']}")
+            if timezone.is_naive(start) and timezone.is_aware(timezone.now()):
+                start = timezone.make_aware(start)
+
+        stride = max(options['stride'], 1)
+        workers = max(options['workers'], 1)
+        total_rows = 0
+        total_video = 0.0
+        began = time.perf_counter()
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker, initargs=(options['mode'],),
+        ) as pool:
+            for path in files:
+                cap = cv2.VideoCapture(str(path))
+                fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+                n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                cap.release()
+                if n_frames <= 0:
+                    self.stderr.write(f"  skipping {path}: no frames")
+                    continue
+
+                duration = n_frames / fps
+                file_start = start or self._mtime_start(path, duration)
+
+                # Enough chunks to keep every worker busy; seeks happen once per chunk.
+                chunk = max(stride * 50, n_frames // (workers * 4) // stride * stride)
+                ranges = [(s, min(s + chunk, n_frames)) for s in range(0, n_frames, chunk)]
+                futures = [pool.submit(_process_range, str(path), s, e, stride) for s, e in ranges]
+                results = [r for f in futures for r in f.result()]
+
+                rows = self._write_logs(location, results, fps, file_start, options['bucket'])
+                total_rows += rows
+                total_video += duration
+                self.stdout.write(
+                    f"  {path.name}: {len(results)} frames inferred, {rows} rows from {file_start:%Y-%m-%d %H:%M:%S}"
+                )
+
+        elapsed = time.perf_counter() - began
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {total_rows} rows from {total_video / 60:.1f} min of video in "
+            f"{elapsed:.1f}s ({total_video / max(elapsed, 1e-9):.1f}x realtime)"
+        ))
+
+        if total_rows:
+            # bulk_create skips post_save, so refresh the heatmap from the log table.
+            from locations.heatmaps import rebuild
+            rebuild(location_ids=[location.id])
+
+        self._update_location(location, options)
+
+    def _mtime_start(self, path, duration):
+        from django.utils import timezone
+
+        end = datetime.fromtimestamp(path.stat().st_mtime)
+        if timezone.is_aware(timezone.now()):
+            end = timezone.make_aware(end)
+        return end - timedelta(seconds=duration)
+
+    def _write_logs(self, location, results, fps, file_start, bucket_seconds):
+        from locations.models import CrowdLog
+
+        if not results:
+            return 0
+        frames = np.array([r[0] for r in results], dtype=float)
+        counts = np.array([r[1] for r in results], dtype=float)
+
+        buckets = (frames / fps // bucket_seconds).astype(np.int64)
+        uniq, inverse = np.unique(buckets, return_inverse=True)
+        means = np.bincount(inverse, weights=counts) / np.bincount(inverse)
+
+        logs = []
+        for b, mean in zip(uniq.tolist(), means.tolist()):
+            count = int(round(mean))
+            logs.append(CrowdLog(
+                location=location,
+                people_count=count,
+                density_level=location.density_for(count),
+                occupancy_percentage=round(count / location.capacity_limit * 100, 1) if location.capacity_limit else 0,
+                source='AI',
+                timestamp=file_start + timedelta(seconds=b * bucket_seconds),
+            ))
+        CrowdLog.objects.bulk_create(logs, batch_size=1000)
+        return len(logs)
+
+    def _update_location(self, location, options):
+        """If the backfill ran past the location's last update, make the latest reading current."""
+        from locations.live import live_state
+        from locations.views import _broadcast_update
+        from alerts.utils import check_and_trigger_alerts
+
+        live_state.apply([location])
+        latest = location.logs.order_by('-timestamp').first()
+        if latest is None or latest.timestamp <= location.last_updated:
+            return
+        location.update_count(latest.people_count)
+        if not options['skip_alerts']:
+            check_and_trigger_alerts(location)
+        if not options['skip_broadcast']:
+            _broadcast_update(location)
@@ -0,0 +1,126 @@
+"""
+Django management command to export the YOLO model to ONNX for `--mode onnx`,
+optionally quantize it to INT8, and check its counts against YOLODetector.
+
+Usage:
+    python manage.py export_onnx
+    python manage.py export_onnx --model yolov8n.pt --int8 --validate samples/
+    python manage.py export_onnx --skip-export --onnx yolov8n.int8.onnx --validate clip.mp4
+"""
+
+import time
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+
+class Command(BaseCommand):
+    help = 'Export YOLO to ONNX (optionally INT8) and validate counts against YOLODetector.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default='yolov8n.pt', help='Ultralytics weights to export')
+        parser.add_argument('--imgsz', type=int, default=640, help='Model input size (default: 640)')
+        parser.add_argument('--onnx', default=None, help='Output/input ONNX path (default: <model>.onnx)')
+        parser.add_argument('--int8', action='store_true', help='Also write a dynamically quantized INT8 model')
+        parser.add_argument('--skip-export', action='store_true', help='Validate an existing ONNX model only')
+        parser.add_argument(
+            '--validate', nargs='*', default=[],
+            help='Images, directories or videos to compare counts on'
+        )
+        parser.add_argument('--frames', type=int, default=50, help='Max frames to compare (default: 50)')
+
+    def handle(self, *args, **options):
+        onnx_path = Path(options['onnx'] or Path(options['model']).with_suffix('.onnx'))
+
+        if not options['skip_export']:
+            onnx_path = self._export(options['model'], options['imgsz'], onnx_path)
+        if not onnx_path.exists():
+            raise CommandError(f"ONNX model not found: {onnx_path}")
+
+        if options['int8']:
+            onnx_path = self._quantize(onnx_path)
+
+        if options['validate']:
+            frames = list(self._frames(options['validate'], options['frames']))
+            if not frames:
+                raise CommandError("No readable frames in --validate inputs.")
+            self._compare(options['model'], onnx_path, frames)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. Use it with ONNX_MODEL_PATH='{onnx_path}' and --mode onnx."
+        ))
+
+    def _export(self, model, imgsz, onnx_path):
+        try:
+            from ultralytics import YOLO
+        except ImportError:
+            raise CommandError("Exporting needs ultralytics: pip install ultralytics")
+        exported = Path(YOLO(model).export(format='onnx', imgsz=imgsz, dynamic=False, simplify=True))
+        if exported != onnx_path:
+            exported.replace(onnx_path)
+        self.stdout.write(f"Exported {model} -> {onnx_path} ({onnx_path.stat().st_size / 1e6:.1f} MB)")
+        return onnx_path
+
+    def _quantize(self, onnx_path):
+        try:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+        except ImportError:
+            raise CommandError("Quantization needs onnxruntime: pip install onnxruntime")
+        int8_path = onnx_path.with_suffix('.int8.onnx')
+        quantize_dynamic(str(onnx_path), str(int8_path), weight_type=QuantType.QUInt8)
+        self.stdout.write(f"Quantized -> {int8_path} ({int8_path.stat().st_size / 1e6:.1f} MB)")
+        return int8_path
+
+    def _frames(self, inputs, limit):
+        import cv2
+
+        paths = []
+        for item in map(Path, inputs):
+            paths.extend(sorted(item.iterdir()) if item.is_dir() else [item])
+        n = 0
+        for path in paths:
+            if path.suffix.lower() in IMAGE_SUFFIXES:
+                frame = cv2.imread(str(path))
+                if frame is not None:
+                    yield frame
+                    n += 1
+            else:
+                cap = cv2.VideoCapture(str(path))
+                while n < limit:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    yield frame
+                    n += 1
+                cap.release()
+            if n >= limit:
+                return
+
+    def _compare(self, model, onnx_path, frames):
+        from detection.detector import ONNXDetector, YOLODetector
+
+        reference = YOLODetector(model_path=model)
+        candidate = ONNXDetector(model_path=str(onnx_path))
+        if reference.model is None or candidate.session is None:
+            raise CommandError("Validation needs both ultralytics and onnxruntime installed.")
+
+        ref_counts, onnx_counts, ref_times, onnx_times = [], [], [], []
+        for frame in frames:
+            t = time.perf_counter()
+            ref_counts.append(reference.detect_from_frame(frame))
+            ref_times.append(time.perf_counter() - t)
+            t = time.perf_counter()
+            onnx_counts.append(candidate.detect_from_frame(frame))
+            onnx_times.append(time.perf_counter() - t)
+
+        ref_counts, onnx_counts = np.array(ref_counts), np.array(onnx_counts)
+        diff = np.abs(ref_counts - onnx_counts)
+        self.stdout.write(f"Validated on {len(frames)} frame(s):")
+        self.stdout.write(f"  mean count   yolo={ref_counts.mean():.2f} onnx={onnx_counts.mean():.2f}")
+        self.stdout.write(f"  |diff|       mean={diff.mean():.2f} max={diff.max()} exact={np.mean(diff == 0):.0%}")
+        self.stdout.write(
+            f"  latency (ms) yolo={np.median(ref_times) * 1000:.1f} onnx={np.median(onnx_times) * 1000:.1f}"
+        )
@@ -2,14 +2,29 @@
 Django management command to continuously poll camera feeds
 and update crowd counts.
 
+Cameras are polled by an adaptive scheduler (detection/scheduler.py):
+volatile, dense or near-threshold locations are polled more often and quiet
+ones less, while the fleet-wide poll rate stays at --budget. Locations that
+share a camera_url are counted together from one inference per frame, each
+within its `roi` polygon (detection/zones.py).
+
 Usage:
     python manage.py run_detection
     python manage.py run_detection --mode haar --interval 10
+    python manage.py run_detection --detect-every 5   # track between detections
+    python manage.py run_detection --min-interval 2 --max-interval 120 --budget 30
+    python manage.py run_detection --fixed            # every camera every --interval
+    python manage.py run_detection --metrics-port 9100 --profile-dir profiles/
+    python manage.py run_detection --shard            # run one per host/process to scale out
+    python manage.py run_detection --stream           # feed /api/detection/stream/<id>/
+    python manage.py run_detection --no-refit         # leave forecast refits to refit_forecasts
 """
 
+import os
+import signal
 import time
 import logging
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
@@ -20,68 +35,286 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument(
-            '--mode', default='yolo', choices=['yolo', 'haar'],
+            '--mode', default='yolo', choices=['yolo', 'haar', 'onnx'],
             help='Detection mode (default: yolo)'
         )
         parser.add_argument(
-            '--interval', type=int, default=settings.DETECTION_INTERVAL,
-            help='Seconds between detection runs (default: 5)'
+            '--interval', type=float, default=getattr(settings, 'DETECTION_INTERVAL', 5),
+            help='Average seconds between polls of one camera (default: 5)'
+        )
+        parser.add_argument(
+            '--min-interval', type=float, default=getattr(settings, 'DETECTION_MIN_INTERVAL', 1),
+            help='Shortest per-camera interval unless the location overrides it (default: 1)'
+        )
+        parser.add_argument(
+            '--max-interval', type=float, default=getattr(settings, 'DETECTION_MAX_INTERVAL', 60),
+            help='Longest per-camera interval unless the location overrides it (default: 60)'
+        )
+        parser.add_argument(
+            '--budget', type=float, default=None,
+            help='Polls per minute across all cameras (default: one per camera per --interval)'
+        )
+        parser.add_argument(
+            '--fixed', action='store_true',
+            help='Poll every camera every --interval seconds instead of adapting'
         )
         parser.add_argument(
             '--location', type=int, default=None,
             help='Only process this location ID'
         )
+        parser.add_argument(
+            '--tiled', action='store_true',
+            help='YOLO only: re-run dense regions of high-resolution frames as native-resolution tiles'
+        )
+        parser.add_argument(
+            '--detect-every', type=int, default=1,
+            help='Run the detector every k frames and track in between (default: 1 = every frame)'
+        )
+        parser.add_argument(
+            '--shard', action='store_true',
+            help='Share cameras with other --shard workers through expiring leases'
+        )
+        parser.add_argument(
+            '--worker-id', default=None,
+            help='Stable worker name for --shard (default: host:pid:random)'
+        )
+        parser.add_argument(
+            '--stream', action='store_true',
+            help='Publish annotated frames to /api/detection/stream/<id>/ viewers'
+        )
+        parser.add_argument(
+            '--no-refit', action='store_true',
+            help='Do not refit forecasts in this worker (run manage.py refit_forecasts instead)'
+        )
+        parser.add_argument(
+            '--metrics-port', type=int, default=None,
+            help='Serve Prometheus metrics for this worker on this port'
+        )
+        parser.add_argument(
+            '--profile-dir', default=None,
+            help='Enable cProfile snapshots: on SIGUSR1, profile the next --profile-polls polls into this directory'
+        )
+        parser.add_argument(
+            '--profile-polls', type=int, default=20,
+            help='Polls captured per profile snapshot (default: 20)'
+        )
 
     def handle(self, *args, **options):
         from detection.detector import get_detector
-        from locations.models import Location
-        from locations.views import _broadcast_update
-        from locations.models import CrowdLog
-        from alerts.utils import check_and_trigger_alerts
+        from detection.scheduler import AdaptiveScheduler
 
         mode = options['mode']
         interval = options['interval']
         location_id = options['location']
+        self.detect_every = options['detect_every']
+        self.stream = options['stream']
 
         self.stdout.write(
             self.style.SUCCESS(
                 f"Starting crowd detection | mode={mode} | interval={interval}s"
+                f"{' (fixed)' if options['fixed'] else ' (adaptive)'}"
             )
         )
 
-        detector = get_detector(mode)
+        try:
+            self.detector = get_detector(mode, tiled=True) if options['tiled'] else get_detector(mode)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self._setup_observability(options)
+        scheduler = AdaptiveScheduler(
+            base_interval=interval,
+            min_interval=options['min_interval'],
+            max_interval=options['max_interval'],
+            budget=options['budget'] / 60 if options['budget'] else None,
+            alert_threshold=getattr(settings, 'CROWD_ALERT_THRESHOLD', 0.8),
+            adaptive=not options['fixed'],
+        )
 
-        while True:
-            qs = Location.objects.filter(is_active=True).exclude(camera_url='')
-            if location_id:
-                qs = qs.filter(pk=location_id)
+        leases = None
+        if options['shard']:
+            from detection.leases import LeaseCoordinator
+            leases = LeaseCoordinator(
+                worker_id=options['worker_id'],
+                lease_seconds=getattr(settings, 'DETECTION_LEASE_SECONDS', 30),
+            )
+            self.stdout.write(f"Sharding enabled | worker={leases.worker_id}")
 
-            for location in qs:
+        if not options['no_refit']:
+            from locations.forecasting import forecaster
+            forecaster.start()
+
+        try:
+            self._loop(scheduler, leases, location_id)
+        finally:
+            from locations.heatmaps import profile_buffer
+            from locations.live import live_state
+            live_state.flush()
+            profile_buffer.flush()
+            if leases:
+                leases.release_all()
+
+    def _loop(self, scheduler, leases, location_id):
+        from locations.live import live_state
+        from locations.models import Location
+
+        # Pick up added/removed cameras and edited bounds periodically.
+        refresh_every = getattr(settings, 'DETECTION_REFRESH_SECONDS', 60)
+        locations = {}
+        cameras = {}
+        refresh_at = heartbeat_at = 0.0
+        owned = None
+
+        while True:
+            now = time.monotonic()
+            if leases and now >= heartbeat_at:
+                qs = Location.objects.filter(is_active=True).exclude(camera_url='')
+                if location_id:
+                    qs = qs.filter(pk=location_id)
                 try:
-                    source = location.camera_url
-                    # Convert numeric string to int for local webcam
-                    if source.isdigit():
-                        source = int(source)
+                    held = leases.heartbeat(qs.values_list('id', flat=True))
+                except Exception as e:
+                    logger.error(f"Lease heartbeat failed: {e}")
+                    held = owned
+                heartbeat_at = now + leases.heartbeat_interval
+                if held != owned:
+                    owned, refresh_at = held, now
 
-                    count = detector.detect_from_camera(source=source, duration_seconds=2)
-                    location.update_count(count)
+            if now >= refresh_at:
+                qs = Location.objects.filter(is_active=True).exclude(camera_url='')
+                if location_id:
+                    qs = qs.filter(pk=location_id)
+                if leases:
+                    qs = qs.filter(pk__in=owned or ())
+                locations = {l.id: l for l in live_state.apply(qs)}
+                # Locations on the same camera are counted together from one inference.
+                cameras = {}
+                for l in locations.values():
+                    cameras.setdefault(l.camera_url, []).append(l)
+                scheduler.sync(locations.values(), now)
+                refresh_at = now + refresh_every
 
-                    CrowdLog.objects.create(
-                        location=location,
-                        people_count=count,
-                        density_level=location.density_level,
-                        occupancy_percentage=location.occupancy_percentage,
-                        source='AI',
-                    )
+            due, next_id = scheduler.next_due()
+            wake = min(refresh_at, heartbeat_at) if leases else refresh_at
+            if next_id is None or due > now:
+                wait = wake - now if next_id is None else min(due, wake) - now
+                time.sleep(max(wait, 0.01))
+                continue
 
-                    check_and_trigger_alerts(location)
-                    _broadcast_update(location)
+            scheduler.pop_due(now)
+            location = locations[next_id]
+            if leases and not leases.holds(location.id):
+                # Lease lapsed (missed heartbeats); another worker may own it now.
+                scheduler.defer(location.id)
+                continue
+            group = [l for l in cameras[location.camera_url] if not leases or leases.holds(l.id)]
+            try:
+                self._poll(location, group)
+            except Exception as e:
+                logger.error(f"Detection error for {location.name}: {e}")
+                scheduler.defer(location.id)
+                continue
 
-                    self.stdout.write(
-                        f"  [{location.name}] count={count} density={location.density_level}"
-                    )
+            for polled in group:
+                next_in = scheduler.record(polled.id, polled.current_count, polled.density_level)
+                self.stdout.write(
+                    f"  [{polled.name}] count={polled.current_count} "
+                    f"density={polled.density_level} next={next_in:.1f}s"
+                )
 
-                except Exception as e:
-                    logger.error(f"Detection error for {location.name}: {e}")
+    def _setup_observability(self, options):
+        from dashboard.metrics import ProfileCapture, metrics
+
+        if options['metrics_port']:
+            metrics.serve(options['metrics_port'])
+            self.stdout.write(f"Serving metrics on :{options['metrics_port']}/metrics")
+
+        self.profiler = ProfileCapture(options['profile_dir'] or '.')
+        if options['profile_dir'] and hasattr(signal, 'SIGUSR1'):
+            polls = options['profile_polls']
+            signal.signal(signal.SIGUSR1, lambda *_: self.profiler.request(polls))
+            self.stdout.write(f"Send SIGUSR1 (kill -USR1 {os.getpid()}) to profile the next {polls} polls")
+
+    def _poll(self, location, group):
+        from dashboard.metrics import metrics
+
+        with self.profiler.capture(), metrics.pipeline('run_detection'):
+            self._detect_and_record(location, group, metrics)
+
+    def _detect_and_record(self, location, group, metrics):
+        from detection.tracker import parse_line
+        from detection.zones import parse_polygon
+
+        source = location.camera_url
+        # Convert numeric string to int for local webcam
+        if source.isdigit():
+            source = int(source)
+
+        if len(group) > 1 or parse_polygon(location.roi) is not None:
+            self._detect_zones(group, source, metrics)
+            return
+
+        on_frame = None
+        if self.stream:
+            from detection.streaming import hub
+
+            def on_frame(frame, boxes):
+                hub.publish(location.id, frame, boxes, relay=True)
+
+        line = parse_line(location.counting_line)
+        if self.detect_every > 1 or line:
+            result = self.detector.track_from_camera(
+                source=source, duration_seconds=2,
+                detect_every=self.detect_every, line=line, on_frame=on_frame,
+            )
+            count, entries, exits = result.count, result.entries, result.exits
+        else:
+            count = self.detector.detect_from_camera(
+                source=source, duration_seconds=2, on_frame=on_frame,
+            )
+            entries = exits = 0
+        self._record(location, count, entries, exits, metrics)
+
+    def _detect_zones(self, group, source, metrics):
+        """One inference per frame on the ROI crop, counted into every location's zone."""
+        from detection.zones import ZoneSet, parse_polygon
+
+        zones = ZoneSet(
+            [parse_polygon(l.roi) for l in group],
+            margin=getattr(settings, 'DETECTION_ROI_MARGIN', 0.1),
+        )
+        on_frame = None
+        if self.stream:
+            from detection.streaming import hub
+
+            def on_frame(frame, boxes, inside):
+                for l, mask in zip(group, inside):
+                    hub.publish(l.id, frame, boxes[mask], relay=True)
+
+        counts = self.detector.detect_zones_from_camera(
+            zones, source=source, duration_seconds=2, on_frame=on_frame,
+        )
+        for l, count in zip(group, counts.tolist()):
+            self._record(l, count, 0, 0, metrics)
+
+    def _record(self, location, count, entries, exits, metrics):
+        from locations.models import CrowdLog
+        from locations.views import _broadcast_update
+        from alerts.utils import check_and_trigger_alerts
+
+        with metrics.stage('db_write'):
+            location.update_count(count)
+
+            CrowdLog.objects.create(
+                location=location,
+                people_count=count,
+                density_level=location.density_level,
+                occupancy_percentage=location.occupancy_percentage,
+                source='AI',
+                entries=entries,
+                exits=exits,
+            )
 
-            time.sleep(interval)
+        with metrics.stage('alerts'):
+            check_and_trigger_alerts(location)
+        with metrics.stage('broadcast'):
+            _broadcast_update(location)
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('locations', '0004_poll_bounds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionWorker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker_id', models.CharField(max_length=100, unique=True)),
+                ('hostname', models.CharField(blank=True, max_length=200)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('heartbeat_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'ordering': ['worker_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LocationLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker_id', models.CharField(db_index=True, max_length=100)),
+                ('acquired_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='detection_lease', to='locations.location')),
+            ],
+            options={
+                'ordering': ['location_id'],
+            },
+        ),
+    ]
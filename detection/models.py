@@ -0,0 +1,31 @@
+from django.db import models
+
+
+class DetectionWorker(models.Model):
+    """A running `run_detection --shard` process, kept alive by heartbeats."""
+    worker_id = models.CharField(max_length=100, unique=True)
+    hostname = models.CharField(max_length=200, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    heartbeat_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['worker_id']
+
+    def __str__(self):
+        return self.worker_id
+
+
+class LocationLease(models.Model):
+    """Exclusive, expiring claim of one location's camera by a detection worker."""
+    location = models.OneToOneField(
+        'locations.Location', on_delete=models.CASCADE, related_name='detection_lease'
+    )
+    worker_id = models.CharField(max_length=100, db_index=True)
+    acquired_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['location_id']
+
+    def __str__(self):
+        return f"{self.location_id} -> {self.worker_id} until {self.expires_at:%H:%M:%S}"
@@ -0,0 +1,254 @@
+"""
+Encode-once MJPEG fan-out of annotated detection frames.
+
+Detection loops hand each frame and its boxes to `hub.publish()`. At most
+STREAM_MAX_FPS times a second per location, the frame is downscaled to
+STREAM_MAX_WIDTH, annotated and JPEG-encoded once; the bytes replace the
+location's latest frame. Viewers never get a queue: each one wakes at its own
+frame rate and sends whatever is latest, so a slow viewer skips frames
+instead of buffering them and costs nothing extra to encode.
+
+Frames published in another process (run_detection --stream) arrive through
+the channel layer group `stream_<location_id>`. The first viewer of a
+location in a web process subscribes once for that process and the last one
+to leave unsubscribes, so every frame crosses the channel layer once per web
+process, not once per viewer.
+
+Nothing is encoded or relayed for a location nobody is watching. Viewers in
+any process keep a `stream_watched_<location_id>` cache key alive while they
+are connected (refreshed every STREAM_WATCH_SECONDS / 2), and publishers check
+it at most once a second, so an unwatched location costs one cache read a
+second instead of a JPEG encode and a channel-layer send per frame.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BOUNDARY = 'frame'
+
+
+def annotate(frame: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """Draw (N, 4+) person boxes and the count onto a copy of the frame."""
+    import cv2
+    out = frame.copy()
+    for x1, y1, x2, y2 in boxes[:, :4].astype(int):
+        cv2.rectangle(out, (x1, y1), (x2, y2), (0, 255, 0), 2)
+    cv2.putText(out, f"People: {len(boxes)}", (10, 28), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+    return out
+
+
+class _Stream:
+    __slots__ = (
+        'jpeg', 'seq', 'published_at', 'viewers', 'relay_task', 'relay_channel',
+        'watched', 'checked_at', 'marked_at',
+    )
+
+    def __init__(self):
+        self.jpeg = None
+        self.seq = 0
+        self.published_at = 0.0
+        self.viewers = 0
+        self.watched = False
+        self.checked_at = float('-inf')
+        self.marked_at = float('-inf')
+        self.relay_task = None
+        self.relay_channel = None
+
+
+class FrameHub:
+    def __init__(self, max_fps=5, max_width=960, quality=75, watch_seconds=10):
+        self.max_fps = max_fps
+        self.max_width = max_width
+        self.quality = quality
+        self.watch_seconds = watch_seconds
+        self.origin = uuid.uuid4().hex       # tags relayed frames so we skip our own
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def _stream(self, location_id):
+        stream = self._streams.get(location_id)
+        if stream is None:
+            with self._lock:
+                stream = self._streams.setdefault(location_id, _Stream())
+        return stream
+
+    @staticmethod
+    def _key(location_id):
+        return f'stream_watched_{location_id}'
+
+    # ── Publishing ────────────────────────────────────────────────────────
+    def watched(self, location_id):
+        """True while a viewer in this or any other process is connected to the location."""
+        stream = self._stream(location_id)
+        if stream.viewers:
+            return True
+        now = time.monotonic()
+        if now - stream.checked_at >= 1:
+            from django.core.cache import cache
+            try:
+                stream.watched = bool(cache.get(self._key(location_id)))
+            except Exception as e:
+                logger.debug(f"Stream watch check failed for location {location_id}: {e}")
+                stream.watched = False
+            stream.checked_at = now
+        return stream.watched
+
+    def publish(self, location_id, frame, boxes=(), relay=False):
+        """Encode and store a frame unless unwatched or the fps cap says skip. Returns True if encoded."""
+        stream = self._stream(location_id)
+        now = time.monotonic()
+        if now - stream.published_at < 1 / self.max_fps or not self.watched(location_id):
+            return False
+        stream.published_at = now
+
+        import cv2
+        boxes = np.asarray(boxes, dtype=float)
+        boxes = boxes[:, :4] if boxes.ndim == 2 else np.zeros((0, 4))
+        h, w = frame.shape[:2]
+        if w > self.max_width:
+            scale = self.max_width / w
+            frame = cv2.resize(frame, (self.max_width, int(h * scale)), interpolation=cv2.INTER_AREA)
+            boxes = boxes.copy()
+            boxes[:, :4] *= scale
+        ok, buf = cv2.imencode('.jpg', annotate(frame, boxes), [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return False
+        jpeg = buf.tobytes()
+        self.put(location_id, jpeg)
+        if relay:
+            self._relay_out(location_id, jpeg)
+        return True
+
+    def put(self, location_id, jpeg):
+        stream = self._stream(location_id)
+        stream.jpeg = jpeg
+        stream.seq += 1
+
+    def _relay_out(self, location_id, jpeg):
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        layer = get_channel_layer()
+        if layer is None:
+            return
+        try:
+            async_to_sync(layer.group_send)(f'stream_{location_id}', {
+                'type': 'stream.frame', 'jpeg': jpeg, 'origin': self.origin,
+            })
+        except Exception as e:
+            logger.debug(f"Stream relay failed for location {location_id}: {e}")
+
+    # ── Viewing ───────────────────────────────────────────────────────────
+    @staticmethod
+    def _part(jpeg):
+        return (
+            f'--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n'
+        ).encode() + jpeg + b'\r\n'
+
+    def _limits(self, fps):
+        if not fps or not np.isfinite(fps) or fps <= 0:
+            fps = self.max_fps
+        interval = 1 / min(fps, self.max_fps)
+        return interval, getattr(settings, 'STREAM_IDLE_SECONDS', 30), getattr(settings, 'STREAM_MAX_SECONDS', 3600)
+
+    def _due(self, stream):
+        """True when this process should refresh the location's watched key."""
+        now = time.monotonic()
+        if now - stream.marked_at < self.watch_seconds / 2:
+            return False
+        stream.marked_at = now
+        return True
+
+    def frames(self, location_id, fps=None):
+        """Sync multipart generator (WSGI). Only sees frames published in this process."""
+        from django.core.cache import cache
+
+        interval, idle, max_seconds = self._limits(fps)
+        stream = self._stream(location_id)
+        stream.viewers += 1
+        try:
+            started = last_frame = time.monotonic()
+            last_seq = -1
+            while time.monotonic() - started < max_seconds:
+                if self._due(stream):
+                    cache.set(self._key(location_id), 1, self.watch_seconds)
+                if stream.seq != last_seq and stream.jpeg is not None:
+                    last_seq = stream.seq
+                    last_frame = time.monotonic()
+                    yield self._part(stream.jpeg)
+                elif time.monotonic() - last_frame > idle:
+                    return
+                time.sleep(interval)
+        finally:
+            stream.viewers -= 1
+
+    async def aframes(self, location_id, fps=None):
+        """Async multipart generator (ASGI); also receives frames relayed from workers."""
+        from django.core.cache import cache
+
+        interval, idle, max_seconds = self._limits(fps)
+        stream = self._stream(location_id)
+        await self._subscribe(location_id, stream)
+        try:
+            started = last_frame = time.monotonic()
+            last_seq = -1
+            while time.monotonic() - started < max_seconds:
+                if self._due(stream):
+                    await cache.aset(self._key(location_id), 1, self.watch_seconds)
+                if stream.seq != last_seq and stream.jpeg is not None:
+                    last_seq = stream.seq
+                    last_frame = time.monotonic()
+                    yield self._part(stream.jpeg)
+                elif time.monotonic() - last_frame > idle:
+                    return
+                await asyncio.sleep(interval)
+        finally:
+            await self._unsubscribe(location_id, stream)
+
+    async def _subscribe(self, location_id, stream):
+        from channels.layers import get_channel_layer
+
+        stream.viewers += 1
+        layer = get_channel_layer()
+        if stream.relay_task is not None or layer is None:
+            return
+        channel = await layer.new_channel()
+        await layer.group_add(f'stream_{location_id}', channel)
+        stream.relay_channel = channel
+
+        async def relay_in():
+            while True:
+                message = await layer.receive(channel)
+                if message.get('origin') != self.origin:
+                    self.put(location_id, message['jpeg'])
+
+        stream.relay_task = asyncio.ensure_future(relay_in())
+
+    async def _unsubscribe(self, location_id, stream):
+        from channels.layers import get_channel_layer
+
+        stream.viewers -= 1
+        if stream.viewers or stream.relay_task is None:
+            return
+        stream.relay_task.cancel()
+        stream.relay_task = None
+        layer = get_channel_layer()
+        if layer is not None and stream.relay_channel:
+            await layer.group_discard(f'stream_{location_id}', stream.relay_channel)
+        stream.relay_channel = None
+
+
+hub = FrameHub(
+    max_fps=getattr(settings, 'STREAM_MAX_FPS', 5),
+    max_width=getattr(settings, 'STREAM_MAX_WIDTH', 960),
+    quality=getattr(settings, 'STREAM_JPEG_QUALITY', 75),
+    watch_seconds=getattr(settings, 'STREAM_WATCH_SECONDS', 10),
+)
@@ -0,0 +1,92 @@
+"""
+Helpers for tiled inference on high-resolution frames.
+
+A coarse full-frame pass finds where people are; only tiles that look dense
+(many boxes, or boxes too small to be reliable after downscaling) are re-run
+at native resolution. Tile detections are shifted back to frame coordinates
+and merged with the coarse boxes through cross-tile NMS.
+"""
+
+import numpy as np
+
+from detection.tracker import iou_matrix
+
+
+def tile_grid(width: int, height: int, tile: int, overlap: float) -> np.ndarray:
+    """Overlapping tiles covering the frame, as an (N, 4) int array of [x1, y1, x2, y2]."""
+    stride = max(int(tile * (1 - overlap)), 1)
+
+    def starts(size):
+        if size <= tile:
+            return [0]
+        s = list(range(0, size - tile, stride))
+        return s + [size - tile]
+
+    return np.array([
+        [x, y, min(x + tile, width), min(y + tile, height)]
+        for y in starts(height) for x in starts(width)
+    ], dtype=np.int64)
+
+
+def select_dense_tiles(tiles: np.ndarray, boxes: np.ndarray, min_people: int,
+                       small_box: float, max_tiles: int) -> np.ndarray:
+    """
+    Indices of tiles worth re-running: tiles containing at least `min_people`
+    box centres, or any box shorter than `small_box` pixels. Densest first,
+    capped at `max_tiles` so CPU cost per frame is bounded.
+    """
+    if not len(boxes) or not len(tiles):
+        return np.zeros(0, dtype=np.int64)
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2
+    heights = boxes[:, 3] - boxes[:, 1]
+
+    inside = (
+        (cx[None, :] >= tiles[:, 0:1]) & (cx[None, :] < tiles[:, 2:3])
+        & (cy[None, :] >= tiles[:, 1:2]) & (cy[None, :] < tiles[:, 3:4])
+    )
+    people = inside.sum(axis=1)
+    has_small = (inside & (heights[None, :] < small_box)).any(axis=1)
+
+    dense = np.nonzero((people >= min_people) | has_small)[0]
+    order = np.argsort(-people[dense], kind='stable')
+    return dense[order][:max_tiles]
+
+
+def nms(boxes: np.ndarray, iou_threshold: float = 0.5, containment: float = 0.8) -> np.ndarray:
+    """
+    Non-maximum suppression on (N, 5) [x1, y1, x2, y2, conf] boxes.
+
+    Besides IoU, a box is suppressed when `containment` of its area lies
+    inside a higher-scoring box — that catches people cut in half at a tile
+    edge, whose partial box has a low IoU with the full one. Pass
+    containment=None for plain IoU NMS.
+    """
+    if len(boxes) < 2:
+        return boxes
+    boxes = boxes[np.argsort(-boxes[:, 4], kind='stable')]
+    iou = iou_matrix(boxes[:, :4], boxes[:, :4])
+    if containment is None:
+        return boxes[_greedy_keep(iou > iou_threshold)]
+
+    x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    # contained[i, j]: fraction of box j covered by box i
+    contained = inter / np.maximum(area[None, :], 1e-9)
+
+    return boxes[_greedy_keep((iou > iou_threshold) | (contained > containment))]
+
+
+def _greedy_keep(overlap: np.ndarray) -> np.ndarray:
+    """Keep mask for score-sorted boxes: each kept box suppresses later overlapping ones."""
+    keep = np.ones(len(overlap), dtype=bool)
+    for i in range(len(overlap)):
+        if keep[i]:
+            suppress = overlap[i].copy()
+            suppress[: i + 1] = False
+            keep &= ~suppress
+    return keep
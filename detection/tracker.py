@@ -0,0 +1,170 @@
+"""
+Lightweight multi-object tracking on top of detector boxes.
+
+`IoUTracker` associates detections frame-to-frame by greedy IoU matching and
+keeps stable track IDs. Between detection frames, tracks are carried forward
+by `propagate()` (sparse optical flow, see BaseDetector.track_from_camera),
+so the expensive detector only needs to run every k frames.
+
+Optionally counts entries/exits across a line: a track whose centroid moves
+from the left-hand side of the directed line (x1,y1)->(x2,y2), as seen on
+screen, to its right-hand side counts as an entry; the opposite is an exit.
+E.g. for a left-to-right horizontal line, walking down the image is an entry.
+
+Boxes are float arrays of shape (N, 4) as [x1, y1, x2, y2]; detections may
+carry a 5th confidence column, which is ignored here.
+"""
+
+import numpy as np
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between boxes a (N, 4) and b (M, 4)."""
+    if not len(a) or not len(b):
+        return np.zeros((len(a), len(b)))
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def parse_line(value: str):
+    """'x1,y1,x2,y2' normalized to [0, 1] -> tuple of floats, or None if blank/invalid."""
+    try:
+        parts = tuple(float(p) for p in (value or '').split(','))
+    except ValueError:
+        return None
+    return parts if len(parts) == 4 else None
+
+
+class IoUTracker:
+    def __init__(self, iou_threshold=0.3, max_missed=5, min_hits=2, line=None):
+        """
+        line: (x1, y1, x2, y2) in pixel coordinates, or None to disable
+              entry/exit counting.
+        """
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.min_hits = min_hits
+        self.line = None if line is None else np.asarray(line, dtype=float)
+
+        self.boxes = np.zeros((0, 4))
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.missed = np.zeros(0, dtype=np.int64)
+        self.side = np.zeros(0)          # last non-zero side of the counting line
+        self._next_id = 1
+        self.updates = 0
+
+        self.entries = 0
+        self.exits = 0
+
+    # ── Association ───────────────────────────────────────────────────────
+    def update(self, detections: np.ndarray):
+        """Match a new set of detections to existing tracks."""
+        dets = np.asarray(detections, dtype=float)
+        dets = dets.reshape(len(dets), -1)[:, :4] if dets.size else np.zeros((0, 4))
+        self.updates += 1
+
+        iou = iou_matrix(self.boxes, dets)
+        matched_tracks, matched_dets = [], []
+        if iou.size:
+            # Greedy: best remaining pair first.
+            pairs = np.dstack(np.unravel_index(np.argsort(-iou, axis=None), iou.shape))[0]
+            used_t, used_d = set(), set()
+            for t, d in pairs:
+                if iou[t, d] < self.iou_threshold:
+                    break
+                if t in used_t or d in used_d:
+                    continue
+                used_t.add(t)
+                used_d.add(d)
+                matched_tracks.append(t)
+                matched_dets.append(d)
+
+        matched_tracks = np.array(matched_tracks, dtype=np.int64)
+        matched_dets = np.array(matched_dets, dtype=np.int64)
+
+        self.missed += 1
+        if len(matched_tracks):
+            self.boxes[matched_tracks] = dets[matched_dets]
+            self.hits[matched_tracks] += 1
+            self.missed[matched_tracks] = 0
+
+        keep = self.missed <= self.max_missed
+        self._select(keep)
+
+        new = np.setdiff1d(np.arange(len(dets)), matched_dets)
+        if len(new):
+            n = len(new)
+            self.boxes = np.vstack([self.boxes, dets[new]])
+            self.ids = np.concatenate([self.ids, np.arange(self._next_id, self._next_id + n)])
+            self.hits = np.concatenate([self.hits, np.ones(n, dtype=np.int64)])
+            self.missed = np.concatenate([self.missed, np.zeros(n, dtype=np.int64)])
+            self.side = np.concatenate([self.side, self._sides(dets[new])])
+            self._next_id += n
+
+        self._count_crossings()
+
+    def propagate(self, displacements: np.ndarray):
+        """Shift every track by (dx, dy) — used on frames without detection."""
+        if not len(self.boxes):
+            return
+        d = np.asarray(displacements, dtype=float).reshape(-1, 2)
+        self.boxes += np.hstack([d, d])
+        self._count_crossings()
+
+    def _select(self, mask):
+        self.boxes = self.boxes[mask]
+        self.ids = self.ids[mask]
+        self.hits = self.hits[mask]
+        self.missed = self.missed[mask]
+        self.side = self.side[mask]
+
+    # ── Line crossing ─────────────────────────────────────────────────────
+    def _sides(self, boxes):
+        if self.line is None or not len(boxes):
+            return np.zeros(len(boxes))
+        cx = (boxes[:, 0] + boxes[:, 2]) / 2
+        cy = (boxes[:, 1] + boxes[:, 3]) / 2
+        x1, y1, x2, y2 = self.line
+        return np.sign((x2 - x1) * (cy - y1) - (y2 - y1) * (cx - x1))
+
+    def _count_crossings(self):
+        if self.line is None or not len(self.boxes):
+            return
+        now = self._sides(self.boxes)
+
+        # Only crossings within the segment count, not of its infinite extension.
+        x1, y1, x2, y2 = self.line
+        cx = (self.boxes[:, 0] + self.boxes[:, 2]) / 2
+        cy = (self.boxes[:, 1] + self.boxes[:, 3]) / 2
+        seg = np.array([x2 - x1, y2 - y1])
+        t = ((cx - x1) * seg[0] + (cy - y1) * seg[1]) / max(seg @ seg, 1e-9)
+        on_segment = (t >= 0) & (t <= 1)
+
+        confirmed = self.hits >= self.min_hits
+        crossed = (self.side != 0) & (now != 0) & (now != self.side) & on_segment & confirmed
+        # Image y points down, so a positive cross product is the on-screen right-hand side.
+        self.entries += int(np.sum(crossed & (now > 0)))
+        self.exits += int(np.sum(crossed & (now < 0)))
+
+        self.side = np.where(now != 0, now, self.side)
+
+    # ── Output ────────────────────────────────────────────────────────────
+    @property
+    def count(self) -> int:
+        """Tracks seen in at least `min_hits` detection frames and not currently lost."""
+        # Until min_hits detection frames have run, no track can be confirmed yet.
+        min_hits = min(self.min_hits, max(self.updates, 1))
+        return int(np.sum((self.hits >= min_hits) & (self.missed == 0)))
+
+    def centers(self):
+        return np.column_stack([
+            (self.boxes[:, 0] + self.boxes[:, 2]) / 2,
+            (self.boxes[:, 1] + self.boxes[:, 3]) / 2,
+        ])
@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import DetectFromImageView, DetectAndUpdateView
+from .views import DetectFromImageView, DetectAndUpdateView, DetectionCacheStatsView, stream_view
 
 urlpatterns = [
     path('detect/', DetectFromImageView.as_view(), name='detect-image'),
+    path('cache/', DetectionCacheStatsView.as_view(), name='detect-cache'),
     path('detect/<int:location_id>/', DetectAndUpdateView.as_view(), name='detect-update'),
+    path('stream/<int:location_id>/', stream_view, name='detect-stream'),
 ]
@@ -1,53 +1,211 @@
 import base64
 import logging
+import threading
 import numpy as np
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.parsers import BaseParser, FormParser, JSONParser, MultiPartParser
 
 logger = logging.getLogger(__name__)
 
+# cv2.imdecode flags for JPEG decoding at 1/2, 1/4 and 1/8 scale (DCT scaling,
+# much cheaper than decoding at full size and resizing).
+_REDUCED_FLAGS = {1: 'IMREAD_COLOR', 2: 'IMREAD_REDUCED_COLOR_2',
+                  4: 'IMREAD_REDUCED_COLOR_4', 8: 'IMREAD_REDUCED_COLOR_8'}
+
+_MODES = ('yolo', 'haar', 'onnx')
+
+_detectors = {}
+_detectors_lock = threading.Lock()
+
+
+def _get_detector(mode):
+    """Detectors are expensive to load; keep one per mode for the process."""
+    detector = _detectors.get(mode)
+    if detector is None:
+        from detection.detector import get_detector
+        with _detectors_lock:
+            detector = _detectors.get(mode)
+            if detector is None:
+                detector = _detectors[mode] = get_detector(mode)
+    return detector
+
+
+class RawImageParser(BaseParser):
+    """Accepts a bare image body (image/jpeg, image/png, application/octet-stream)."""
+    media_type = 'image/*'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return stream.read()
+
+
+class OctetStreamParser(RawImageParser):
+    media_type = 'application/octet-stream'
+
+
+def _decode_image(data: bytes, reduce: int):
+    import cv2
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), getattr(cv2, _REDUCED_FLAGS[reduce]))
+    if frame is None:
+        raise ValueError('not a decodable image')
+    return frame
+
 
 class DetectFromImageView(APIView):
     """
     POST /api/detection/detect/
-    Body: { "image": "<base64 jpeg/png>", "mode": "yolo" }
-    Returns: { "count": 5 }
+    Accepts any of:
+      - JSON: { "image": "<base64 jpeg/png>" } or { "images": ["<base64>", ...] }
+      - multipart/form-data with one or more `image` (or `images`) file fields
+      - a raw image/jpeg, image/png or application/octet-stream body
+    Options (JSON/form field or query param):
+      mode   — yolo | haar | onnx (default yolo)
+      boxes  — true to include [x1, y1, x2, y2, conf] per person
+      reduce — 1, 2, 4 or 8: decode JPEGs at 1/reduce resolution (boxes are
+               scaled back to full-size coordinates)
+    Returns: { "count": 5 } for one image, or
+             { "results": [{ "count": 5 }, ...], "total": 12 } for a batch.
+    Repeated or near-identical frames are answered from the frame-hash
+    cache (detection/cache.py); such results carry "cached": true.
     """
+    parser_classes = [JSONParser, MultiPartParser, FormParser, RawImageParser, OctetStreamParser]
+
+    def _option(self, request, name, default=None):
+        if isinstance(request.data, dict) and name in request.data:
+            return request.data.get(name)
+        return request.query_params.get(name, default)
+
+    def _payloads(self, request):
+        """Raw image bytes from whichever body format was sent; (payloads, is_batch)."""
+        data = request.data
+        if isinstance(data, bytes):
+            return ([data] if data else []), False
+        files = request.FILES.getlist('image') + request.FILES.getlist('images')
+        if files:
+            return [f.read() for f in files], len(files) > 1 or 'images' in request.FILES
+        if 'images' in data:
+            images = data.get('images')
+            if not isinstance(images, list):
+                raise ValueError('images must be a list of base64 strings')
+            return [base64.b64decode(i) for i in images], True
+        image = data.get('image')
+        return ([base64.b64decode(image)] if image else []), False
+
+    def _detect(self, detector, mode, frames):
+        """Boxes per frame, served from the frame-hash cache where possible."""
+        from detection.cache import dhash, frame_cache
+
+        if not frame_cache.enabled:
+            return detector.detect_boxes_batch(frames), [False] * len(frames)
+
+        confidence = getattr(detector, 'confidence', None)
+        keys = [(mode, confidence, frame.shape) for frame in frames]
+        hashes = [dhash(frame) for frame in frames]
+        boxes = [frame_cache.get(k, h) for k, h in zip(keys, hashes)]
+        cached = [b is not None for b in boxes]
+
+        misses = [i for i, hit in enumerate(cached) if not hit]
+        if misses:
+            fresh = detector.detect_boxes_batch([frames[i] for i in misses])
+            for i, b in zip(misses, fresh):
+                frame_cache.put(keys[i], hashes[i], b)
+                boxes[i] = b
+        return boxes, cached
 
     def post(self, request):
-        image_b64 = request.data.get('image')
-        mode = request.data.get('mode', 'yolo')
+        mode = self._option(request, 'mode', 'yolo')
+        if mode not in _MODES:
+            return Response({'error': 'mode must be yolo, haar or onnx'}, status=status.HTTP_400_BAD_REQUEST)
+        with_boxes = str(self._option(request, 'boxes', '')).lower() in ('1', 'true', 'yes')
+        try:
+            reduce = int(self._option(request, 'reduce', 1))
+        except (TypeError, ValueError):
+            reduce = 0
+        if reduce not in _REDUCED_FLAGS:
+            return Response({'error': 'reduce must be 1, 2, 4 or 8'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not image_b64:
+        try:
+            payloads, is_batch = self._payloads(request)
+        except Exception as e:
+            return Response({'error': f'Invalid image: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        if not payloads:
             return Response({'error': 'image field required'}, status=status.HTTP_400_BAD_REQUEST)
+        max_batch = getattr(settings, 'DETECTION_MAX_BATCH', 32)
+        if len(payloads) > max_batch:
+            return Response(
+                {'error': f'at most {max_batch} images per request'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         try:
-            img_bytes = base64.b64decode(image_b64)
-            import cv2
-            nparr = np.frombuffer(img_bytes, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            frames = [_decode_image(p, reduce) for p in payloads]
         except Exception as e:
             return Response({'error': f'Invalid image: {e}'}, status=status.HTTP_400_BAD_REQUEST)
 
-        from detection.detector import get_detector
-        detector = get_detector(mode)
-        count = detector.detect_from_frame(frame)
+        detector = _get_detector(mode)
+        all_boxes, cached = self._detect(detector, mode, frames)
+        results = []
+        for boxes, hit in zip(all_boxes, cached):
+            item = {'count': len(boxes), 'cached': hit}
+            if with_boxes:
+                boxes = boxes.copy()
+                boxes[:, :4] *= reduce
+                item['boxes'] = np.round(boxes, 3).tolist()
+            results.append(item)
 
-        return Response({'count': count, 'mode': mode})
+        if not is_batch:
+            return Response({**results[0], 'mode': mode})
+        return Response({
+            'results': results,
+            'total': sum(r['count'] for r in results),
+            'mode': mode,
+        })
+
+
+class DetectionCacheStatsView(APIView):
+    """
+    GET /api/detection/cache/    — frame cache hit/miss counters
+    DELETE /api/detection/cache/ — drop all cached results
+    """
+
+    def get(self, request):
+        from detection.cache import frame_cache
+        return Response(frame_cache.stats())
+
+    def delete(self, request):
+        from detection.cache import frame_cache
+        frame_cache.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class DetectAndUpdateView(APIView):
     """
     POST /api/detection/detect/<location_id>/
+    Body (optional): { "mode": "yolo", "detect_every": 5 }
     Runs detection on a camera and immediately updates the location.
+    With detect_every > 1 or a location counting line, people are tracked
+    between detector runs and entries/exits are recorded. If the location has
+    an ROI or shares its camera with other locations, one inference on the
+    ROI crop updates every location on that camera.
     """
 
     def post(self, request, location_id):
+        from dashboard.metrics import metrics
+
+        with metrics.pipeline('detect_and_update'):
+            return self._run(request, location_id, metrics)
+
+    def _run(self, request, location_id, metrics):
         from locations.models import Location, CrowdLog
         from locations.views import _broadcast_update
         from alerts.utils import check_and_trigger_alerts
-        from detection.detector import get_detector
+        from detection.streaming import hub
+        from detection.tracker import parse_line
+        from detection.zones import ZoneSet, parse_polygon
 
         try:
             location = Location.objects.get(pk=location_id, is_active=True)
@@ -55,29 +213,114 @@ class DetectAndUpdateView(APIView):
             return Response({'error': 'Location not found'}, status=404)
 
         mode = request.data.get('mode', 'yolo')
-        detector = get_detector(mode)
+        if mode not in _MODES:
+            return Response({'error': 'mode must be yolo, haar or onnx'}, status=status.HTTP_400_BAD_REQUEST)
+        detector = _get_detector(mode)
 
         source = location.camera_url or 0
         if isinstance(source, str) and source.isdigit():
             source = int(source)
 
-        count = detector.detect_from_camera(source=source, duration_seconds=2)
-        location.update_count(count)
+        try:
+            detect_every = int(request.data.get('detect_every', 1))
+        except (TypeError, ValueError):
+            return Response({'error': 'detect_every must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        def on_frame(frame, boxes):
+            # Live viewers of /stream/<id>/ see this run too.
+            hub.publish(location.id, frame, boxes, relay=True)
+
+        group = [location]
+        if location.camera_url:
+            group += list(
+                Location.objects.filter(is_active=True, camera_url=location.camera_url)
+                .exclude(pk=location.pk)
+            )
+        line = parse_line(location.counting_line)
+        if len(group) > 1 or parse_polygon(location.roi) is not None:
+            def on_zone_frame(frame, boxes, inside):
+                for l, mask in zip(group, inside):
+                    hub.publish(l.id, frame, boxes[mask], relay=True)
 
-        CrowdLog.objects.create(
-            location=location,
-            people_count=count,
-            density_level=location.density_level,
-            occupancy_percentage=location.occupancy_percentage,
-            source='AI',
-        )
+            zones = ZoneSet(
+                [parse_polygon(l.roi) for l in group],
+                margin=getattr(settings, 'DETECTION_ROI_MARGIN', 0.1),
+            )
+            counts = detector.detect_zones_from_camera(
+                zones, source=source, duration_seconds=2, on_frame=on_zone_frame,
+            ).tolist()
+            count, entries, exits = counts[0], 0, 0
+        elif detect_every > 1 or line:
+            result = detector.track_from_camera(
+                source=source, duration_seconds=2, detect_every=detect_every, line=line,
+                on_frame=on_frame,
+            )
+            count, entries, exits = result.count, result.entries, result.exits
+            counts = [count]
+        else:
+            count = detector.detect_from_camera(source=source, duration_seconds=2, on_frame=on_frame)
+            entries = exits = 0
+            counts = [count]
 
-        check_and_trigger_alerts(location)
-        _broadcast_update(location)
+        for l, c in zip(group, counts):
+            with metrics.stage('db_write'):
+                l.update_count(c)
 
-        return Response({
+                CrowdLog.objects.create(
+                    location=l,
+                    people_count=c,
+                    density_level=l.density_level,
+                    occupancy_percentage=l.occupancy_percentage,
+                    source='AI',
+                    entries=entries if l is location else 0,
+                    exits=exits if l is location else 0,
+                )
+
+            with metrics.stage('alerts'):
+                check_and_trigger_alerts(l)
+            with metrics.stage('broadcast'):
+                _broadcast_update(l)
+
+        response = {
             'location_id': location.id,
             'location_name': location.name,
             'count': count,
+            'entries': entries,
+            'exits': exits,
             'density_level': location.density_level,
-        })
+        }
+        if len(counts) > 1:
+            response['zones'] = [
+                {'location_id': l.id, 'location_name': l.name, 'count': c}
+                for l, c in zip(group, counts)
+            ]
+        return Response(response)
+
+
+def stream_view(request, location_id):
+    """
+    GET /api/detection/stream/<location_id>/?fps=5
+    MJPEG (multipart/x-mixed-replace) live view of a location's annotated
+    detection frames. Frames come from the detection loop; the camera is never
+    opened on behalf of a viewer.
+    """
+    from detection.streaming import BOUNDARY, hub
+    from locations.models import Location
+
+    if not Location.objects.filter(pk=location_id, is_active=True).exists():
+        raise Http404('Location not found')
+    fps = None
+    if request.GET.get('fps'):
+        try:
+            fps = float(request.GET['fps'])
+        except ValueError:
+            fps = float('nan')
+        if not np.isfinite(fps) or fps <= 0:
+            return HttpResponseBadRequest('fps must be a positive number')
+
+    frames = hub.aframes if isinstance(request, ASGIRequest) else hub.frames
+    response = StreamingHttpResponse(
+        frames(location_id, fps),
+        content_type=f'multipart/x-mixed-replace; boundary={BOUNDARY}',
+    )
+    response['Cache-Control'] = 'no-cache, no-store'
+    return response
@@ -0,0 +1,83 @@
+"""
+Region-of-interest polygons and multi-zone counting.
+
+A Location's `roi` is a polygon in normalized frame coordinates. Locations
+that share a camera_url form one zone set: each frame is cropped to the
+bounding box of all their ROIs (padded by DETECTION_ROI_MARGIN so people
+standing at an edge keep their whole body), the detector runs once on the
+crop, and every box is assigned to each zone whose polygon contains its foot
+point (bottom centre). One inference therefore yields a count per Location,
+and pixels outside every ROI are never processed. A location without an ROI
+covers the whole frame.
+
+Polygons are stacked into one (zones, vertices, 2) array, padded by
+repeating the last vertex (a zero-length edge never crosses a scanline), so
+the even-odd test for all boxes against all zones is a single numpy
+expression.
+"""
+
+import numpy as np
+
+WHOLE_FRAME = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=float)
+
+
+def parse_polygon(value: str):
+    """'x1,y1,x2,y2,x3,y3,...' normalized to [0, 1] -> (K, 2) array, or None if blank/invalid."""
+    try:
+        parts = np.array([float(p) for p in (value or '').split(',')])
+    except ValueError:
+        return None
+    if len(parts) < 6 or len(parts) % 2 or not np.isfinite(parts).all():
+        return None
+    return np.clip(parts.reshape(-1, 2), 0, 1)
+
+
+def points_in_polygons(points: np.ndarray, polygons: np.ndarray) -> np.ndarray:
+    """Even-odd test of (N, 2) points against (Z, K, 2) polygons -> (Z, N) bool."""
+    x = points[None, :, None, 0]
+    y = points[None, :, None, 1]
+    xi, yi = polygons[:, None, :, 0], polygons[:, None, :, 1]
+    prev = np.roll(polygons, 1, axis=1)
+    xj, yj = prev[:, None, :, 0], prev[:, None, :, 1]
+
+    straddles = (yi > y) != (yj > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = xi + (y - yi) * (xj - xi) / (yj - yi)
+    return np.count_nonzero(straddles & (x < x_cross), axis=2) % 2 == 1
+
+
+class ZoneSet:
+    def __init__(self, polygons, margin=0.1):
+        """polygons: (K, 2) normalized arrays, or None for the whole frame, one per zone."""
+        polygons = [WHOLE_FRAME if p is None else np.asarray(p, dtype=float) for p in polygons]
+        k = max(len(p) for p in polygons)
+        self.polygons = np.stack([
+            np.vstack([p, np.repeat(p[-1:], k - len(p), axis=0)]) for p in polygons
+        ])
+        lo = self.polygons.min(axis=(0, 1)) - margin
+        hi = self.polygons.max(axis=(0, 1)) + margin
+        self.region = np.clip(np.concatenate([lo, hi]), 0, 1)     # normalized x1, y1, x2, y2
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def crop(self, frame: np.ndarray):
+        """(view of the frame inside the ROI region, (x, y) offset of that view)."""
+        h, w = frame.shape[:2]
+        x1, y1, x2, y2 = np.round(self.region * [w, h, w, h]).astype(int)
+        if x2 <= x1 or y2 <= y1:
+            # A degenerate region rounds to no pixels; detect on the whole frame instead.
+            return frame, (0, 0)
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def assign(self, boxes: np.ndarray, shape) -> np.ndarray:
+        """(Z, N) membership of (N, 4+) pixel boxes by foot point."""
+        h, w = shape[:2]
+        boxes = np.asarray(boxes, dtype=float)
+        if boxes.ndim != 2:
+            boxes = np.zeros((0, 4))
+        feet = np.column_stack([(boxes[:, 0] + boxes[:, 2]) / 2 / w, boxes[:, 3] / h])
+        return points_in_polygons(feet, self.polygons)
+
+    def counts(self, boxes: np.ndarray, shape) -> np.ndarray:
+        return self.assign(boxes, shape).sum(axis=1)
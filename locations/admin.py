@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Location, CrowdLog
+from .models import Location, LocationGroup, CrowdLog
 
 
 @admin.register(Location)
@@ -10,6 +10,14 @@ class LocationAdmin(admin.ModelAdmin):
     readonly_fields = ['current_count', 'density_level', 'last_updated']
 
 
+@admin.register(LocationGroup)
+class LocationGroupAdmin(admin.ModelAdmin):
+    list_display = ['name', 'kind', 'parent', 'current_count', 'capacity_limit', 'density_level', 'occupancy_percentage']
+    list_filter = ['kind', 'density_level']
+    search_fields = ['name']
+    readonly_fields = ['current_count', 'capacity_limit', 'density_level', 'last_updated']
+
+
 @admin.register(CrowdLog)
 class CrowdLogAdmin(admin.ModelAdmin):
     list_display = ['location', 'people_count', 'density_level', 'occupancy_percentage', 'source', 'timestamp']
@@ -3,3 +3,27 @@ from django.apps import AppConfig
 class LocationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'locations'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+        from . import groups
+        from .heatmaps import record
+        from .live import live_state
+        from .models import CrowdLog, Location, LocationGroup
+        from .spatial import spatial_index
+
+        post_save.connect(spatial_index.invalidate, sender=Location, dispatch_uid='spatial_index_saved')
+        post_delete.connect(spatial_index.invalidate, sender=Location, dispatch_uid='spatial_index_deleted')
+        pre_save.connect(live_state.carry, sender=Location, dispatch_uid='live_state_saving')
+        post_save.connect(live_state.refresh, sender=Location, dispatch_uid='live_state_saved')
+        post_delete.connect(live_state.forget, sender=Location, dispatch_uid='live_state_deleted')
+        post_save.connect(record, sender=CrowdLog, dispatch_uid='occupancy_profile_record')
+
+        pre_save.connect(groups.location_saving, sender=Location, dispatch_uid='groups_location_saving')
+        post_save.connect(groups.location_saved, sender=Location, dispatch_uid='groups_location_saved')
+        pre_delete.connect(groups.location_deleting, sender=Location, dispatch_uid='groups_location_deleting')
+        post_delete.connect(groups.location_deleted, sender=Location, dispatch_uid='groups_location_deleted')
+        pre_save.connect(groups.group_saving, sender=LocationGroup, dispatch_uid='groups_group_saving')
+        post_save.connect(groups.group_saved, sender=LocationGroup, dispatch_uid='groups_group_saved')
+        pre_delete.connect(groups.group_deleting, sender=LocationGroup, dispatch_uid='groups_group_deleting')
+        post_delete.connect(live_state.forget_group, sender=LocationGroup, dispatch_uid='live_state_group_deleted')
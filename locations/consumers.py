@@ -1,8 +1,8 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from locations.models import Location
-from locations.serializers import LocationSerializer
+from locations.models import Location, LocationGroup
+from locations.serializers import LocationSerializer, LocationGroupSerializer
 
 
 class CrowdConsumer(AsyncWebsocketConsumer):
@@ -59,3 +59,37 @@ class LocationCrowdConsumer(AsyncWebsocketConsumer):
             'type': 'crowd_update',
             'data': event['data'],
         }))
+
+
+class GroupCrowdConsumer(AsyncWebsocketConsumer):
+    """Consumer for a location group's aggregated totals."""
+
+    async def connect(self):
+        self.group_id = self.scope['url_route']['kwargs']['group_id']
+        self.group_name = f'crowd_group_{self.group_id}'
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        group = await self._get_group()
+        if group is not None:
+            await self.send(text_data=json.dumps({
+                'type': 'initial_state',
+                'data': group,
+            }))
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def group_update(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'group_update',
+            'data': event['data'],
+        }))
+
+    @database_sync_to_async
+    def _get_group(self):
+        from locations.live import live_state
+
+        group = LocationGroup.objects.filter(pk=self.group_id).first()
+        if group is None:
+            return None
+        return LocationGroupSerializer(live_state.apply_groups([group])[0]).data
@@ -0,0 +1,72 @@
+"""
+Server-side downsampling for crowd count time series.
+
+Both functions take parallel arrays of epoch timestamps (seconds) and counts,
+sorted by time, and return a reduced (timestamps, counts) pair:
+
+  * bucket_average — equal-width time buckets, mean count per bucket.
+  * lttb           — Largest-Triangle-Three-Buckets, keeps the visual shape
+                     (peaks and troughs) of the original series.
+"""
+
+import numpy as np
+
+
+def bucket_average(ts: np.ndarray, values: np.ndarray, points: int):
+    """Average values into `points` equal-width time buckets; empty buckets are dropped."""
+    n = len(ts)
+    if points <= 0 or n <= points:
+        return ts, values.astype(float)
+
+    start, end = ts[0], ts[-1]
+    if end <= start:
+        return ts[:1], np.array([values.mean()])
+
+    width = (end - start) / points
+    idx = np.minimum(((ts - start) / width).astype(np.int64), points - 1)
+
+    counts = np.bincount(idx, minlength=points)
+    value_sums = np.bincount(idx, weights=values, minlength=points)
+    ts_sums = np.bincount(idx, weights=ts, minlength=points)
+
+    mask = counts > 0
+    return ts_sums[mask] / counts[mask], value_sums[mask] / counts[mask]
+
+
+def lttb(ts: np.ndarray, values: np.ndarray, points: int):
+    """Largest-Triangle-Three-Buckets downsampling to `points` samples."""
+    n = len(ts)
+    if points >= n or points < 3:
+        return ts, values.astype(float)
+
+    x = ts.astype(float)
+    y = values.astype(float)
+
+    # Bucket boundaries for the n - 2 interior points; first and last are kept.
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+
+    out = np.empty(points, dtype=np.int64)
+    out[0] = 0
+    out[-1] = n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point for the final bucket)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nlo:nhi].mean()
+        avg_y = y[nlo:nhi].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+
+    return x[out], y[out]
+
+
+METHODS = {
+    'avg': bucket_average,
+    'lttb': lttb,
+}
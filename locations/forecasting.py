@@ -0,0 +1,362 @@
+"""
+Short-term crowd forecasting.
+
+Per location the model is an hour-of-week baseline (mean count for each of the
+168 hours in a week) plus damped Holt exponential smoothing of the residual:
+
+    forecast(t + h) = baseline[hour_of_week(t + h)] + level + trend * Σ φ^i
+
+State for the whole fleet lives in NumPy arrays indexed by location row, so
+
+  * `fit()` rebuilds every location from CrowdLog history in one query and a
+    handful of vectorised passes (one loop step per time bucket, not per row);
+  * `observe()` folds a single new reading in with O(1) work;
+  * `forecast()` predicts any horizon for all locations at once.
+
+Use the module-level `forecaster`. Full fits never run on a request or
+alert path. `run_detection` refits in a background thread every
+FORECAST_REFIT_SECONDS (or run `manage.py refit_forecasts` from cron) and
+stores the result as the ForecastSnapshot row; sharded workers skip the
+refit while another worker's snapshot is fresh. Every other process only
+`load()`s the newest snapshot (checking at most every FORECAST_RELOAD_SECONDS),
+`observe()`s its own readings and catches up on readings written elsewhere via
+the incremental `sync()`; until the first snapshot lands, unknown locations
+forecast 0.
+"""
+
+import io
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_WEEK = 168
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _local_offset():
+    now = timezone.localtime() if settings.USE_TZ else datetime.now().astimezone()
+    return now.utcoffset().total_seconds()
+
+
+def _from_epoch(ts):
+    """Epoch seconds -> datetime suitable for ORM filters under either USE_TZ setting."""
+    if settings.USE_TZ:
+        return datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+    return datetime.fromtimestamp(ts)
+
+
+def _hour_of_week(ts, offset):
+    """Monday 00:00 = 0. `ts` epoch seconds (scalar or array), `offset` seconds east of UTC."""
+    # The Unix epoch fell on a Thursday, i.e. hour 72 of a Monday-based week.
+    return ((np.floor_divide(ts + offset, 3600) + 72) % HOURS_PER_WEEK).astype(np.int64)
+
+
+class Forecaster:
+    def __init__(self, step_seconds=300, alpha=0.3, beta=0.05, phi=0.9):
+        self.step = step_seconds
+        self.alpha = alpha
+        self.beta = beta
+        self.phi = phi
+        self._lock = threading.RLock()
+        self._refitter = None
+        self._snapshot_at = None                         # fitted_at of the snapshot in use
+        self._checked_at = float('-inf')
+        self._reset()
+
+    def _reset(self):
+        self.rows = {}                                   # location_id -> row
+        self.season_sum = np.zeros((0, HOURS_PER_WEEK))
+        self.season_n = np.zeros((0, HOURS_PER_WEEK))
+        self.level = np.zeros(0)
+        self.trend = np.zeros(0)
+        self.last_ts = np.zeros(0)                       # 0 = no observation yet
+        self.fitted_at = 0.0
+        self.synced_at = None
+        self.tz_offset = _local_offset()
+
+    # ── Row management ────────────────────────────────────────────────────
+    def _row(self, location_id):
+        row = self.rows.get(location_id)
+        if row is None:
+            row = self.rows[location_id] = len(self.level)
+            self.season_sum = np.vstack([self.season_sum, np.zeros(HOURS_PER_WEEK)])
+            self.season_n = np.vstack([self.season_n, np.zeros(HOURS_PER_WEEK)])
+            self.level = np.append(self.level, 0.0)
+            self.trend = np.append(self.trend, 0.0)
+            self.last_ts = np.append(self.last_ts, 0.0)
+        return row
+
+    def _baseline(self, rows, how):
+        """Hour-of-week mean, falling back to the location's overall mean for empty hours."""
+        s = self.season_sum[rows, how]
+        n = self.season_n[rows, how]
+        if np.ndim(rows) == 0:
+            overall = self.season_sum[rows].sum() / max(self.season_n[rows].sum(), 1)
+        else:
+            overall = (self.season_sum.sum(axis=1) / np.maximum(self.season_n.sum(axis=1), 1))[rows]
+        return np.where(n > 0, s / np.maximum(n, 1), overall)
+
+    # ── Batch fit ─────────────────────────────────────────────────────────
+    def fit(self, location_ids, ts, counts):
+        """Fit every location from parallel arrays of readings (any order)."""
+        with self._lock:
+            self._reset()
+            self.fitted_at = time.monotonic()
+            if len(ts) == 0:
+                return
+
+            order = np.argsort(ts, kind='stable')
+            location_ids, ts, counts = location_ids[order], ts[order], counts[order].astype(float)
+
+            ids, rows = np.unique(location_ids, return_inverse=True)
+            n_loc = len(ids)
+            self.rows = {int(i): r for r, i in enumerate(ids)}
+
+            how = _hour_of_week(ts, self.tz_offset)
+            flat = rows * HOURS_PER_WEEK + how
+            size = n_loc * HOURS_PER_WEEK
+            self.season_sum = np.bincount(flat, weights=counts, minlength=size).reshape(n_loc, -1)
+            self.season_n = np.bincount(flat, minlength=size).reshape(n_loc, -1).astype(float)
+
+            # Smoothing state only depends on recent history; the baseline uses all of it.
+            recent = ts >= ts[-1] - _setting('FORECAST_SMOOTHING_HOURS', 24) * 3600
+            r_rows, r_ts = rows[recent], ts[recent]
+            residual = counts[recent] - self._baseline(r_rows, how[recent])
+
+            # Resample residuals onto a regular grid: mean per (location, step).
+            t0 = r_ts[0]
+            k = ((r_ts - t0) // self.step).astype(np.int64)
+            n_steps = int(k[-1]) + 1
+            cell = r_rows * n_steps + k
+            cell_sum = np.bincount(cell, weights=residual, minlength=n_loc * n_steps)
+            cell_n = np.bincount(cell, minlength=n_loc * n_steps)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                grid = (cell_sum / cell_n).reshape(n_loc, n_steps)
+
+            level = np.zeros(n_loc)
+            trend = np.zeros(n_loc)
+            started = np.zeros(n_loc, dtype=bool)
+            a, b, phi = self.alpha, self.beta, self.phi
+            for t in range(n_steps):
+                obs = grid[:, t]
+                seen = ~np.isnan(obs)
+                first = seen & ~started
+                level[first] = obs[first]
+                started |= first
+
+                upd = seen & ~first
+                prev = level.copy()
+                predicted = level + phi * trend
+                level = np.where(upd, a * obs + (1 - a) * predicted, np.where(started & ~seen, predicted, level))
+                trend = np.where(upd, b * (level - prev) + (1 - b) * phi * trend, np.where(started & ~seen, phi * trend, trend))
+
+            self.level = level
+            self.trend = trend
+            self.last_ts = np.zeros(n_loc)
+            np.maximum.at(self.last_ts, rows, ts)
+            self.synced_at = float(ts[-1])
+
+    def refit(self):
+        """Rebuild the whole fleet from CrowdLog history, store it as the snapshot and swap it in."""
+        from datetime import timedelta
+        from .models import CrowdLog, ForecastSnapshot
+
+        started = time.time()
+        since = timezone.now() - timedelta(days=_setting('FORECAST_HISTORY_DAYS', 28))
+        # Stream up to a high-water mark into preallocated arrays; later rows are replayed by sync().
+        high = CrowdLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        logs = CrowdLog.objects.filter(timestamp__gte=since, id__lte=high).order_by()
+        n = logs.count()
+        location_ids = np.empty(n, dtype=np.int64)
+        ts = np.empty(n)
+        counts = np.empty(n)
+        i = 0
+        for location_id, stamp, count in logs.values_list(
+            'location_id', 'timestamp', 'people_count',
+        ).iterator(chunk_size=10_000):
+            if i == n:
+                break
+            location_ids[i], ts[i], counts[i] = location_id, stamp.timestamp(), count
+            i += 1
+        # Fit a fresh model so observe() and forecast() keep serving the current one meanwhile.
+        fresh = Forecaster(self.step, self.alpha, self.beta, self.phi)
+        fresh.fit(location_ids[:i], ts[:i], counts[:i])
+        fresh.synced_at = started
+
+        snapshot, _ = ForecastSnapshot.objects.update_or_create(
+            pk=1, defaults={'data': fresh._dump(), 'synced_at': started},
+        )
+        self._swap(fresh, snapshot.fitted_at)
+
+    def _dump(self):
+        ids = np.zeros(len(self.rows), dtype=np.int64)
+        for location_id, row in self.rows.items():
+            ids[row] = location_id
+        buf = io.BytesIO()
+        np.savez(
+            buf, ids=ids, season_sum=self.season_sum, season_n=self.season_n,
+            level=self.level, trend=self.trend, last_ts=self.last_ts, tz_offset=self.tz_offset,
+        )
+        return buf.getvalue()
+
+    def _swap(self, fresh, snapshot_at):
+        """Serve `fresh` from now on, then replay readings it has not seen."""
+        with self._lock:
+            for name in ('rows', 'season_sum', 'season_n', 'level', 'trend', 'last_ts', 'fitted_at',
+                         'tz_offset', 'synced_at'):
+                setattr(self, name, getattr(fresh, name))
+            self._snapshot_at = snapshot_at
+            self._checked_at = time.monotonic()
+        # Readings observed while fitting were dropped with the old model; replay them.
+        self.sync()
+
+    def load(self, force=False):
+        """
+        Swap in the stored snapshot if it is newer than the one in use. Checks
+        the database at most every FORECAST_RELOAD_SECONDS unless `force`.
+        Returns True if a snapshot was loaded.
+        """
+        from .models import ForecastSnapshot
+
+        now = time.monotonic()
+        if not force and now - self._checked_at < _setting('FORECAST_RELOAD_SECONDS', 60):
+            return False
+        self._checked_at = now
+        latest = ForecastSnapshot.objects.filter(pk=1).values_list('fitted_at', flat=True).first()
+        if latest is None or latest == self._snapshot_at:
+            return False
+        snapshot = ForecastSnapshot.objects.get(pk=1)
+        arrays = np.load(io.BytesIO(bytes(snapshot.data)))
+        fresh = Forecaster(self.step, self.alpha, self.beta, self.phi)
+        fresh.rows = {int(i): r for r, i in enumerate(arrays['ids'])}
+        for name in ('season_sum', 'season_n', 'level', 'trend', 'last_ts'):
+            setattr(fresh, name, arrays[name])
+        fresh.tz_offset = float(arrays['tz_offset'])
+        fresh.fitted_at = now
+        fresh.synced_at = snapshot.synced_at
+        self._swap(fresh, snapshot.fitted_at)
+        return True
+
+    def start(self):
+        """Start the background refit thread if it is not running. Never blocks."""
+        with self._lock:
+            if self._refitter is None:
+                self._refitter = threading.Thread(target=self._run, name='forecast-refit', daemon=True)
+                self._refitter.start()
+
+    def _run(self):
+        from datetime import timedelta
+        from django.db import close_old_connections
+        from .models import ForecastSnapshot
+
+        while True:
+            interval = _setting('FORECAST_REFIT_SECONDS', 3600)
+            try:
+                # Another worker refit recently: use its snapshot instead of fitting again.
+                fresh_since = timezone.now() - timedelta(seconds=interval)
+                if ForecastSnapshot.objects.filter(pk=1, fitted_at__gt=fresh_since).exists():
+                    self.load(force=True)
+                else:
+                    self.refit()
+            except Exception as e:
+                logger.warning(f"Forecast refit failed: {e}")
+            finally:
+                close_old_connections()
+            time.sleep(interval)
+
+    # ── Incremental updates ───────────────────────────────────────────────
+    def observe(self, location_id, count, ts=None):
+        """Fold one reading into the model. Readings older than the last one are ignored."""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            row = self._row(location_id)
+            last = self.last_ts[row]
+            if last and ts <= last:
+                return
+
+            how = int(_hour_of_week(ts, self.tz_offset))
+            self.season_sum[row, how] += count
+            self.season_n[row, how] += 1
+            residual = count - self._baseline(row, how)
+
+            if not last:
+                self.level[row] = residual
+                self.trend[row] = 0.0
+            else:
+                # Scale smoothing to elapsed time so frequent readings don't over-weight.
+                steps = (ts - last) / self.step
+                a = 1 - (1 - self.alpha) ** steps
+                b = 1 - (1 - self.beta) ** steps
+                decay = self.phi ** steps
+                prev = self.level[row]
+                predicted = prev + self.trend[row] * self._damped_sum(steps)
+                self.level[row] = a * residual + (1 - a) * predicted
+                self.trend[row] = b * (self.level[row] - prev) / steps + (1 - b) * decay * self.trend[row]
+            self.last_ts[row] = ts
+
+    def sync(self):
+        """Observe CrowdLog rows written since the last sync (e.g. by run_detection)."""
+        from .models import CrowdLog
+
+        if self.load():
+            return
+        if not self.fitted_at:
+            return
+        since = _from_epoch(self.synced_at or time.time())
+        rows = (
+            CrowdLog.objects.filter(timestamp__gt=since)
+            .order_by('timestamp')
+            .values_list('location_id', 'timestamp', 'people_count')
+        )
+        for location_id, ts, count in rows:
+            self.observe(location_id, count, ts.timestamp())
+            self.synced_at = ts.timestamp()
+
+    # ── Forecasting ───────────────────────────────────────────────────────
+    def _damped_sum(self, h):
+        if self.phi == 1:
+            return h
+        return self.phi * (1 - self.phi ** h) / (1 - self.phi)
+
+    def forecast(self, location_ids, minutes, now=None):
+        """
+        Returns (timestamps, counts) where counts has shape (len(location_ids), steps)
+        and timestamps are epoch seconds at each step up to `minutes` ahead.
+        """
+        now = time.time() if now is None else now
+        n_steps = max(1, int(minutes * 60 // self.step))
+        times = now + self.step * np.arange(1, n_steps + 1)
+
+        with self._lock:
+            known = [self.rows[i] for i in location_ids if i in self.rows]
+            out = np.zeros((len(location_ids), n_steps))
+            if not known:
+                return times, out
+            rows = np.array(known)
+            mask = np.array([i in self.rows for i in location_ids])
+
+            how = _hour_of_week(times, self.tz_offset)
+            baseline = self._baseline(rows[:, None], how[None, :])
+            # Trend extrapolates from the last observation, not from `now`.
+            h = (times[None, :] - self.last_ts[rows][:, None]) / self.step
+            pred = baseline + self.level[rows][:, None] + self.trend[rows][:, None] * self._damped_sum(np.maximum(h, 0))
+            out[mask] = np.maximum(pred, 0)
+        return times, out
+
+    def predict_at(self, location_id, minutes, now=None):
+        """Forecast for a single location `minutes` ahead."""
+        _, counts = self.forecast([location_id], minutes, now)
+        return float(counts[0, -1])
+
+
+forecaster = Forecaster(step_seconds=getattr(settings, 'FORECAST_STEP_SECONDS', 300))
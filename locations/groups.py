@@ -0,0 +1,327 @@
+"""
+Incrementally maintained LocationGroup aggregates.
+
+Every active Location contributes its live count and its capacity to its
+group and to every ancestor of that group. Totals are never summed on read:
+
+  * Location.update_count() passes the count delta up the chain of ancestors
+    with atomic live-store increments (O(depth)), and broadcasts each group's
+    new total to the `crowd_group_<id>` channel group;
+  * membership, activation and capacity changes (Location post_save /
+    post_delete) move the location's contribution from its old chain to its
+    new one; re-parenting or deleting a group moves its whole total;
+  * capacity only changes with structure, so it is updated on the rows
+    directly, inside the same transaction.
+
+Each process keeps the tree (group parents and metadata, and each active
+location's group) in memory and reloads it when the shared version key,
+bumped after every structural change commits, moves. `rebuild()`
+(`manage.py rebuild_groups`) recomputes every aggregate from scratch.
+"""
+
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'live:groups:version'
+STRUCTURAL_FIELDS = {'group', 'group_id', 'is_active', 'capacity_limit'}
+
+
+def _chain(parents, group_id):
+    """group_id followed by its ancestors, root last."""
+    chain = []
+    while group_id is not None and group_id in parents and group_id not in chain:
+        chain.append(group_id)
+        group_id = parents[group_id]
+    return chain
+
+
+def group_payload(group_id, name, kind, count, capacity, updated):
+    from .models import density_level_for
+
+    return {
+        'group_id': group_id,
+        'group_name': name,
+        'kind': kind,
+        'current_count': count,
+        'capacity_limit': capacity,
+        'density_level': density_level_for(count, capacity),
+        'occupancy_percentage': round(count / capacity * 100, 1) if capacity else 0,
+        'last_updated': updated.isoformat() if updated else None,
+    }
+
+
+class GroupTree:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._parents = {}          # group id -> parent id
+        self._meta = {}             # group id -> (name, kind, capacity)
+        self._location_group = {}   # active location id -> group id
+
+    def _current(self):
+        from .live import live_state
+
+        version = live_state.cache.get(VERSION_KEY, 0)
+        if version != self._version:
+            with self._lock:
+                self._load(version)
+
+    def _load(self, version):
+        from .models import Location, LocationGroup
+
+        rows = list(LocationGroup.objects.values_list('id', 'parent_id', 'name', 'kind', 'capacity_limit'))
+        self._parents = {r[0]: r[1] for r in rows}
+        self._meta = {r[0]: r[2:] for r in rows}
+        self._location_group = dict(
+            Location.objects.filter(is_active=True, group__isnull=False).values_list('id', 'group_id')
+        )
+        self._version = version
+
+    def invalidate(self):
+        """Make every process reload the tree; call after structural changes commit."""
+        from .live import live_state
+
+        try:
+            live_state.cache.incr(VERSION_KEY)
+        except ValueError:
+            live_state.cache.add(VERSION_KEY, 1, timeout=None)
+        self._version = None
+
+    def ancestors(self, group_id):
+        self._current()
+        return _chain(self._parents, group_id)
+
+    # ── Count deltas ──────────────────────────────────────────────────────
+    def add_count(self, location_id, delta):
+        """Apply a location's count change to its group and every ancestor."""
+        if not delta:
+            return
+        self._current()
+        group_id = self._location_group.get(location_id)
+        if group_id is not None:
+            self._add_counts({g: delta for g in _chain(self._parents, group_id)})
+
+    def _add_counts(self, deltas):
+        from .live import live_state
+
+        for group_id, delta in deltas.items():
+            if not delta:
+                continue
+            count, updated = live_state.add_to_group(group_id, delta)
+            meta = self._meta.get(group_id)
+            if meta is not None:
+                name, kind, capacity = meta
+                _broadcast_group(group_payload(group_id, name, kind, max(count, 0), capacity, updated))
+
+    # ── Structural changes ────────────────────────────────────────────────
+    def move(self, count, capacity_from, chain_from, capacity_to, chain_to):
+        """
+        Move a contribution of `count` people from one chain of groups to
+        another, with capacity `capacity_from` leaving and `capacity_to` arriving.
+        """
+        counts = defaultdict(int)
+        capacities = defaultdict(int)
+        for group_id in chain_from:
+            counts[group_id] -= count
+            capacities[group_id] -= capacity_from
+        for group_id in chain_to:
+            counts[group_id] += count
+            capacities[group_id] += capacity_to
+
+        from .models import LocationGroup
+        for group_id, delta in capacities.items():
+            if delta:
+                LocationGroup.objects.filter(pk=group_id).update(capacity_limit=F('capacity_limit') + delta)
+
+        def apply():
+            self.invalidate()
+            self._current()
+            self._add_counts(counts)
+
+        transaction.on_commit(apply)
+
+
+group_tree = GroupTree()
+
+
+def _broadcast_group(data):
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        f"crowd_group_{data['group_id']}", {'type': 'group_update', 'data': data},
+    )
+
+
+# ---------------------------------------------------------------------------
+# Signal handlers
+# ---------------------------------------------------------------------------
+
+def _stored_location(instance):
+    """(group id or None, capacity) the row contributes, locked until the transaction ends."""
+    from .models import Location
+
+    row = None
+    if instance.pk is not None:
+        row = (
+            Location.objects.select_for_update().filter(pk=instance.pk)
+            .values_list('group_id', 'is_active', 'capacity_limit').first()
+        )
+    if row is None or row[0] is None or not row[1]:
+        return None, 0
+    return row[0], row[2] or 0
+
+
+def _live_count(instance):
+    from .live import live_state
+
+    entry = live_state.fresh({instance.id: instance.__dict__.get('last_updated')}).get(instance.id)
+    return entry[0] if entry else instance.__dict__.get('current_count') or 0
+
+
+def _structural(update_fields):
+    return not update_fields or bool(STRUCTURAL_FIELDS & set(update_fields))
+
+
+# Old state is re-read under a row lock in pre_save / pre_delete rather than
+# remembered from when the instance was loaded: two stale copies saving the same
+# move then serialise, and the second sees the first's result.
+
+def location_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and _structural(update_fields):
+        instance._grouped = _stored_location(instance)
+
+
+def location_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _structural(update_fields):
+        return
+    old = instance.__dict__.pop('_grouped', (None, 0))
+    new = _stored_location(instance)
+    if old == new:
+        return
+    group_tree.move(
+        _live_count(instance),
+        old[1], group_tree.ancestors(old[0]),
+        new[1], group_tree.ancestors(new[0]),
+    )
+
+
+def location_deleting(sender, instance, **kwargs):
+    instance._grouped = _stored_location(instance)
+
+
+def location_deleted(sender, instance, **kwargs):
+    group_id, capacity = instance.__dict__.pop('_grouped', (None, 0))
+    if group_id is not None:
+        group_tree.move(_live_count(instance), capacity, group_tree.ancestors(group_id), 0, [])
+
+
+def _stored_group(instance):
+    """(parent id, count, capacity, density) of the stored group row, locked until the transaction ends."""
+    from .models import LocationGroup
+
+    if instance.pk is None:
+        return None
+    return (
+        LocationGroup.objects.select_for_update().filter(pk=instance.pk)
+        .values_list('parent_id', 'current_count', 'capacity_limit', 'density_level').first()
+    )
+
+
+def _stored_parent(instance):
+    """(exists, parent id) of the stored group row, locked until the transaction ends."""
+    row = _stored_group(instance)
+    return row is not None, row[0] if row else None
+
+
+def group_saving(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    row = _stored_group(instance)
+    instance._tree_parent = (row is not None, row[0] if row else None)
+    if row is not None:
+        # Aggregates only move through deltas; never write back the ones this instance was loaded with.
+        instance.current_count, instance.capacity_limit, instance.density_level = row[1:]
+
+
+def _group_totals(instance):
+    from .live import live_state
+    from .models import LocationGroup
+
+    capacity, count, updated = (
+        LocationGroup.objects.values_list('capacity_limit', 'current_count', 'last_updated').get(pk=instance.pk)
+    )
+    return live_state.group_counts({instance.pk: (count, updated)})[instance.pk][0], capacity
+
+
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    existed, old_parent = instance.__dict__.pop('_tree_parent', (False, None))
+    new_parent = _stored_parent(instance)[1]
+    if not existed or old_parent == new_parent:
+        # New groups are empty; renames only change broadcast metadata.
+        transaction.on_commit(group_tree.invalidate)
+        return
+    count, capacity = _group_totals(instance)
+    group_tree.move(
+        count,
+        capacity, group_tree.ancestors(old_parent),
+        capacity, group_tree.ancestors(new_parent),
+    )
+
+
+def group_deleting(sender, instance, **kwargs):
+    # Child groups and locations are detached (SET_NULL) and keep their own totals.
+    existed, parent = _stored_parent(instance)
+    if existed:
+        count, capacity = _group_totals(instance)
+        group_tree.move(count, capacity, group_tree.ancestors(parent), 0, [])
+
+
+# ---------------------------------------------------------------------------
+# Bootstrap / repair
+# ---------------------------------------------------------------------------
+
+@transaction.atomic
+def rebuild():
+    """Recompute every group's count and capacity from its active locations."""
+    from .live import live_state
+    from .models import Location, LocationGroup, density_level_for
+
+    parents = dict(LocationGroup.objects.values_list('id', 'parent_id'))
+    counts = dict.fromkeys(parents, 0)
+    capacities = dict.fromkeys(parents, 0)
+    locations = live_state.apply(
+        Location.objects.filter(is_active=True, group__isnull=False)
+        .only('id', 'group', 'capacity_limit', 'current_count', 'density_level', 'last_updated')
+    )
+    for location in locations:
+        for group_id in _chain(parents, location.group_id):
+            counts[group_id] += location.current_count
+            capacities[group_id] += location.capacity_limit
+
+    LocationGroup.objects.bulk_update([
+        LocationGroup(
+            id=group_id, current_count=counts[group_id], capacity_limit=capacities[group_id],
+            density_level=density_level_for(counts[group_id], capacities[group_id]),
+        )
+        for group_id in parents
+    ], ['current_count', 'capacity_limit', 'density_level'], batch_size=500)
+
+    def publish():
+        for group_id, count in counts.items():
+            live_state.set_group(group_id, count)
+        group_tree.invalidate()
+
+    transaction.on_commit(publish)
+    return len(parents)
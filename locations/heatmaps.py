@@ -0,0 +1,365 @@
+"""
+Time-of-week occupancy heatmaps.
+
+Each location keeps an OccupancyProfile: for every slot of the week (7 x 24
+hourly slots by default, finer with HEATMAP_SLOT_MINUTES) the number of
+readings, their sum and their sum of squares of occupancy %. Typical
+occupancy (mean) and its spread (std) per slot follow directly, so serving a
+heatmap never scans CrowdLog.
+
+  * `record()` (post_save on CrowdLog) only marks the location once its
+    transaction commits; a background thread folds new CrowdLog rows of marked
+    locations into their profiles every HEATMAP_FLUSH_SECONDS with one locked
+    read and one bulk UPDATE (and again at exit), so the CrowdLog write path
+    never touches OccupancyProfile rows;
+  * `rebuild()` recomputes profiles from exported CrowdLog columns with
+    np.bincount, in chunks, for the whole fleet in one pass;
+  * `fleet()` stacks the profiles into (locations, slots) arrays and scores
+    every location's current occupancy against its usual level for the
+    current slot at once.
+
+Readings are read back from CrowdLog rather than trusted from memory, since
+several processes write CrowdLog rows for the same location and transactions
+can commit out of id order. Each profile keeps a watermark (every id at or
+below it is folded in) and the ids above it that are, with the time each was
+first folded. The watermark only moves past ids folded more than
+HEATMAP_SETTLE_SECONDS ago, so a row whose transaction commits after a higher
+id was folded is still picked up, and every reading is counted once whether
+it arrives through a flush or a rebuild.
+Slots use local wall-clock time, Monday 00:00 = slot 0.
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_WEEK = 7 * 1440
+
+
+def slot_minutes():
+    minutes = getattr(settings, 'HEATMAP_SLOT_MINUTES', 60)
+    return minutes if minutes > 0 and 1440 % minutes == 0 else 60
+
+
+def _local(ts):
+    return timezone.localtime(ts).replace(tzinfo=None) if timezone.is_aware(ts) else ts
+
+
+def slot_of(ts, minutes):
+    ts = _local(ts)
+    return (ts.weekday() * 1440 + ts.hour * 60 + ts.minute) // minutes
+
+
+def slots_of(timestamps, minutes):
+    """Vectorised slot_of for a sequence of datetimes."""
+    t = np.array([_local(ts) for ts in timestamps], dtype='datetime64[m]').astype(np.int64)
+    # The Unix epoch fell on a Thursday: minute 3 * 1440 of a Monday-based week.
+    return ((t + 3 * 1440) % MINUTES_PER_WEEK) // minutes
+
+
+def _load(profile):
+    return np.frombuffer(bytes(profile.data), dtype=np.float64).reshape(3, -1).copy()
+
+
+# ── Incremental maintenance ───────────────────────────────────────────────
+
+def _accumulate(acc, ids, bins, minutes, location_ids, timestamps, values):
+    """Add readings to a (3, len(ids) * bins) accumulator; `ids` sorted. Other locations are skipped."""
+    location_ids = np.asarray(location_ids)
+    keep = np.isin(location_ids, ids)
+    if not keep.all():
+        location_ids, values = location_ids[keep], values[keep]
+        timestamps = [ts for ts, k in zip(timestamps, keep) if k]
+    flat = np.searchsorted(ids, location_ids) * bins + slots_of(timestamps, minutes)
+    size = len(ids) * bins
+    acc[0] += np.bincount(flat, minlength=size)
+    acc[1] += np.bincount(flat, weights=values, minlength=size)
+    acc[2] += np.bincount(flat, weights=values * values, minlength=size)
+
+
+def _settle(profile, seen, now, settle_seconds):
+    """Advance the profile's watermark past ids folded more than `settle_seconds` ago."""
+    settled = [i for i, at in seen.items() if now - at >= settle_seconds]
+    if settled:
+        profile.last_log_id = max(profile.last_log_id, max(settled))
+        seen = {i: at for i, at in seen.items() if i > profile.last_log_id}
+    profile.recent_log_ids = {str(i): at for i, at in seen.items()}
+    return seen
+
+
+class ProfileBuffer:
+    def __init__(self, flush_seconds=10, settle_seconds=300):
+        self.flush_seconds = flush_seconds
+        self.settle_seconds = settle_seconds
+        self._dirty = set()                 # ids of locations with new CrowdLog rows
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+
+    def add(self, location_id):
+        with self._lock:
+            self._dirty.add(location_id)
+            if self.flush_seconds and self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name='heatmap-flush', daemon=True)
+                self._flusher.start()
+        if not self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Fold new CrowdLog rows of marked locations into their profiles. Returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            if not dirty:
+                return 0
+            try:
+                written, unsettled = self._write(dirty)
+            except Exception:
+                with self._lock:
+                    self._dirty |= dirty
+                raise
+            with self._lock:
+                # Revisit until their ids settle, so the watermark catches up.
+                self._dirty |= unsettled
+        logger.debug(f"Folded readings into {written} occupancy profile(s)")
+        return written
+
+    def _write(self, dirty):
+        from .models import CrowdLog, Location, OccupancyProfile
+
+        minutes = slot_minutes()
+        bins = MINUTES_PER_WEEK // minutes
+        now = time.time()
+        unsettled = set()
+
+        with transaction.atomic():
+            existing = set(Location.objects.filter(id__in=dirty).values_list('id', flat=True))
+            # A new profile starts empty and folds in the location's whole history.
+            OccupancyProfile.objects.bulk_create([
+                OccupancyProfile(location_id=i, slot_minutes=minutes, data=np.zeros((3, bins)).tobytes())
+                for i in existing
+            ], ignore_conflicts=True)
+            # Row locks serialise with other processes' flushes and with rebuild().
+            profiles = list(OccupancyProfile.objects.select_for_update().filter(location_id__in=existing))
+            if not profiles:
+                return 0, unsettled
+            rows = {}
+            for log_id, location_id, ts, value in (
+                CrowdLog.objects
+                .filter(location_id__in=[p.location_id for p in profiles],
+                        id__gt=min(p.last_log_id for p in profiles))
+                .values_list('id', 'location_id', 'timestamp', 'occupancy_percentage')
+            ):
+                rows.setdefault(location_id, []).append((log_id, ts, value))
+
+            for profile in profiles:
+                seen = {int(i): at for i, at in profile.recent_log_ids.items()}
+                readings = [
+                    r for r in rows.get(profile.location_id, ())
+                    if r[0] > profile.last_log_id and r[0] not in seen
+                ]
+                if readings and profile.slot_minutes != minutes:
+                    logger.warning(
+                        f"Skipped {len(readings)} heatmap reading(s) for location {profile.location_id}: "
+                        f"profile uses {profile.slot_minutes} min slots, HEATMAP_SLOT_MINUTES is {minutes}. "
+                        f"Run `manage.py rebuild_heatmaps`."
+                    )
+                    readings = []
+                if readings:
+                    acc = _load(profile)
+                    slots = slots_of([r[1] for r in readings], minutes)
+                    values = np.array([r[2] for r in readings], dtype=float)
+                    acc[0] += np.bincount(slots, minlength=bins)
+                    acc[1] += np.bincount(slots, weights=values, minlength=bins)
+                    acc[2] += np.bincount(slots, weights=values * values, minlength=bins)
+                    profile.data = acc.tobytes()
+                    seen.update((r[0], now) for r in readings)
+                if _settle(profile, seen, now, self.settle_seconds):
+                    unsettled.add(profile.location_id)
+                profile.updated_at = timezone.now()
+            OccupancyProfile.objects.bulk_update(
+                profiles, ['data', 'last_log_id', 'recent_log_ids', 'updated_at'], batch_size=500,
+            )
+        return len(profiles), unsettled
+
+    def _run(self):
+        from django.db import close_old_connections
+
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Heatmap flush failed: {e}")
+            finally:
+                close_old_connections()
+            with self._lock:
+                if not self._dirty:
+                    self._flusher = None
+                    return
+
+
+profile_buffer = ProfileBuffer(
+    flush_seconds=getattr(settings, 'HEATMAP_FLUSH_SECONDS', 10),
+    settle_seconds=getattr(settings, 'HEATMAP_SETTLE_SECONDS', 300),
+)
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        profile_buffer.flush()
+    except Exception as e:
+        logger.warning(f"Heatmap flush at exit failed: {e}")
+
+
+def record(sender=None, instance=None, created=False, raw=False, **kwargs):
+    """post_save handler for CrowdLog: mark the location for the next flush."""
+    if not created or raw:
+        return
+    location_id = instance.location_id
+    transaction.on_commit(lambda: profile_buffer.add(location_id))
+
+
+def rebuild(location_ids=None, days=None, chunk_size=100_000):
+    """Recompute profiles from CrowdLog. Returns the number of profiles written."""
+    from datetime import timedelta
+    from .models import CrowdLog, Location, OccupancyProfile
+
+    minutes = slot_minutes()
+    bins = MINUTES_PER_WEEK // minutes
+
+    locations = Location.objects.all()
+    logs = CrowdLog.objects.all()
+    if location_ids is not None:
+        locations = locations.filter(id__in=location_ids)
+        logs = logs.filter(location_id__in=location_ids)
+    if days:
+        logs = logs.filter(timestamp__gte=timezone.now() - timedelta(days=days))
+    ids = np.array(sorted(locations.values_list('id', flat=True)), dtype=np.int64)
+    if not len(ids):
+        return 0
+
+    # Ids of readings older than the settle window become each profile's
+    # watermark; newer ones are kept individually, as a flush would.
+    now = time.time()
+    cutoff = timezone.now() - timedelta(seconds=profile_buffer.settle_seconds)
+    watermark, fresh = {}, {}
+
+    def fold(chunk):
+        _accumulate(
+            acc, ids, bins, minutes,
+            np.fromiter((r[1] for r in chunk), dtype=np.int64, count=len(chunk)),
+            [r[2] for r in chunk],
+            np.fromiter((r[3] for r in chunk), dtype=float, count=len(chunk)),
+        )
+        for log_id, location_id, ts, _ in chunk:
+            if ts <= cutoff:
+                watermark[location_id] = max(log_id, watermark.get(location_id, 0))
+            else:
+                fresh.setdefault(location_id, []).append(log_id)
+
+    # Scan up to a high-water mark without locks; readings past it are replayed below.
+    high = CrowdLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    acc = np.zeros((3, len(ids) * bins))
+    rows = (
+        logs.filter(id__lte=high)
+        .values_list('id', 'location_id', 'timestamp', 'occupancy_percentage').iterator(chunk_size=10_000)
+    )
+    while True:
+        chunk = [r for _, r in zip(range(chunk_size), rows)]
+        if not chunk:
+            break
+        fold(chunk)
+
+    with transaction.atomic():
+        # Lock out concurrent flushes, then fold in what was written during the scan.
+        list(OccupancyProfile.objects.select_for_update().filter(location_id__in=ids.tolist()).values_list('id'))
+        late = list(logs.filter(id__gt=high).values_list('id', 'location_id', 'timestamp', 'occupancy_percentage'))
+        if late:
+            fold(late)
+
+        acc = acc.reshape(3, len(ids), bins)
+        OccupancyProfile.objects.filter(location_id__in=ids.tolist()).delete()
+        OccupancyProfile.objects.bulk_create([
+            OccupancyProfile(
+                location_id=int(location_id),
+                slot_minutes=minutes,
+                data=np.ascontiguousarray(acc[:, i, :]).tobytes(),
+                last_log_id=watermark.get(int(location_id), 0),
+                recent_log_ids={
+                    str(log_id): now for log_id in fresh.get(int(location_id), ())
+                    if log_id > watermark.get(int(location_id), 0)
+                },
+            )
+            for i, location_id in enumerate(ids)
+        ], batch_size=500)
+    return len(ids)
+
+
+# ── Queries ───────────────────────────────────────────────────────────────
+
+def fleet(location_ids=None, now=None):
+    """
+    Heatmaps and "busier than usual" scores for the given locations, or
+    every active one.
+
+    Returns a dict of parallel arrays over locations: ids, names, samples /
+    mean / std of shape (locations, slots), and current, usual, ratio and
+    zscore for the current slot (NaN where there is no history).
+    """
+    from .live import live_state
+    from .models import Location, OccupancyProfile
+
+    minutes = slot_minutes()
+    bins = MINUTES_PER_WEEK // minutes
+    current_slot = slot_of(now or timezone.now(), minutes)
+
+    if location_ids is None:
+        qs = Location.objects.filter(is_active=True)
+    else:
+        qs = Location.objects.filter(id__in=location_ids)
+    rows = list(qs.values_list('id', 'name', 'current_count', 'capacity_limit', 'last_updated'))
+    live = live_state.fresh({r[0]: r[4] for r in rows})
+    rows = [(i, name, live[i][0] if i in live else count, cap) for i, name, count, cap, _ in rows]
+    ids = [r[0] for r in rows]
+    row_of = {location_id: i for i, location_id in enumerate(ids)}
+
+    acc = np.zeros((3, len(ids), bins))
+    for profile in OccupancyProfile.objects.filter(location_id__in=ids, slot_minutes=minutes):
+        acc[:, row_of[profile.location_id], :] = _load(profile)
+
+    n, total, sq = acc
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n > 0, total / n, np.nan)
+        std = np.sqrt(np.clip(sq / n - mean ** 2, 0, None))
+
+        capacity = np.array([r[3] for r in rows], dtype=float)
+        current = np.where(capacity > 0, np.array([r[2] for r in rows], dtype=float) / capacity * 100, 0.0)
+        usual = mean[:, current_slot] if len(ids) else np.zeros(0)
+        spread = std[:, current_slot] if len(ids) else np.zeros(0)
+        ratio = np.where(usual > 0, current / usual, np.nan)
+        # Floor the spread at one percentage point so near-constant slots don't explode.
+        zscore = (current - usual) / np.maximum(np.nan_to_num(spread), 1.0)
+
+    return {
+        'slot_minutes': minutes,
+        'current_slot': current_slot,
+        'ids': ids,
+        'names': [r[1] for r in rows],
+        'samples': n,
+        'mean': mean,
+        'std': std,
+        'current': current,
+        'usual': usual,
+        'ratio': ratio,
+        'zscore': zscore,
+    }
@@ -0,0 +1,386 @@
+"""
+Hot current-state store for Location counts.
+
+Every reading used to UPDATE its location row while API reads, consumer
+connects and dashboard renders read the same rows, so on SQLite the detection
+writer and the readers queued on the database lock. The current count,
+density and last-updated time now live in a Django cache (LIVE_STATE_CACHE:
+the per-process LocMemCache by default, Redis when REDIS_URL is set so web
+and detection processes share one view):
+
+  * `update()` (Location.update_count) writes the cache entry and marks the
+    location dirty;
+  * a background thread flushes dirty counts to the Location table every
+    LIVE_STATE_FLUSH_SECONDS with one bulk UPDATE, and again at exit, so a
+    restart loses at most one interval of readings;
+  * a density change is written through at once with a normal save(), which
+    keeps dashboard counters and other post_save listeners exact; changes of
+    level are rare next to changes of count;
+  * readers overlay entries onto rows with `apply()` / `fresh()`, and only
+    where the entry is newer than the row: a location without one is already
+    current in the database. With an unshared (per-process LocMem) cache,
+    entries also expire two flush intervals after they are written, since by
+    then this process's own writes are in the table;
+  * a full save() of a Location (admin, API edits) carries the live count
+    and density instead of the possibly stale ones the instance was loaded
+    with (`carry()`), and a capacity change re-derives the entry's density
+    (`refresh()`).
+
+`update()` reads the previous count and writes the new one under a short
+cache lock, so concurrent writers of one location never report the same
+previous count twice and group deltas stay exact. Without a shared cache
+that lock and the entries are per process, so locations in a group are
+written through under a row lock instead, and the delta is taken from the row.
+
+LocationGroup counts (groups.py) move by deltas: each process keeps its
+unflushed deltas and flushes them as `current_count + delta` UPDATEs in the
+same transaction, so processes never overwrite each other's totals. Live
+group counts come from atomic cache increments when the cache is shared;
+with a per-process cache they are the row plus this process's pending delta.
+
+LIVE_STATE_FLUSH_SECONDS = 0 writes every update through, as before.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class LiveState:
+    def __init__(self, alias='default', flush_seconds=5):
+        self.alias = alias
+        self.flush_seconds = flush_seconds
+        self._dirty = {}                    # location id -> (count, last_updated)
+        self._group_deltas = defaultdict(int)   # group id -> unflushed count delta
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    @property
+    def shared(self):
+        """Whether every process sees the same cache (anything but LocMemCache)."""
+        from django.core.cache.backends.locmem import LocMemCache
+        return not isinstance(self.cache, LocMemCache)
+
+    @property
+    def timeout(self):
+        return None if self.shared else max(2 * self.flush_seconds, 1)
+
+    @staticmethod
+    def key(location_id):
+        return f'live:location:{location_id}'
+
+    @staticmethod
+    def group_key(group_id):
+        return f'live:group:{group_id}'
+
+    # ── Writes ────────────────────────────────────────────────────────────
+    def update(self, location, count):
+        """
+        Set a location's current count; mutates `location` like a save would.
+        Returns the previous count.
+        """
+        count = max(0, count)
+        density = location.density_for(count)
+        if location.__dict__.get('group_id') is not None and not self.shared:
+            return self._update_row(location, count, density)
+        with self._locked(location.id):
+            entry = self.cache.get(self.key(location.id))
+            previous_count, previous = entry[:2] if entry else (location.current_count, location.density_level)
+
+            location.current_count = count
+            location.density_level = density
+            location.last_updated = timezone.now()
+
+            if not self.flush_seconds or density != previous:
+                with self._flush_lock:
+                    with self._lock:
+                        self._dirty.pop(location.id, None)
+                    location.save(update_fields=['current_count', 'density_level', 'last_updated'])
+            else:
+                with self._lock:
+                    self._dirty[location.id] = (count, location.last_updated)
+                    self._start_flusher()
+            self.cache.set(self.key(location.id), (count, density, location.last_updated), timeout=self.timeout)
+        return previous_count
+
+    def _update_row(self, location, count, density):
+        """
+        Write-through under a row lock. Group deltas need the true previous
+        count, and with per-process caches only the row is shared: a count
+        another process has cached but not flushed would skew the delta.
+        """
+        from django.db import transaction
+        from .models import Location
+
+        with self._flush_lock, transaction.atomic():
+            previous_count = (
+                Location.objects.select_for_update().values_list('current_count', flat=True).get(pk=location.pk)
+            )
+            location.current_count = count
+            location.density_level = density
+            location.last_updated = timezone.now()
+            with self._lock:
+                self._dirty.pop(location.id, None)
+            location.save(update_fields=['current_count', 'density_level', 'last_updated'])
+        self.cache.set(self.key(location.id), (count, density, location.last_updated), timeout=self.timeout)
+        return previous_count
+
+    @contextmanager
+    def _locked(self, location_id, wait=5.0):
+        """Cache lock around one location's read-modify-write (across processes with a shared cache)."""
+        key = f'{self.key(location_id)}:lock'
+        deadline = time.monotonic() + wait
+        acquired = self.cache.add(key, 1, timeout=int(wait) + 1)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(0.002)
+            acquired = self.cache.add(key, 1, timeout=int(wait) + 1)
+        if not acquired:
+            logger.warning(f"Live state lock for location {location_id} timed out; updating unlocked")
+        try:
+            yield
+        finally:
+            if acquired:
+                self.cache.delete(key)
+
+    def add_to_group(self, group_id, delta):
+        """Add `delta` people to a group's count; returns the live (count, last_updated)."""
+        with self._lock:
+            self._group_deltas[group_id] += delta
+            if self.flush_seconds:
+                self._start_flusher()
+        key = self.group_key(group_id)
+        try:
+            count = self.cache.incr(key, delta)
+        except ValueError:
+            # Seed from the row plus what this process has not flushed yet (which includes `delta`).
+            count = self._group_seed(group_id)
+            if not self.cache.add(key, count, timeout=self.timeout):
+                count = self.cache.incr(key, delta)
+        updated = timezone.now()
+        self.cache.set(f'{key}:at', updated, timeout=self.timeout)
+        if not self.flush_seconds:
+            self.flush()
+        return count, updated
+
+    def _group_seed(self, group_id):
+        from .models import LocationGroup
+
+        count = LocationGroup.objects.filter(pk=group_id).values_list('current_count', flat=True).first()
+        with self._lock:
+            return (count or 0) + self._group_deltas.get(group_id, 0)
+
+    def set_group(self, group_id, count):
+        """Overwrite a group's live count (rebuilds); pending deltas are already reflected in it."""
+        with self._lock:
+            self._group_deltas.pop(group_id, None)
+        self.cache.set(self.group_key(group_id), count, timeout=self.timeout)
+        self.cache.set(f'{self.group_key(group_id)}:at', timezone.now(), timeout=self.timeout)
+
+    def _start_flusher(self):
+        # Caller holds self._lock.
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._run, name='live-state-flush', daemon=True)
+            self._flusher.start()
+
+    def carry(self, sender=None, instance=None, raw=False, update_fields=None, **kwargs):
+        """pre_save handler: keep the live count when a full save would write back a stale one."""
+        # Counts are read-only outside update_count(), which saves with update_fields.
+        if raw or instance.pk is None or update_fields is not None:
+            return
+        entry = self.cache.get(self.key(instance.pk))
+        loaded = instance.__dict__.get('last_updated')
+        if entry and (loaded is None or entry[2] > loaded):
+            instance.current_count, instance.density_level = entry[:2]
+
+    def refresh(self, sender=None, instance=None, created=False, raw=False, update_fields=None, **kwargs):
+        """post_save handler: re-derive density after a capacity change."""
+        if created or raw or (update_fields and 'capacity_limit' not in update_fields):
+            return
+        entry = self.cache.get(self.key(instance.id))
+        count = entry[0] if entry else instance.current_count
+        density = instance.density_for(count)
+        if entry and entry[1] != density:
+            self.cache.set(self.key(instance.id), (count, density, entry[2]), timeout=self.timeout)
+        if instance.density_level != density:
+            # Write through like any density change, so counters and alerts see it;
+            # after commit, so the save in progress finishes its own signal handlers first.
+            from django.db import transaction
+
+            def write():
+                instance.density_level = density
+                instance.save(update_fields=['density_level'])
+            transaction.on_commit(write)
+
+    def forget(self, sender=None, instance=None, **kwargs):
+        """post_delete handler: drop the entry and any pending flush."""
+        with self._lock:
+            self._dirty.pop(instance.id, None)
+        self.cache.delete(self.key(instance.id))
+
+    def forget_group(self, sender=None, instance=None, **kwargs):
+        with self._lock:
+            self._group_deltas.pop(instance.id, None)
+        self.cache.delete_many([self.group_key(instance.id), f'{self.group_key(instance.id)}:at'])
+
+    def flush(self):
+        """Write pending counts to the Location and LocationGroup tables. Returns the number of rows."""
+        from django.db import transaction
+        from django.db.models import F
+        from .models import Location, LocationGroup, density_level_for
+
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+                deltas, self._group_deltas = self._group_deltas, defaultdict(int)
+            deltas = {group_id: delta for group_id, delta in deltas.items() if delta}
+            if not dirty and not deltas:
+                return 0
+            # With a shared cache another process may hold a newer reading.
+            latest = self.snapshot(dirty)
+            rows = []
+            for location_id, (count, updated) in dirty.items():
+                entry = latest.get(location_id)
+                if entry and entry[2] > updated:
+                    count, updated = entry[0], entry[2]
+                rows.append(Location(id=location_id, current_count=count, last_updated=updated))
+
+            try:
+                with transaction.atomic():
+                    Location.objects.bulk_update(rows, ['current_count', 'last_updated'], batch_size=500)
+                    # Deltas, not totals: other processes flush their own changes to the same rows.
+                    now = timezone.now()
+                    for group_id, delta in deltas.items():
+                        LocationGroup.objects.filter(pk=group_id).update(
+                            current_count=F('current_count') + delta, last_updated=now,
+                        )
+                    groups = [
+                        LocationGroup(id=group_id, density_level=density_level_for(count, capacity))
+                        for group_id, count, capacity in LocationGroup.objects.filter(id__in=deltas)
+                        .values_list('id', 'current_count', 'capacity_limit')
+                    ]
+                    LocationGroup.objects.bulk_update(groups, ['density_level'], batch_size=500)
+            except Exception:
+                with self._lock:
+                    for row in rows:
+                        self._dirty.setdefault(row.id, (row.current_count, row.last_updated))
+                    for group_id, delta in deltas.items():
+                        self._group_deltas[group_id] += delta
+                raise
+        logger.debug(f"Flushed live state for {len(rows)} location(s) and {len(deltas)} group(s)")
+        return len(rows) + len(deltas)
+
+    def _run(self):
+        from django.db import close_old_connections
+
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Live state flush failed: {e}")
+            finally:
+                close_old_connections()
+            with self._lock:
+                if not self._dirty and not self._group_deltas:
+                    self._flusher = None
+                    return
+
+    # ── Reads ─────────────────────────────────────────────────────────────
+    def snapshot(self, location_ids):
+        """{location_id: (count, density, last_updated)} for ids with a live entry."""
+        location_ids = list(location_ids)
+        if not location_ids:
+            return {}
+        entries = self.cache.get_many([self.key(i) for i in location_ids])
+        return {i: entries[self.key(i)] for i in location_ids if self.key(i) in entries}
+
+    def fresh(self, last_updated):
+        """
+        `last_updated`: {location_id: the row's last_updated}. Returns snapshot()
+        entries that are newer than their row.
+        """
+        live = self.snapshot(last_updated)
+        return {
+            i: entry for i, entry in live.items()
+            if last_updated[i] is None or entry[2] > last_updated[i]
+        }
+
+    def group_snapshot(self, group_ids):
+        """{group_id: (count, last_updated)} for ids with a live entry."""
+        group_ids = list(group_ids)
+        if not group_ids:
+            return {}
+        keys = [self.group_key(i) for i in group_ids]
+        entries = self.cache.get_many(keys + [f'{k}:at' for k in keys])
+        return {
+            i: (entries[k], entries.get(f'{k}:at'))
+            for i, k in zip(group_ids, keys) if k in entries
+        }
+
+    def group_counts(self, rows):
+        """
+        `rows`: {group_id: (row current_count, row last_updated)}. Returns the
+        live {group_id: (count, last_updated)}: the shared cache counter where
+        there is one, otherwise the row plus this process's unflushed delta
+        (a per-process counter would miss other processes' changes).
+        """
+        if self.shared:
+            live = self.group_snapshot(rows)
+            return {
+                i: (live[i][0], live[i][1] or row[1]) if i in live else row
+                for i, row in rows.items()
+            }
+        with self._lock:
+            pending = {i: self._group_deltas.get(i, 0) for i in rows}
+        return {i: (count + pending[i], updated) for i, (count, updated) in rows.items()}
+
+    def apply_groups(self, groups):
+        """Overlay live counts onto LocationGroup instances in place; returns them as a list."""
+        from .models import density_level_for
+
+        groups = list(groups)
+        live = self.group_counts({g.id: (g.current_count, g.last_updated) for g in groups})
+        for group in groups:
+            count, updated = live[group.id]
+            if (count, updated) != (group.current_count, group.last_updated):
+                group.current_count = max(count, 0)
+                group.last_updated = updated
+                group.density_level = density_level_for(group.current_count, group.capacity_limit)
+        return groups
+
+    def apply(self, locations):
+        """Overlay live state onto Location instances in place; returns them as a list."""
+        locations = list(locations)
+        live = self.fresh({l.id: l.__dict__.get('last_updated') for l in locations})
+        for location in locations:
+            if location.id in live:
+                location.current_count, location.density_level, location.last_updated = live[location.id]
+        return locations
+
+
+live_state = LiveState(
+    alias=getattr(settings, 'LIVE_STATE_CACHE', 'default'),
+    flush_seconds=getattr(settings, 'LIVE_STATE_FLUSH_SECONDS', 5),
+)
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        live_state.flush()
+    except Exception as e:
+        logger.warning(f"Live state flush at exit failed: {e}")
@@ -0,0 +1,178 @@
+"""
+Django management command to load-test WebSocket fan-out.
+
+Opens N in-process dashboard clients (CrowdConsumer / LocationCrowdConsumer),
+drives updates through `_broadcast_update` at a fixed rate, and reports
+delivery latency percentiles, throughput and memory per connection.
+
+Usage:
+    python manage.py loadtest_ws
+    python manage.py loadtest_ws --clients 500 --location-clients 200 --rate 50 --duration 20
+    python manage.py loadtest_ws --layer default   # use CHANNEL_LAYERS (e.g. Redis)
+"""
+
+import asyncio
+import json
+import time
+import tracemalloc
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Load-test WebSocket fan-out against the channel layer.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients', type=int, default=100,
+            help='Number of all-locations (CrowdConsumer) clients (default: 100)'
+        )
+        parser.add_argument(
+            '--location-clients', type=int, default=0,
+            help='Number of single-location (LocationCrowdConsumer) clients (default: 0)'
+        )
+        parser.add_argument(
+            '--locations', type=int, default=5,
+            help='Number of simulated location IDs to update (default: 5)'
+        )
+        parser.add_argument(
+            '--rate', type=float, default=10,
+            help='Updates per second sent through _broadcast_update (default: 10)'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Seconds to drive updates for (default: 10)'
+        )
+        parser.add_argument(
+            '--layer', default='memory', choices=['memory', 'default'],
+            help="'memory' forces an InMemoryChannelLayer; 'default' uses CHANNEL_LAYERS"
+        )
+
+    def handle(self, *args, **options):
+        if options['layer'] == 'memory':
+            from channels.layers import channel_layers, InMemoryChannelLayer
+            channel_layers.set('default', InMemoryChannelLayer(capacity=1000))
+
+        report = asyncio.run(self._run(options))
+        self._print_report(report)
+
+    async def _run(self, options):
+        from asgiref.sync import sync_to_async
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from crowd_monitor.routing import websocket_urlpatterns
+        from locations.models import Location
+        from locations.views import _broadcast_update
+
+        app = URLRouter(websocket_urlpatterns)
+        n_locations = max(1, options['locations'])
+
+        tracemalloc.start()
+        mem_before = tracemalloc.get_traced_memory()[0]
+
+        # ── Connect clients ───────────────────────────────────────────────
+        clients = []   # (communicator, location_id or None)
+        failed = 0
+        paths = [('/ws/crowd/', None)] * options['clients'] + [
+            (f'/ws/crowd/{i % n_locations + 1}/', i % n_locations + 1)
+            for i in range(options['location_clients'])
+        ]
+        for path, loc_id in paths:
+            comm = WebsocketCommunicator(app, path)
+            connected, _ = await comm.connect()
+            if not connected:
+                failed += 1
+                continue
+            if loc_id is None:
+                await comm.receive_from(timeout=10)   # initial_state
+            clients.append((comm, loc_id))
+
+        mem_after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        # ── Readers ───────────────────────────────────────────────────────
+        latencies = []
+
+        async def reader(comm):
+            # Read the output queue directly: receive_output() kills the
+            # consumer on timeout, which would tear down idle clients.
+            while True:
+                msg = await comm.output_queue.get()
+                if msg.get('type') != 'websocket.send':
+                    continue
+                data = json.loads(msg['text'])['data']
+                sent = datetime.fromisoformat(data['last_updated']).timestamp()
+                latencies.append(time.time() - sent)
+
+        readers = [asyncio.ensure_future(reader(comm)) for comm, _ in clients]
+
+        # ── Driver ────────────────────────────────────────────────────────
+        per_location = {i: 0 for i in range(1, n_locations + 1)}
+        for _, loc_id in clients:
+            if loc_id is not None:
+                per_location[loc_id] += 1
+        n_all = sum(1 for _, loc_id in clients if loc_id is None)
+
+        broadcast = sync_to_async(_broadcast_update)
+        period = 1.0 / options['rate'] if options['rate'] > 0 else 0
+        sent = 0
+        expected = 0
+        start = time.perf_counter()
+        next_tick = start
+        while time.perf_counter() - start < options['duration']:
+            loc_id = sent % n_locations + 1
+            location = Location(
+                id=loc_id, name=f'Loadtest {loc_id}', capacity_limit=100,
+                current_count=sent % 100, density_level=Location.DENSITY_LOW,
+            )
+            location.last_updated = datetime.now(dt_timezone.utc)
+            await broadcast(location)
+            sent += 1
+            expected += n_all + per_location[loc_id]
+
+            next_tick += period
+            await asyncio.sleep(max(0, next_tick - time.perf_counter()))
+        send_elapsed = time.perf_counter() - start
+
+        # Give in-flight messages a moment to drain
+        deadline = time.perf_counter() + 2
+        while len(latencies) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+
+        for task in readers:
+            task.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        for comm, _ in clients:
+            await comm.disconnect()
+
+        return {
+            'clients': len(clients),
+            'failed': failed,
+            'updates': sent,
+            'update_rate': sent / send_elapsed if send_elapsed else 0,
+            'expected': expected,
+            'delivered': len(latencies),
+            'elapsed': elapsed,
+            'latencies_ms': np.array(latencies) * 1000,
+            'mem_per_conn': (mem_after - mem_before) / len(clients) if clients else 0,
+        }
+
+    def _print_report(self, r):
+        lat = r['latencies_ms']
+        self.stdout.write(self.style.SUCCESS('WebSocket fan-out load test'))
+        self.stdout.write(f"  clients           {r['clients']} connected, {r['failed']} failed")
+        self.stdout.write(f"  updates           {r['updates']} ({r['update_rate']:.1f}/s)")
+        self.stdout.write(
+            f"  deliveries        {r['delivered']}/{r['expected']} "
+            f"({r['expected'] - r['delivered']} dropped)"
+        )
+        self.stdout.write(f"  throughput        {r['delivered'] / r['elapsed']:.0f} msg/s")
+        if len(lat):
+            p50, p90, p99 = np.percentile(lat, [50, 90, 99])
+            self.stdout.write(
+                f"  latency (ms)      p50={p50:.2f} p90={p90:.2f} p99={p99:.2f} max={lat.max():.2f}"
+            )
+        self.stdout.write(f"  memory/connection {r['mem_per_conn'] / 1024:.1f} KiB")
@@ -0,0 +1,21 @@
+"""
+Django management command to recompute location group aggregates.
+
+Run after loaddata or any bulk/raw edits to locations or groups that bypass
+model signals.
+
+Usage:
+    python manage.py rebuild_groups
+"""
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Recompute LocationGroup counts and capacities from their active locations.'
+
+    def handle(self, *args, **options):
+        from locations.groups import rebuild
+
+        rebuilt = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} group(s)."))
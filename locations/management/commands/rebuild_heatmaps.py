@@ -0,0 +1,34 @@
+"""
+Django management command to recompute hour-of-week occupancy heatmaps.
+
+Run after changing HEATMAP_SLOT_MINUTES, after loaddata, or after any bulk
+CrowdLog inserts that bypass model signals.
+
+Usage:
+    python manage.py rebuild_heatmaps
+    python manage.py rebuild_heatmaps --location 3 --days 90
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Recompute occupancy heatmap profiles from CrowdLog history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--location', type=int, action='append',
+                            help='Only this location id (repeatable; default: all)')
+        parser.add_argument('--days', type=int, default=None,
+                            help='Only use the last N days of history (default: all)')
+
+    def handle(self, *args, **options):
+        from locations.heatmaps import rebuild, slot_minutes
+
+        started = time.monotonic()
+        written = rebuild(location_ids=options['location'], days=options['days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} profile(s) at {slot_minutes()} min resolution "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,26 @@
+"""
+Django management command to refit the forecast model from CrowdLog history.
+
+run_detection already refits every FORECAST_REFIT_SECONDS; run this from cron
+instead when workers use --no-refit, or once after loading history.
+
+Usage:
+    python manage.py refit_forecasts
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Refit the short-term forecast model and store it for every process to load.'
+
+    def handle(self, *args, **options):
+        from locations.forecasting import forecaster
+
+        started = time.monotonic()
+        forecaster.refit()
+        self.stdout.write(self.style.SUCCESS(
+            f"Refit {len(forecaster.rows)} location(s) in {time.monotonic() - started:.1f}s."
+        ))
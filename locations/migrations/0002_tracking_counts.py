@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crowdlog',
+            name='entries',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='crowdlog',
+            name='exits',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='counting_line',
+            field=models.CharField(blank=True, help_text='Entry/exit line as normalized "x1,y1,x2,y2" (0-1). Crossing to the right-hand side of the line direction counts as an entry.', max_length=100),
+        ),
+    ]
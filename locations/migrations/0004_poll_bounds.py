@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0003_crowdlog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='poll_max_seconds',
+            field=models.PositiveIntegerField(blank=True, help_text='Longest detection interval for this camera (default: DETECTION_MAX_INTERVAL)', null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='poll_min_seconds',
+            field=models.PositiveIntegerField(blank=True, help_text='Shortest detection interval for this camera (default: DETECTION_MIN_INTERVAL)', null=True),
+        ),
+    ]
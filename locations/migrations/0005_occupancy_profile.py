@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0004_poll_bounds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancyProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_minutes', models.PositiveSmallIntegerField(default=60)),
+                ('data', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy_profile', to='locations.location')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0005_occupancy_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='roi',
+            field=models.CharField(blank=True, help_text='Region of interest as a normalized polygon "x1,y1,x2,y2,x3,y3,..." (0-1). Locations sharing a camera are counted from one inference, each within its own ROI.', max_length=1000),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0006_location_roi'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('kind', models.CharField(choices=[('SITE', 'Site'), ('BUILDING', 'Building'), ('FLOOR', 'Floor'), ('AREA', 'Area')], default='BUILDING', max_length=10)),
+                ('current_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('capacity_limit', models.PositiveIntegerField(default=0, editable=False)),
+                ('density_level', models.CharField(choices=[('LOW', 'Low'), ('MEDIUM', 'Medium'), ('HIGH', 'High')], default='LOW', editable=False, max_length=10)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='locations.locationgroup')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='locations', to='locations.locationgroup'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0007_location_groups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='occupancyprofile',
+            name='last_log_id',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
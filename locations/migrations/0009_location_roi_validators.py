@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:11
+
+from django.db import migrations, models
+import locations.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0008_occupancy_profile_last_log'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='location',
+            name='counting_line',
+            field=models.CharField(blank=True, help_text='Entry/exit line as normalized "x1,y1,x2,y2" (0-1). Crossing to the right-hand side of the line direction counts as an entry.', max_length=100, validators=[locations.models.validate_counting_line]),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='roi',
+            field=models.CharField(blank=True, help_text='Region of interest as a normalized polygon "x1,y1,x2,y2,x3,y3,..." (0-1). Locations sharing a camera are counted from one inference, each within its own ROI.', max_length=1000, validators=[locations.models.validate_roi]),
+        ),
+    ]
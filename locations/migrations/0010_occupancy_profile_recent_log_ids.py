@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0009_location_roi_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='occupancyprofile',
+            name='recent_log_ids',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
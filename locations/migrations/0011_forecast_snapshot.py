@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0010_occupancy_profile_recent_log_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField()),
+                ('synced_at', models.FloatField()),
+                ('fitted_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,5 +1,51 @@
-from django.db import models
+import math
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
+
+
+def density_level_for(count: int, capacity: int):
+    low_thresh = settings.CROWD_LOW_THRESHOLD
+    high_thresh = settings.CROWD_HIGH_THRESHOLD
+    pct = count / capacity if capacity else 0
+
+    if pct < low_thresh:
+        return Location.DENSITY_LOW
+    elif pct < high_thresh:
+        return Location.DENSITY_MEDIUM
+    else:
+        return Location.DENSITY_HIGH
+
+
+def _normalized_coordinates(value, field):
+    try:
+        parts = [float(p) for p in value.split(',')]
+    except ValueError:
+        raise ValidationError(f'{field} must be comma-separated numbers.')
+    if not all(math.isfinite(p) and 0 <= p <= 1 for p in parts):
+        raise ValidationError(f'{field} coordinates must be finite and between 0 and 1.')
+    return parts
+
+
+def validate_counting_line(value):
+    """'x1,y1,x2,y2' with every coordinate finite and in [0, 1]."""
+    parts = _normalized_coordinates(value, 'Counting line')
+    if len(parts) != 4:
+        raise ValidationError('Counting line must be "x1,y1,x2,y2".')
+
+
+def validate_roi(value):
+    """'x1,y1,x2,y2,x3,y3,...': at least 3 vertices in [0, 1] enclosing a non-zero area."""
+    parts = _normalized_coordinates(value, 'ROI')
+    if len(parts) < 6 or len(parts) % 2:
+        raise ValidationError('ROI must be a polygon of at least 3 "x,y" vertices.')
+    xs, ys = parts[0::2], parts[1::2]
+    # Shoelace formula.
+    area = sum(xs[i - 1] * ys[i] - xs[i] * ys[i - 1] for i in range(len(xs))) / 2
+    if not area:
+        raise ValidationError('ROI polygon must enclose a non-zero area.')
 
 
 class Location(models.Model):
@@ -23,10 +69,31 @@ class Location(models.Model):
         max_length=10, choices=DENSITY_CHOICES, default=DENSITY_LOW
     )
     is_active = models.BooleanField(default=True)
+    group = models.ForeignKey(
+        'LocationGroup', null=True, blank=True, on_delete=models.SET_NULL, related_name='locations'
+    )
     camera_url = models.CharField(
         max_length=500, blank=True,
         help_text='RTSP URL or webcam index (e.g., 0, 1, rtsp://...)'
     )
+    counting_line = models.CharField(
+        max_length=100, blank=True, validators=[validate_counting_line],
+        help_text='Entry/exit line as normalized "x1,y1,x2,y2" (0-1). '
+                  'Crossing to the right-hand side of the line direction counts as an entry.'
+    )
+    roi = models.CharField(
+        max_length=1000, blank=True, validators=[validate_roi],
+        help_text='Region of interest as a normalized polygon "x1,y1,x2,y2,x3,y3,..." (0-1). '
+                  'Locations sharing a camera are counted from one inference, each within its own ROI.'
+    )
+    poll_min_seconds = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text='Shortest detection interval for this camera (default: DETECTION_MIN_INTERVAL)'
+    )
+    poll_max_seconds = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text='Longest detection interval for this camera (default: DETECTION_MAX_INTERVAL)'
+    )
     last_updated = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -36,6 +103,11 @@ class Location(models.Model):
     def __str__(self):
         return f"{self.name} ({self.density_level})"
 
+    def save(self, *args, **kwargs):
+        # Atomic so post_save listeners (dashboard counters) commit with the row.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     @property
     def occupancy_percentage(self):
         if self.capacity_limit == 0:
@@ -43,21 +115,75 @@ class Location(models.Model):
         return round((self.current_count / self.capacity_limit) * 100, 1)
 
     def calculate_density(self):
-        low_thresh = settings.CROWD_LOW_THRESHOLD
-        high_thresh = settings.CROWD_HIGH_THRESHOLD
-        pct = self.current_count / self.capacity_limit if self.capacity_limit else 0
+        return self.density_for(self.current_count)
 
-        if pct < low_thresh:
-            return self.DENSITY_LOW
-        elif pct < high_thresh:
-            return self.DENSITY_MEDIUM
-        else:
-            return self.DENSITY_HIGH
+    def density_for(self, count: int):
+        return density_level_for(count, self.capacity_limit)
 
     def update_count(self, count: int):
-        self.current_count = max(0, count)
-        self.density_level = self.calculate_density()
-        self.save(update_fields=['current_count', 'density_level', 'last_updated'])
+        # Held in the live state store and flushed to this row in batches.
+        from .groups import group_tree
+        from .live import live_state
+
+        previous = live_state.update(self, count)
+        group_tree.add_count(self.id, self.current_count - previous)
+
+
+class LocationGroup(models.Model):
+    """
+    A node in the site hierarchy (building, floor, ...). Counts and capacity
+    aggregate every active Location below it and are maintained incrementally
+    (see groups.py); current_count is flushed from the live state store.
+    """
+    KIND_SITE = 'SITE'
+    KIND_BUILDING = 'BUILDING'
+    KIND_FLOOR = 'FLOOR'
+    KIND_AREA = 'AREA'
+
+    KIND_CHOICES = [
+        (KIND_SITE, 'Site'),
+        (KIND_BUILDING, 'Building'),
+        (KIND_FLOOR, 'Floor'),
+        (KIND_AREA, 'Area'),
+    ]
+
+    name = models.CharField(max_length=200)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=KIND_BUILDING)
+    parent = models.ForeignKey(
+        'self', null=True, blank=True, on_delete=models.SET_NULL, related_name='children'
+    )
+    current_count = models.PositiveIntegerField(default=0, editable=False)
+    capacity_limit = models.PositiveIntegerField(default=0, editable=False)
+    density_level = models.CharField(
+        max_length=10, choices=Location.DENSITY_CHOICES, default=Location.DENSITY_LOW, editable=False
+    )
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.get_kind_display()})"
+
+    def clean(self):
+        if self.pk and self.parent_id:
+            parents = dict(LocationGroup.objects.values_list('id', 'parent_id'))
+            node = self.parent_id
+            while node is not None:
+                if node == self.pk:
+                    raise ValidationError({'parent': 'A group cannot be nested inside itself.'})
+                node = parents.get(node)
+
+    def save(self, *args, **kwargs):
+        # Atomic so aggregate moves (groups.py) commit with the row.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    @property
+    def occupancy_percentage(self):
+        if self.capacity_limit == 0:
+            return 0
+        return round((self.current_count / self.capacity_limit) * 100, 1)
 
 
 class CrowdLog(models.Model):
@@ -72,7 +198,10 @@ class CrowdLog(models.Model):
         choices=[('AI', 'AI Detection'), ('MANUAL', 'Manual Entry')],
         default='AI'
     )
-    timestamp = models.DateTimeField(auto_now_add=True)
+    entries = models.PositiveIntegerField(default=0)
+    exits = models.PositiveIntegerField(default=0)
+    # default rather than auto_now_add so backfills can bulk-insert historic times
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ['-timestamp']
@@ -82,3 +211,38 @@ class CrowdLog(models.Model):
 
     def __str__(self):
         return f"{self.location.name} @ {self.timestamp:%Y-%m-%d %H:%M} — {self.people_count} people"
+
+
+class OccupancyProfile(models.Model):
+    """
+    Per-location occupancy accumulators by time-of-week slot, maintained
+    incrementally from CrowdLog (see heatmaps.py).
+    """
+    location = models.OneToOneField(
+        Location, on_delete=models.CASCADE, related_name='occupancy_profile'
+    )
+    slot_minutes = models.PositiveSmallIntegerField(default=60)
+    # float64 array of shape (3, slots): samples, sum and sum of squares of occupancy %
+    data = models.BinaryField()
+    # Every CrowdLog id at or below last_log_id is folded in; ids above it that
+    # are, map to the epoch time they were first folded (see heatmaps.py).
+    last_log_id = models.BigIntegerField(default=0)
+    recent_log_ids = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.location_id} occupancy profile ({self.slot_minutes} min slots)"
+
+
+class ForecastSnapshot(models.Model):
+    """
+    The latest full forecast fit (a single row), written by whichever process
+    refits and loaded by every other one (see forecasting.py).
+    """
+    # npz archive of the Forecaster arrays and the location id of each row
+    data = models.BinaryField()
+    synced_at = models.FloatField()     # epoch seconds the fit covers readings up to
+    fitted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Forecast snapshot @ {self.fitted_at:%Y-%m-%d %H:%M}"
@@ -1,5 +1,14 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
-from .models import Location, CrowdLog
+from .models import Location, LocationGroup, CrowdLog
+
+
+class LiveLocationListSerializer(serializers.ListSerializer):
+    """Overlays live current state (locations/live.py) in one cache round-trip."""
+
+    def to_representation(self, data):
+        from .live import live_state
+        return super().to_representation(live_state.apply(data.all() if hasattr(data, 'all') else data))
 
 
 class LocationSerializer(serializers.ModelSerializer):
@@ -7,14 +16,43 @@ class LocationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Location
+        list_serializer_class = LiveLocationListSerializer
         fields = [
             'id', 'name', 'description', 'latitude', 'longitude',
             'capacity_limit', 'current_count', 'density_level',
-            'occupancy_percentage', 'is_active', 'camera_url', 'last_updated',
+            'occupancy_percentage', 'is_active', 'camera_url', 'counting_line',
+            'roi', 'group', 'last_updated',
         ]
         read_only_fields = ['current_count', 'density_level', 'last_updated']
 
 
+class LiveGroupListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        from .live import live_state
+        return super().to_representation(live_state.apply_groups(data.all() if hasattr(data, 'all') else data))
+
+
+class LocationGroupSerializer(serializers.ModelSerializer):
+    occupancy_percentage = serializers.ReadOnlyField()
+
+    class Meta:
+        model = LocationGroup
+        list_serializer_class = LiveGroupListSerializer
+        fields = [
+            'id', 'name', 'kind', 'parent', 'current_count', 'capacity_limit',
+            'density_level', 'occupancy_percentage', 'last_updated',
+        ]
+        read_only_fields = ['current_count', 'capacity_limit', 'density_level', 'last_updated']
+
+    def validate_parent(self, parent):
+        if self.instance is not None and parent is not None:
+            try:
+                LocationGroup(pk=self.instance.pk, parent_id=parent.pk).clean()
+            except DjangoValidationError as e:
+                raise serializers.ValidationError(e.message_dict['parent'])
+        return parent
+
+
 class LocationUpdateSerializer(serializers.Serializer):
     count = serializers.IntegerField(min_value=0)
     source = serializers.ChoiceField(choices=['AI', 'MANUAL'], default='MANUAL')
@@ -27,5 +65,6 @@ class CrowdLogSerializer(serializers.ModelSerializer):
         model = CrowdLog
         fields = [
             'id', 'location', 'location_name', 'people_count',
-            'density_level', 'occupancy_percentage', 'source', 'timestamp',
+            'density_level', 'occupancy_percentage', 'source', 'entries', 'exits',
+            'timestamp',
         ]
@@ -0,0 +1,168 @@
+"""
+In-memory spatial index over active Location coordinates.
+
+Points are bucketed into a fixed lat/lon grid and stored sorted by cell key,
+so a bounding box resolves to one contiguous slice per grid row (found with a
+single vectorised `searchsorted`) followed by an exact filter on the few
+candidates. Radius queries reuse the box search plus a haversine filter;
+nearest-k is a vectorised haversine + argpartition.
+
+The index holds coordinates only — live counts are read from the database
+for the handful of ids a query returns. It is rebuilt lazily when a Location's
+coordinates or active flag change, and at most every SPATIAL_INDEX_TTL seconds
+to pick up edits made by other processes.
+"""
+
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat, lon, lats, lons):
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = (
+        np.sin((lats - lat) / 2) ** 2
+        + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+class SpatialIndex:
+    def __init__(self, cell_deg=0.05):
+        self.cell = cell_deg
+        self.nx = int(math.ceil(360 / cell_deg)) + 1
+        self.ny = int(math.ceil(180 / cell_deg)) + 1
+        self.build(np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0))
+
+    def _cells(self, lat, lon):
+        cx = np.clip(((np.asarray(lon) + 180) // self.cell).astype(np.int64), 0, self.nx - 1)
+        cy = np.clip(((np.asarray(lat) + 90) // self.cell).astype(np.int64), 0, self.ny - 1)
+        return cy, cx
+
+    def build(self, ids, lats, lons):
+        cy, cx = self._cells(lats, lons)
+        keys = cy * self.nx + cx
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.ids = np.asarray(ids)[order]
+        self.lats = np.asarray(lats, dtype=float)[order]
+        self.lons = np.asarray(lons, dtype=float)[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ── Queries (return positions into the sorted arrays) ─────────────────
+    def _bbox_positions(self, min_lat, min_lon, max_lat, max_lon):
+        if min_lon > max_lon:   # crosses the antimeridian
+            return np.concatenate([
+                self._bbox_positions(min_lat, min_lon, max_lat, 180.0),
+                self._bbox_positions(min_lat, -180.0, max_lat, max_lon),
+            ])
+        cy0, cx0 = self._cells(min_lat, min_lon)
+        cy1, cx1 = self._cells(max_lat, max_lon)
+        rows = np.arange(cy0, cy1 + 1)
+        starts = np.searchsorted(self.keys, rows * self.nx + cx0, side='left')
+        ends = np.searchsorted(self.keys, rows * self.nx + cx1, side='right')
+        lengths = ends - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.zeros(0, dtype=np.int64)
+        # Concatenate the ranges [start, end) without a Python loop.
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        pos = offsets + np.arange(total)
+        lat, lon = self.lats[pos], self.lons[pos]
+        keep = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        return pos[keep]
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Ids inside the box."""
+        return self.ids[self._bbox_positions(min_lat, min_lon, max_lat, max_lon)]
+
+    def within_radius(self, lat, lon, radius_km):
+        """(ids, distances_km) within `radius_km`, nearest first."""
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        coslat = max(math.cos(math.radians(lat)), 1e-6)
+        dlon = min(dlat / coslat, 180.0)
+        min_lon, max_lon = lon - dlon, lon + dlon
+        if dlon >= 180.0:
+            min_lon, max_lon = -180.0, 180.0
+        else:
+            min_lon = (min_lon + 540) % 360 - 180
+            max_lon = (max_lon + 540) % 360 - 180
+        pos = self._bbox_positions(max(lat - dlat, -90), min_lon, min(lat + dlat, 90), max_lon)
+        dist = haversine_km(lat, lon, self.lats[pos], self.lons[pos])
+        keep = dist <= radius_km
+        pos, dist = pos[keep], dist[keep]
+        order = np.argsort(dist)
+        return self.ids[pos[order]], dist[order]
+
+    def nearest(self, lat, lon, k):
+        """(ids, distances_km) of the k nearest points."""
+        if not len(self.ids):
+            return self.ids, np.zeros(0)
+        dist = haversine_km(lat, lon, self.lats, self.lons)
+        k = min(k, len(dist))
+        part = np.argpartition(dist, k - 1)[:k]
+        part = part[np.argsort(dist[part])]
+        return self.ids[part], dist[part]
+
+    def clusters(self, min_lat, min_lon, max_lat, max_lon, cell_deg):
+        """
+        Group points in the box into `cell_deg` cells.
+        Returns (cluster_index_per_point, ids, centroid_lats, centroid_lons).
+        """
+        pos = self._bbox_positions(min_lat, min_lon, max_lat, max_lon)
+        lats, lons = self.lats[pos], self.lons[pos]
+        cx = np.floor((lons + 180) / cell_deg).astype(np.int64)
+        cy = np.floor((lats + 90) / cell_deg).astype(np.int64)
+        _, inverse = np.unique(cy * (int(360 / cell_deg) + 1) + cx, return_inverse=True)
+        n = inverse.max() + 1 if len(inverse) else 0
+        sizes = np.bincount(inverse, minlength=n)
+        c_lat = np.bincount(inverse, weights=lats, minlength=n) / np.maximum(sizes, 1)
+        c_lon = np.bincount(inverse, weights=lons, minlength=n) / np.maximum(sizes, 1)
+        return inverse, self.ids[pos], c_lat, c_lon
+
+
+class _IndexHolder:
+    """Process-wide index, rebuilt on demand."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._built_at = 0.0
+
+    def invalidate(self, sender=None, instance=None, update_fields=None, **kwargs):
+        # Count updates save with update_fields and never move a location.
+        if update_fields and not {'latitude', 'longitude', 'is_active'} & set(update_fields):
+            return
+        self._index = None
+
+    def get(self):
+        index = self._index
+        ttl = getattr(settings, 'SPATIAL_INDEX_TTL', 60)
+        if index is not None and time.monotonic() - self._built_at < ttl:
+            return index
+        from .models import Location
+
+        with self._lock:
+            rows = list(
+                Location.objects.filter(is_active=True)
+                .values_list('id', 'latitude', 'longitude')
+            )
+            index = SpatialIndex(getattr(settings, 'SPATIAL_INDEX_CELL_DEG', 0.05))
+            index.build(
+                np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)),
+                np.fromiter((float(r[1]) for r in rows), dtype=float, count=len(rows)),
+                np.fromiter((float(r[2]) for r in rows), dtype=float, count=len(rows)),
+            )
+            self._index = index
+            self._built_at = time.monotonic()
+        return index
+
+
+spatial_index = _IndexHolder()
@@ -0,0 +1,308 @@
+from datetime import timedelta
+
+import numpy as np
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import CrowdLog, Location, LocationGroup, OccupancyProfile
+
+THRESHOLDS = dict(CROWD_LOW_THRESHOLD=0.3, CROWD_HIGH_THRESHOLD=0.7, CROWD_ALERT_THRESHOLD=0.8)
+
+
+def _log(location, count, log_id=None, timestamp=None):
+    return CrowdLog.objects.create(
+        id=log_id, location=location, people_count=count, density_level='LOW',
+        occupancy_percentage=count, timestamp=timestamp or timezone.now(),
+    )
+
+
+# ── Heatmaps (heatmaps.py) ────────────────────────────────────────────────
+
+@override_settings(HEATMAP_SLOT_MINUTES=60, **THRESHOLDS)
+class ProfileBufferTests(TestCase):
+    def setUp(self):
+        from . import heatmaps
+
+        self.heatmaps = heatmaps
+        self.buffer = heatmaps.ProfileBuffer(flush_seconds=0, settle_seconds=300)
+        self.location = Location.objects.create(name='Hall', capacity_limit=100)
+        self.now = timezone.now()
+        self.slot = heatmaps.slot_of(self.now, 60)
+
+    def _profile(self):
+        return OccupancyProfile.objects.get(location=self.location)
+
+    def _samples(self):
+        return self.heatmaps._load(self._profile())[:, self.slot]
+
+    def test_out_of_order_ids_are_folded_once(self):
+        _log(self.location, 40, log_id=120, timestamp=self.now)
+        self.buffer.add(self.location.id)
+        # A lower id whose transaction committed after 120 was folded.
+        _log(self.location, 20, log_id=110, timestamp=self.now)
+        self.buffer.add(self.location.id)
+        self.buffer.add(self.location.id)
+
+        np.testing.assert_array_equal(self._samples(), [2, 60, 40 ** 2 + 20 ** 2])
+        self.assertEqual(set(self._profile().recent_log_ids), {'110', '120'})
+
+    def test_watermark_advances_past_settled_ids(self):
+        _log(self.location, 40, log_id=120, timestamp=self.now)
+        self.buffer.add(self.location.id)
+        self.buffer.settle_seconds = 0
+        self.buffer.add(self.location.id)
+
+        profile = self._profile()
+        self.assertEqual(profile.last_log_id, 120)
+        self.assertEqual(profile.recent_log_ids, {})
+        # Ids below the watermark are taken as folded in already.
+        _log(self.location, 10, log_id=100, timestamp=self.now)
+        self.buffer.add(self.location.id)
+        self.assertEqual(self._samples()[0], 1)
+
+    def test_rebuild_matches_incremental_and_is_not_double_counted(self):
+        for days, count in ((0, 40), (7, 50), (14, 60)):
+            _log(self.location, count, timestamp=self.now - timedelta(days=days))
+        self.buffer.add(self.location.id)
+        incremental = self.heatmaps._load(self._profile())
+
+        self.heatmaps.rebuild()
+        np.testing.assert_array_equal(self.heatmaps._load(self._profile()), incremental)
+        self.buffer.add(self.location.id)
+        np.testing.assert_array_equal(self.heatmaps._load(self._profile()), incremental)
+
+        _log(self.location, 70, timestamp=self.now)
+        self.buffer.add(self.location.id)
+        self.assertEqual(self._samples()[0], 4)
+
+
+# ── Live state (live.py) ──────────────────────────────────────────────────
+
+def _manual_live_state():
+    """A LiveState that only flushes when told to."""
+    from .live import LiveState
+
+    state = LiveState(flush_seconds=60)
+    state._start_flusher = lambda: None
+    return state
+
+
+@override_settings(**THRESHOLDS)
+class LiveStateTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.state = _manual_live_state()
+        self.location = Location.objects.create(name='Hall', capacity_limit=100)
+
+    def _row(self):
+        return Location.objects.get(pk=self.location.pk)
+
+    def test_update_is_held_until_flush(self):
+        self.assertEqual(self.state.update(self.location, 5), 0)
+        self.assertEqual(self.state.update(self.location, 10), 5)
+        self.assertEqual(self._row().current_count, 0)
+
+        self.assertEqual(self.state.flush(), 1)
+        self.assertEqual(self._row().current_count, 10)
+        self.assertEqual(self.state.flush(), 0)
+
+    def test_density_change_writes_through(self):
+        self.state.update(self.location, 50)
+        row = self._row()
+        self.assertEqual((row.current_count, row.density_level), (50, Location.DENSITY_MEDIUM))
+
+    def test_apply_overlays_only_newer_entries(self):
+        self.state.update(self.location, 10)
+        stale = self._row()
+        self.assertEqual(self.state.apply([stale])[0].current_count, 10)
+
+        # A row written after the entry (e.g. by another process's flush) wins.
+        Location.objects.filter(pk=self.location.pk).update(
+            current_count=12, last_updated=timezone.now() + timedelta(seconds=1),
+        )
+        self.assertEqual(self.state.apply([self._row()])[0].current_count, 12)
+
+    def test_full_save_carries_the_live_count(self):
+        stale = self._row()
+        self.state.update(self.location, 20)
+        self.state.carry(instance=stale)
+        self.assertEqual(stale.current_count, 20)
+
+        # Saves limited to update_fields never touch the count.
+        stale.current_count = 0
+        self.state.carry(instance=stale, update_fields=['name'])
+        self.assertEqual(stale.current_count, 0)
+
+
+# ── Location groups (groups.py) ───────────────────────────────────────────
+
+@override_settings(**THRESHOLDS)
+class GroupTotalsTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .groups import group_tree
+        from .live import live_state
+
+        cache.clear()
+        group_tree.invalidate()
+        # Write every delta through so totals can be read straight from the rows.
+        self.addCleanup(setattr, live_state, 'flush_seconds', live_state.flush_seconds)
+        live_state.flush_seconds = 0
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.site = LocationGroup.objects.create(name='Site')
+            self.a = LocationGroup.objects.create(name='A', parent=self.site)
+            self.b = LocationGroup.objects.create(name='B')
+            self.hall = Location.objects.create(name='Hall', capacity_limit=100, group=self.a)
+            self.gate = Location.objects.create(name='Gate', capacity_limit=50, group=self.b)
+
+    def _totals(self):
+        return {
+            name: (count, capacity)
+            for name, count, capacity in LocationGroup.objects.values_list('name', 'current_count', 'capacity_limit')
+        }
+
+    def _assert_rebuild_agrees(self):
+        from .groups import rebuild
+
+        incremental = self._totals()
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild()
+        self.assertEqual(self._totals(), incremental)
+
+    def test_count_deltas_reach_every_ancestor(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hall.update_count(30)
+            self.hall.update_count(25)
+            self.gate.update_count(10)
+        self.assertEqual(self._totals(), {'Site': (25, 100), 'A': (25, 100), 'B': (10, 50)})
+        self._assert_rebuild_agrees()
+
+    def test_stale_instances_move_a_location_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hall.update_count(30)
+        first = Location.objects.get(pk=self.hall.pk)
+        second = Location.objects.get(pk=self.hall.pk)
+        for instance in (first, second):
+            with self.captureOnCommitCallbacks(execute=True):
+                instance.group = self.b
+                instance.save()
+        self.assertEqual(self._totals(), {'Site': (0, 0), 'A': (0, 0), 'B': (30, 150)})
+        self._assert_rebuild_agrees()
+
+    def test_reparenting_a_group_moves_its_total(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gate.update_count(10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.b.parent = self.site
+            self.b.save()
+        self.assertEqual(self._totals()['Site'], (10, 150))
+        self._assert_rebuild_agrees()
+
+    def test_deactivating_a_location_removes_its_contribution(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hall.update_count(30)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hall.is_active = False
+            self.hall.save()
+        self.assertEqual(self._totals(), {'Site': (0, 0), 'A': (0, 0), 'B': (0, 50)})
+        self._assert_rebuild_agrees()
+
+
+# ── Series downsampling (downsample.py) ───────────────────────────────────
+
+class DownsampleTests(TestCase):
+    def test_lttb_keeps_endpoints_and_peaks(self):
+        from .downsample import lttb
+
+        ts = np.arange(1000, dtype=float)
+        values = np.zeros(1000)
+        values[437] = 100
+        out_ts, out_values = lttb(ts, values, 50)
+        self.assertEqual(len(out_ts), 50)
+        self.assertEqual((out_ts[0], out_ts[-1]), (0, 999))
+        self.assertIn(437, out_ts)
+        self.assertTrue(np.all(np.diff(out_ts) > 0))
+
+    def test_lttb_returns_short_series_unchanged(self):
+        from .downsample import lttb
+
+        ts, values = np.arange(10.0), np.arange(10)
+        out_ts, out_values = lttb(ts, values, 20)
+        np.testing.assert_array_equal(out_values, values)
+
+    def test_bucket_average_means_and_drops_empty_buckets(self):
+        from .downsample import bucket_average
+
+        ts = np.array([0.0, 1, 2, 3, 10, 11])
+        values = np.array([1.0, 3, 5, 7, 10, 20])
+        # Buckets 2.75 wide: [0, 1, 2], [3], (empty), [10, 11].
+        out_ts, out_values = bucket_average(ts, values, 4)
+        np.testing.assert_allclose(out_ts, [1, 3, 10.5])
+        np.testing.assert_allclose(out_values, [3, 7, 15])
+
+
+# ── Forecasting (forecasting.py) ──────────────────────────────────────────
+
+class ForecasterTests(TestCase):
+    def setUp(self):
+        from .forecasting import Forecaster
+
+        self.forecaster = Forecaster(step_seconds=300, alpha=0.3, beta=0.05, phi=0.9)
+
+    def test_hour_of_week(self):
+        from .forecasting import _hour_of_week
+
+        # The Unix epoch was a Thursday; 1970-01-05 was a Monday.
+        self.assertEqual(_hour_of_week(0, 0), 72)
+        self.assertEqual(_hour_of_week(4 * 86400, 0), 0)
+        self.assertEqual(_hour_of_week(4 * 86400 + 3599, 3600), 1)
+        np.testing.assert_array_equal(_hour_of_week(np.array([0, 7 * 86400]), 0), [72, 72])
+
+    def test_damped_sum(self):
+        self.assertAlmostEqual(self.forecaster._damped_sum(2), 0.9 + 0.81)
+        self.forecaster.phi = 1
+        self.assertEqual(self.forecaster._damped_sum(3), 3)
+
+    def test_constant_history_forecasts_the_constant(self):
+        ts = np.arange(0, 2 * 86400, 300, dtype=float) + 1.7e9
+        self.forecaster.fit(np.full(len(ts), 7), ts, np.full(len(ts), 20.0))
+        _, counts = self.forecaster.forecast([7, 8], 60, now=ts[-1])
+        self.assertEqual(counts.shape, (2, 12))
+        np.testing.assert_allclose(counts[0], 20)
+        np.testing.assert_array_equal(counts[1], 0)
+
+    def test_baseline_follows_the_hour_of_week(self):
+        from .forecasting import _hour_of_week, _local_offset
+
+        ts = np.arange(0, 14 * 86400, 3600, dtype=float)
+        counts = np.where(_hour_of_week(ts, _local_offset()) == 12, 80.0, 10.0)
+        self.forecaster.fit(np.ones(len(ts), dtype=np.int64), ts, counts)
+        np.testing.assert_allclose(self.forecaster._baseline(np.array([0, 0]), np.array([12, 13])), [80, 10])
+
+    def test_observe_ignores_older_readings(self):
+        self.forecaster.observe(1, 10, ts=1000.0)
+        self.forecaster.observe(1, 50, ts=900.0)
+        self.assertEqual(self.forecaster.season_n.sum(), 1)
+        self.forecaster.observe(1, 50, ts=1300.0)
+        self.assertEqual(self.forecaster.season_n.sum(), 2)
+
+    @override_settings(**THRESHOLDS)
+    def test_refit_snapshot_is_loaded_by_other_processes(self):
+        from .forecasting import Forecaster
+
+        location = Location.objects.create(name='Hall', capacity_limit=100)
+        for count in range(10, 50, 4):
+            _log(location, count)
+        self.forecaster.refit()
+
+        other = Forecaster(step_seconds=300, alpha=0.3, beta=0.05, phi=0.9)
+        self.assertTrue(other.load(force=True))
+        self.assertFalse(other.load(force=True))
+        now = self.forecaster.last_ts.max()
+        np.testing.assert_allclose(
+            other.forecast([location.id], 30, now=now)[1],
+            self.forecaster.forecast([location.id], 30, now=now)[1],
+        )
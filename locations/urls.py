@@ -1,8 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import LocationViewSet, CrowdLogViewSet
+from .views import LocationViewSet, LocationGroupViewSet, CrowdLogViewSet
 
 router = DefaultRouter()
+# Before the '' prefix, whose detail route would otherwise match 'groups/'.
+router.register(r'groups', LocationGroupViewSet, basename='locationgroup')
 router.register(r'', LocationViewSet, basename='location')
 router.register(r'logs/all', CrowdLogViewSet, basename='crowdlog')
 
@@ -1,3 +1,4 @@
+import numpy as np
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import viewsets, status
@@ -6,8 +7,10 @@ from rest_framework.response import Response
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
-from .models import Location, CrowdLog
-from .serializers import LocationSerializer, LocationUpdateSerializer, CrowdLogSerializer
+from .models import Location, LocationGroup, CrowdLog
+from .serializers import (
+    LocationSerializer, LocationGroupSerializer, LocationUpdateSerializer, CrowdLogSerializer,
+)
 from alerts.utils import check_and_trigger_alerts
 
 
@@ -15,33 +18,43 @@ class LocationViewSet(viewsets.ModelViewSet):
     queryset = Location.objects.filter(is_active=True)
     serializer_class = LocationSerializer
 
+    def get_object(self):
+        from .live import live_state
+        return live_state.apply([super().get_object()])[0]
+
     @action(detail=True, methods=['post'], url_path='update-count')
     def update_count(self, request, pk=None):
-        location = self.get_object()
-        ser = LocationUpdateSerializer(data=request.data)
-        ser.is_valid(raise_exception=True)
+        from dashboard.metrics import metrics
 
-        count = ser.validated_data['count']
-        source = ser.validated_data['source']
+        with metrics.pipeline('update_count'):
+            location = self.get_object()
+            ser = LocationUpdateSerializer(data=request.data)
+            ser.is_valid(raise_exception=True)
 
-        location.update_count(count)
+            count = ser.validated_data['count']
+            source = ser.validated_data['source']
 
-        # Save log
-        log = CrowdLog.objects.create(
-            location=location,
-            people_count=count,
-            density_level=location.density_level,
-            occupancy_percentage=location.occupancy_percentage,
-            source=source,
-        )
+            with metrics.stage('db_write'):
+                location.update_count(count)
+
+                # Save log
+                log = CrowdLog.objects.create(
+                    location=location,
+                    people_count=count,
+                    density_level=location.density_level,
+                    occupancy_percentage=location.occupancy_percentage,
+                    source=source,
+                )
 
-        # Check alerts
-        check_and_trigger_alerts(location)
+            # Check alerts
+            with metrics.stage('alerts'):
+                check_and_trigger_alerts(location)
 
-        # Broadcast via WebSocket
-        _broadcast_update(location)
+            # Broadcast via WebSocket
+            with metrics.stage('broadcast'):
+                _broadcast_update(location)
 
-        return Response(LocationSerializer(location).data)
+            return Response(LocationSerializer(location).data)
 
     @action(detail=True, methods=['get'], url_path='logs')
     def logs(self, request, pk=None):
@@ -50,6 +63,252 @@ class LocationViewSet(viewsets.ModelViewSet):
         logs = location.logs.all()[:limit]
         return Response(CrowdLogSerializer(logs, many=True).data)
 
+    @action(detail=True, methods=['get'], url_path='series')
+    def series(self, request, pk=None):
+        """
+        Columnar, downsampled count history for charts.
+
+        Query params:
+            start, end  ISO-8601 datetimes (default: last `hours` hours)
+            hours       window size when `start` is omitted (default: 24)
+            points      max number of points returned (default: 200)
+            method      'lttb' (default) or 'avg'
+        """
+        from datetime import timedelta
+        from django.utils.dateparse import parse_datetime
+        from .downsample import METHODS
+
+        location = self.get_object()
+        params = request.query_params
+
+        method = params.get('method', 'lttb')
+        if method not in METHODS:
+            return Response(
+                {'error': f"method must be one of {sorted(METHODS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            points = min(max(int(params.get('points', 200)), 3), 5000)
+            hours = float(params.get('hours', 24))
+        except ValueError:
+            return Response({'error': 'points and hours must be numeric'}, status=status.HTTP_400_BAD_REQUEST)
+        if not np.isfinite(hours) or hours <= 0:
+            return Response({'error': 'hours must be a positive number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        start = end = None
+        try:
+            end = parse_datetime(params['end']) if params.get('end') else timezone.now()
+            if end is not None:
+                start = parse_datetime(params['start']) if params.get('start') else end - timedelta(hours=hours)
+        except (ValueError, OverflowError):
+            pass
+        if start is None or end is None:
+            return Response({'error': 'Invalid start/end datetime'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = list(
+            CrowdLog.objects
+            .filter(location_id=location.id, timestamp__gte=start, timestamp__lte=end)
+            .order_by('timestamp')
+            .values_list('timestamp', 'people_count')
+        )
+
+        ts = np.fromiter((r[0].timestamp() for r in rows), dtype=float, count=len(rows))
+        counts = np.fromiter((r[1] for r in rows), dtype=float, count=len(rows))
+        if len(rows):
+            ts, counts = METHODS[method](ts, counts, points)
+
+        return Response({
+            'location_id': location.id,
+            'method': method,
+            'raw_points': len(rows),
+            'timestamps': (ts * 1000).astype(np.int64).tolist(),
+            'counts': np.round(counts, 1).tolist(),
+        })
+
+    @action(detail=True, methods=['get'], url_path='forecast')
+    def forecast(self, request, pk=None):
+        """
+        Short-term forecast as columnar arrays.
+
+        Query params:
+            minutes     horizon (default: 60, max: 1440)
+        """
+        from .forecasting import forecaster
+
+        location = self.get_object()
+        try:
+            minutes = min(max(int(request.query_params.get('minutes', 60)), 1), 1440)
+        except ValueError:
+            return Response({'error': 'minutes must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        forecaster.sync()
+        times, counts = forecaster.forecast([location.id], minutes)
+        return Response({
+            'location_id': location.id,
+            'step_seconds': forecaster.step,
+            'timestamps': (times * 1000).astype(np.int64).tolist(),
+            'counts': np.round(counts[0], 1).tolist(),
+        })
+
+    @action(detail=False, methods=['get'], url_path='forecast')
+    def fleet_forecast(self, request):
+        """Forecast `minutes` ahead (default: 30) for every active location."""
+        from .forecasting import forecaster
+
+        try:
+            minutes = min(max(int(request.query_params.get('minutes', 30)), 1), 1440)
+        except ValueError:
+            return Response({'error': 'minutes must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        forecaster.sync()
+        locations = list(self.get_queryset().values_list('id', 'capacity_limit'))
+        ids = [i for i, _ in locations]
+        _, counts = forecaster.forecast(ids, minutes)
+        predicted = counts[:, -1] if len(ids) else counts
+        return Response({
+            'minutes': minutes,
+            'forecasts': [
+                {
+                    'location_id': loc_id,
+                    'predicted_count': round(float(p), 1),
+                    'predicted_occupancy': round(float(p) / cap * 100, 1) if cap else 0,
+                }
+                for (loc_id, cap), p in zip(locations, predicted)
+            ],
+        })
+
+    # ── Occupancy heatmaps (locations/heatmaps.py) ─────────────────────────
+    @action(detail=True, methods=['get'], url_path='heatmap')
+    def heatmap(self, request, pk=None):
+        """Hour-of-week heatmap: mean occupancy % as 7 rows (Mon..Sun) of slots."""
+        location = self.get_object()
+        payload = _heatmap_payload([location.id], matrix=True)
+        entry = payload.pop('locations')[0]
+        return Response({**payload, **entry})
+
+    @action(detail=False, methods=['get'], url_path='heatmap')
+    def fleet_heatmap(self, request):
+        """
+        Current occupancy against the usual level for this time of week,
+        for every active location.
+
+        Query params:
+            ids         comma-separated location ids (default: all active)
+            matrix      include the full heatmaps, 1 or 0 (default: 0)
+        """
+        ids = None
+        if request.query_params.get('ids'):
+            try:
+                ids = [int(v) for v in request.query_params['ids'].split(',')]
+            except ValueError:
+                return Response({'error': 'ids must be comma-separated integers'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        matrix = request.query_params.get('matrix', '0') in ('1', 'true')
+        return Response(_heatmap_payload(ids, matrix=matrix))
+
+    # ── Spatial queries (locations/spatial.py) ─────────────────────────────
+    @action(detail=False, methods=['get'], url_path='within')
+    def within(self, request):
+        """GET ?bbox=min_lon,min_lat,max_lon,max_lat — locations inside a box."""
+        from .spatial import spatial_index
+
+        bbox = _parse_bbox(request.query_params.get('bbox'))
+        if bbox is None:
+            return Response({'error': 'bbox=min_lon,min_lat,max_lon,max_lat required'}, status=status.HTTP_400_BAD_REQUEST)
+        min_lon, min_lat, max_lon, max_lat = bbox
+        ids = spatial_index.get().within_bbox(min_lat, min_lon, max_lat, max_lon)
+        qs = self.get_queryset().filter(id__in=ids.tolist())
+        return Response(LocationSerializer(qs, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='nearby')
+    def nearby(self, request):
+        """
+        GET ?lat=&lon=&radius_km=   locations within a radius, nearest first
+        GET ?lat=&lon=&k=           the k nearest locations
+        """
+        from .spatial import spatial_index
+
+        params = request.query_params
+        try:
+            lat, lon = float(params['lat']), float(params['lon'])
+            radius = float(params['radius_km']) if params.get('radius_km') else None
+            k = int(params['k']) if params.get('k') else None
+        except (KeyError, ValueError):
+            return Response({'error': 'lat, lon and radius_km or k required'}, status=status.HTTP_400_BAD_REQUEST)
+        if radius is None and k is None:
+            return Response({'error': 'lat, lon and radius_km or k required'}, status=status.HTTP_400_BAD_REQUEST)
+        if not np.isfinite([lat, lon]).all() or abs(lat) > 90 or abs(lon) > 180:
+            return Response({'error': 'lat and lon must be valid coordinates'}, status=status.HTTP_400_BAD_REQUEST)
+        if radius is not None and not (np.isfinite(radius) and radius >= 0):
+            return Response({'error': 'radius_km must be a non-negative number'}, status=status.HTTP_400_BAD_REQUEST)
+        if k is not None and k < 1:
+            return Response({'error': 'k must be at least 1'}, status=status.HTTP_400_BAD_REQUEST)
+
+        index = spatial_index.get()
+        if radius is not None:
+            ids, dist = index.within_radius(lat, lon, radius)
+            if k is not None:
+                ids, dist = ids[:k], dist[:k]
+        else:
+            ids, dist = index.nearest(lat, lon, min(k, 1000))
+
+        by_id = {loc.id: loc for loc in self.get_queryset().filter(id__in=ids.tolist())}
+        data = []
+        for loc_id, d in zip(ids.tolist(), dist.tolist()):
+            if loc_id in by_id:
+                data.append({**LocationSerializer(by_id[loc_id]).data, 'distance_km': round(d, 3)})
+        return Response(data)
+
+    @action(detail=False, methods=['get'], url_path='clusters')
+    def clusters(self, request):
+        """GET ?bbox=min_lon,min_lat,max_lon,max_lat&zoom= — aggregated clusters for map zoom levels."""
+        from .live import live_state
+        from .spatial import spatial_index
+
+        bbox = _parse_bbox(request.query_params.get('bbox', '-180,-90,180,90'))
+        try:
+            zoom = min(max(int(request.query_params.get('zoom', 3)), 0), 20)
+        except ValueError:
+            bbox = None
+        if bbox is None:
+            return Response({'error': 'bbox=min_lon,min_lat,max_lon,max_lat and integer zoom required'}, status=status.HTTP_400_BAD_REQUEST)
+        min_lon, min_lat, max_lon, max_lat = bbox
+
+        # Roughly four clusters across one 256px map tile at this zoom.
+        cell_deg = 360 / (2 ** zoom) / 4
+        inverse, ids, c_lat, c_lon = spatial_index.get().clusters(min_lat, min_lon, max_lat, max_lon, cell_deg)
+
+        rows = list(
+            Location.objects.filter(id__in=ids.tolist())
+            .values_list('id', 'current_count', 'capacity_limit', 'density_level', 'last_updated')
+        )
+        live = {row[0]: row[1:4] for row in rows}
+        for loc_id, (count, density, _) in live_state.fresh({row[0]: row[4] for row in rows}).items():
+            live[loc_id] = (count, live[loc_id][1], density)
+        rank = {Location.DENSITY_LOW: 0, Location.DENSITY_MEDIUM: 1, Location.DENSITY_HIGH: 2}
+        clusters = [
+            {'lat': round(float(la), 6), 'lon': round(float(lo), 6), 'locations': 0,
+             'current_count': 0, 'capacity_limit': 0, 'density_level': Location.DENSITY_LOW}
+            for la, lo in zip(c_lat, c_lon)
+        ]
+        for c, loc_id in zip(inverse.tolist(), ids.tolist()):
+            if loc_id not in live:
+                continue
+            count, capacity, density = live[loc_id]
+            cluster = clusters[c]
+            cluster['locations'] += 1
+            cluster['current_count'] += count
+            cluster['capacity_limit'] += capacity
+            if rank.get(density, 0) > rank[cluster['density_level']]:
+                cluster['density_level'] = density
+            cluster['location_id'] = loc_id
+        for cluster in clusters:
+            if cluster['locations'] != 1:
+                cluster.pop('location_id', None)
+            cap = cluster['capacity_limit']
+            cluster['occupancy_percentage'] = round(cluster['current_count'] / cap * 100, 1) if cap else 0
+        return Response({'zoom': zoom, 'clusters': [c for c in clusters if c['locations']]})
+
     @action(detail=True, methods=['get'], url_path='stats')
     def stats(self, request, pk=None):
         location = self.get_object()
@@ -72,6 +331,35 @@ class LocationViewSet(viewsets.ModelViewSet):
         })
 
 
+class LocationGroupViewSet(viewsets.ModelViewSet):
+    """Building / floor / area groups; totals are maintained incrementally (locations/groups.py)."""
+    queryset = LocationGroup.objects.all()
+    serializer_class = LocationGroupSerializer
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        parent = self.request.query_params.get('parent')
+        if parent == 'none':
+            qs = qs.filter(parent__isnull=True)
+        elif parent:
+            qs = qs.filter(parent_id=parent)
+        return qs
+
+    def get_object(self):
+        from .live import live_state
+        return live_state.apply_groups([super().get_object()])[0]
+
+    @action(detail=True, methods=['get'], url_path='members')
+    def members(self, request, pk=None):
+        """Direct child groups and locations, with live totals."""
+        group = self.get_object()
+        return Response({
+            'group': LocationGroupSerializer(group).data,
+            'groups': LocationGroupSerializer(group.children.all(), many=True).data,
+            'locations': LocationSerializer(group.locations.filter(is_active=True), many=True).data,
+        })
+
+
 class CrowdLogViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = CrowdLogSerializer
 
@@ -83,6 +371,53 @@ class CrowdLogViewSet(viewsets.ReadOnlyModelViewSet):
         return qs[:100]
 
 
+def _parse_bbox(value):
+    """'min_lon,min_lat,max_lon,max_lat' -> tuple of floats, or None if malformed."""
+    try:
+        parts = [float(p) for p in (value or '').split(',')]
+    except ValueError:
+        return None
+    if len(parts) != 4 or parts[1] > parts[3]:
+        return None
+    return tuple(parts)
+
+
+def _heatmap_payload(location_ids, matrix):
+    from .heatmaps import fleet
+
+    result = fleet(location_ids)
+
+    def num(a, digits):
+        out = np.round(a, digits).astype(object)
+        out[np.isnan(a)] = None
+        return out
+
+    current, usual = num(result['current'], 1), num(result['usual'], 1)
+    ratio, zscore = num(result['ratio'], 2), num(result['zscore'], 2)
+    samples = result['samples']
+    if matrix:
+        mean = num(result['mean'], 1).reshape(len(result['ids']), 7, -1)
+    locations = []
+    for i, (loc_id, name) in enumerate(zip(result['ids'], result['names'])):
+        entry = {
+            'location_id': loc_id,
+            'location_name': name,
+            'occupancy': current[i],
+            'usual_occupancy': usual[i],
+            'ratio': ratio[i],
+            'zscore': zscore[i],
+            'samples': int(samples[i].sum()),
+        }
+        if matrix:
+            entry['heatmap'] = mean[i].tolist()
+        locations.append(entry)
+    return {
+        'slot_minutes': result['slot_minutes'],
+        'current_slot': result['current_slot'],
+        'locations': locations,
+    }
+
+
 def _broadcast_update(location: Location):
     channel_layer = get_channel_layer()
     payload = {